@@ -1,25 +1,210 @@
-from typing import List, Dict
-from dataclasses import dataclass
+import sys
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 
+import clock
+
 class OperationStatus(Enum):
     PENDING = "Pending"
     IN_PROGRESS = "In Progress"
     COMPLETED = "Completed"
 
-@dataclass
+# Machine IDs interned to small ints, shared by every operation in the process
+MACHINE_IDS: List[str] = []
+MACHINE_INDEX: Dict[str, int] = {}
+
+def intern_machine(machine_id: str) -> int:
+    """Get the small int standing for a machine ID, assigning the next one if it is new"""
+    index = MACHINE_INDEX.get(machine_id)
+    if index is None:
+        index = MACHINE_INDEX[machine_id] = len(MACHINE_IDS)
+        MACHINE_IDS.append(sys.intern(machine_id))
+    return index
+
+_NAN = float('nan')
+
+class OperationStore:
+    """
+    Shared columns holding the machines and processing times of many operations
+
+    Each operation owns a contiguous segment: its capable machines first, then any
+    machine that only appears in its processing times. Times are aligned with the
+    machines, NaN where a capable machine has no time.
+    """
+    __slots__ = ('machines', 'times')
+
+    def __init__(self):
+        self.machines = array('I')
+        self.times = array('d')
+
+    def add(self, capable_machines: List[str], processing_times: Dict[str, float]) -> int:
+        """
+        Append an operation's segment
+        
+        Args:
+            capable_machines: List of machine IDs that can perform the operation
+            processing_times: Dictionary mapping machine_id to processing time
+            
+        Returns:
+            Offset of the segment in the shared columns
+        """
+        offset = len(self.machines)
+        self.machines.extend([MACHINE_INDEX[m] if m in MACHINE_INDEX else intern_machine(m) for m in capable_machines])
+        self.times.extend([processing_times.get(m, _NAN) for m in capable_machines])
+        if len(processing_times) != len(capable_machines) or any(m not in processing_times for m in capable_machines):
+            capable = set(capable_machines)
+            for machine_id, time in processing_times.items():
+                if machine_id not in capable:
+                    self.machines.append(intern_machine(machine_id))
+                    self.times.append(time)
+        return offset
+
+# Store used by operations created without an explicit one
+default_store = OperationStore()
+
+class ProcessingTimes(Mapping):
+    """Read-only machine_id -> processing time view over an operation's store segment"""
+    __slots__ = ('_operation',)
+
+    def __init__(self, operation: 'Operation'):
+        self._operation = operation
+
+    def _segment(self):
+        op = self._operation
+        return range(op._offset, op._offset + op._size)
+
+    def __getitem__(self, machine_id: str) -> float:
+        index = MACHINE_INDEX.get(machine_id)
+        store = self._operation._store
+        for position in self._segment():
+            if store.machines[position] == index:
+                time = store.times[position]
+                if time == time:  # NaN marks a capable machine without a time
+                    return time
+                break
+        raise KeyError(machine_id)
+
+    def __iter__(self):
+        store = self._operation._store
+        for position in self._segment():
+            if store.times[position] == store.times[position]:
+                yield MACHINE_IDS[store.machines[position]]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def values(self) -> List[float]:
+        store = self._operation._store
+        return [time for time in store.times[self._operation._offset:self._operation._offset + self._operation._size]
+                if time == time]
+
+    def items(self):
+        return list(zip(self, self.values()))
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
 class Operation:
-    operation_id: str
-    name: str
-    capable_machines: List[str]  # List of machine IDs that can perform this operation
-    processing_times: Dict[str, float]  # Dictionary mapping machine_id to processing time in hours
-    sequence_number: int  # Order of operation in the sequence
-    status: OperationStatus = OperationStatus.PENDING
-    assigned_machine: str = None
-    start_time: datetime = None
-    completion_time: datetime = None
-    completed_quantity: int = 0
+    """
+    A single processing step of an order
+
+    Slotted, with machine IDs interned to small ints and the capability list and
+    processing times kept in a shared OperationStore instead of a list and a dict
+    per operation. capable_machines and processing_times read like the plain
+    list and dict they replace.
+    """
+    __slots__ = ('operation_id', 'name', 'sequence_number', 'status', 'assigned_machine',
+                 'start_time', 'completion_time', 'completed_quantity',
+                 '_store', '_offset', '_capable', '_size')
+
+    def __init__(self, operation_id: str, name: str, capable_machines: List[str],
+                 processing_times: Dict[str, float], sequence_number: int,
+                 status: OperationStatus = OperationStatus.PENDING, assigned_machine: str = None,
+                 start_time: datetime = None, completion_time: datetime = None,
+                 completed_quantity: int = 0, store: OperationStore = None):
+        self.operation_id = sys.intern(operation_id)
+        self.name = sys.intern(name)
+        self.sequence_number = sequence_number  # Order of operation in the sequence
+        self.status = status
+        self.assigned_machine = assigned_machine
+        self.start_time = start_time
+        self.completion_time = completion_time
+        self.completed_quantity = completed_quantity
+        self._store = store if store is not None else default_store
+        self._offset = self._store.add(capable_machines, processing_times)
+        self._capable = len(capable_machines)
+        self._size = len(self._store.machines) - self._offset
+
+    @classmethod
+    def from_segment(cls, store: OperationStore, offset: int, capable: int, size: int,
+                     operation_id: str, name: str, sequence_number: int) -> 'Operation':
+        """
+        Build a pending operation over a segment already present in a store
+        
+        Used by bulk loaders that fill the store columns directly; the strings are
+        taken as given, so interning them is up to the caller.
+        
+        Args:
+            store: Store holding the segment
+            offset: Position of the segment in the store columns
+            capable: Number of capable machines at the start of the segment
+            size: Total length of the segment
+        """
+        operation = cls.__new__(cls)
+        operation.operation_id = operation_id
+        operation.name = name
+        operation.sequence_number = sequence_number
+        operation.status = OperationStatus.PENDING
+        operation.assigned_machine = None
+        operation.start_time = None
+        operation.completion_time = None
+        operation.completed_quantity = 0
+        operation._store = store
+        operation._offset = offset
+        operation._capable = capable
+        operation._size = size
+        return operation
+
+    def copy(self) -> 'Operation':
+        """Detached copy of the operation's state, sharing its store segment"""
+        operation = Operation.__new__(Operation)
+        operation.operation_id = self.operation_id
+        operation.name = self.name
+        operation.sequence_number = self.sequence_number
+        operation.status = self.status
+        operation.assigned_machine = self.assigned_machine
+        operation.start_time = self.start_time
+        operation.completion_time = self.completion_time
+        operation.completed_quantity = self.completed_quantity
+        operation._store = self._store
+        operation._offset = self._offset
+        operation._capable = self._capable
+        operation._size = self._size
+        return operation
+
+    @property
+    def capable_machines(self) -> List[str]:
+        """List of machine IDs that can perform this operation"""
+        return [MACHINE_IDS[index] for index in self._store.machines[self._offset:self._offset + self._capable]]
+
+    def processing_time(self, machine_id: str) -> float:
+        """Processing time on one machine, without building the processing_times view"""
+        return ProcessingTimes(self)[machine_id]
+
+    @property
+    def processing_times(self) -> ProcessingTimes:
+        """Mapping of machine_id to processing time"""
+        return ProcessingTimes(self)
+
+    def __repr__(self) -> str:
+        return (f"Operation(operation_id={self.operation_id!r}, name={self.name!r}, "
+                f"capable_machines={self.capable_machines!r}, processing_times={self.processing_times!r}, "
+                f"sequence_number={self.sequence_number!r}, status={self.status!r}, "
+                f"assigned_machine={self.assigned_machine!r})")
 
     def get_progress_percentage(self):
         """Calculate the progress percentage of the operation"""
@@ -28,7 +213,7 @@ class Operation:
         elif self.status == OperationStatus.PENDING:
             return 0
         elif self.status == OperationStatus.IN_PROGRESS and self.start_time and self.assigned_machine:
-            current_time = datetime.now()
+            current_time = clock.now()
             total_time = self.processing_times[self.assigned_machine]
             elapsed_time = (current_time - self.start_time).total_seconds()
             progress = (elapsed_time / total_time) * 100
@@ -42,7 +227,7 @@ class Operation:
         elif self.status == OperationStatus.PENDING:
             return min(self.processing_times.values()) if self.processing_times else 0
         elif self.status == OperationStatus.IN_PROGRESS and self.start_time and self.assigned_machine:
-            current_time = datetime.now()
+            current_time = clock.now()
             total_time = self.processing_times[self.assigned_machine]
             elapsed_time = (current_time - self.start_time).total_seconds()
             remaining = total_time - elapsed_time
@@ -50,17 +235,78 @@ class Operation:
         return 0
 
 class Order:
-    def __init__(self, order_code: str, quantity: int):
+    __slots__ = ('order_code', 'quantity', 'operations', 'created_at', 'status', 'start_time',
+                 'completion_time', 'is_forced', 'force_time', 'halted_operations', '_listeners', '_store',
+                 'version', '_by_id', '_by_sequence', '_sequence')
+
+    def __init__(self, order_code: str, quantity: int, store: OperationStore = None):
         self.order_code = order_code
         self.quantity = quantity
         self.operations: List[Operation] = []
-        self.created_at = datetime.now()
+        self.created_at = clock.now()
         self.status: OperationStatus = OperationStatus.PENDING
         self.start_time: datetime = None
         self.completion_time: datetime = None
         self.is_forced = False
         self.force_time = None
         self.halted_operations = {}  # Store halted operations with their progress
+        self._listeners = []  # Callables notified after each state change
+        self.version = 0  # Bumped by every state change, so views of the order can be cached per version
+        self._store = store  # OperationStore for this order's operations, shared with its order book
+        self._by_id: Dict[str, Operation] = None  # operation_id -> operation, built on first lookup
+        self._by_sequence: Dict[int, Operation] = None  # sequence_number -> operation, built on first lookup
+        self._sequence = None  # Cached get_operation_sequence() result, reset when operations change
+
+    def add_listener(self, callback) -> None:
+        """
+        Register a callable to be notified of state changes
+        
+        Args:
+            callback: Called as callback(order, event, operation) after each mutation,
+                      where operation is None for order-level events
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback) -> None:
+        """Unregister a callable previously passed to add_listener"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event: str, operation: Operation = None) -> None:
+        """Tell every registered listener that this order changed"""
+        self.version += 1
+        for callback in self._listeners:
+            callback(self, event, operation)
+
+    def touch(self) -> None:
+        """Record a state change made without going through the Order methods"""
+        self.version += 1
+
+    def copy(self) -> 'Order':
+        """
+        Detached copy of the order and its operations at its current version
+
+        The copy has no listeners and shares the operation store, so it is cheap
+        enough to take per change; changing it notifies nobody.
+        """
+        order = Order.__new__(Order)
+        order.order_code = self.order_code
+        order.quantity = self.quantity
+        order.operations = [operation.copy() for operation in self.operations]
+        order.created_at = self.created_at
+        order.status = self.status
+        order.start_time = self.start_time
+        order.completion_time = self.completion_time
+        order.is_forced = self.is_forced
+        order.force_time = self.force_time
+        order.halted_operations = {operation_id: dict(halted) for operation_id, halted in self.halted_operations.items()}
+        order._listeners = []
+        order.version = self.version
+        order._store = self._store
+        order._by_id = None
+        order._by_sequence = None
+        order._sequence = None
+        return order
         
     def add_operation(self, operation_id: str, name: str, capable_machines: List[str], 
                      processing_times: Dict[str, float], sequence_number: int) -> None:
@@ -79,23 +325,77 @@ class Order:
             name=name,
             capable_machines=capable_machines,
             processing_times=processing_times,
-            sequence_number=sequence_number
+            sequence_number=sequence_number,
+            store=self._store
         )
-        self.operations.append(operation)
+        # Keep operations sorted by sequence number; equal numbers stay in insertion order
+        if self.operations and sequence_number < self.operations[-1].sequence_number:
+            position = bisect_right(self.operations, sequence_number, key=lambda x: x.sequence_number)
+            self.operations.insert(position, operation)
+        else:
+            self.operations.append(operation)
+        self._index_operation(operation)
+        self._sequence = None
+        self.version += 1
+
+    def add_operations(self, operations: List[dict]) -> None:
+        """
+        Add many operations at once, sorting only once
+        
+        Args:
+            operations: Dictionaries holding the add_operation() arguments of each operation
+        """
+        self.extend_operations([Operation(store=self._store, **spec) for spec in operations])
+
+    def extend_operations(self, operations: List[Operation]) -> None:
+        """
+        Add already built operations, sorting only once
+        
+        Args:
+            operations: Operation objects, ideally sharing this order's store
+        """
+        for operation in operations:
+            self.operations.append(operation)
+            self._index_operation(operation)
         # Sort operations by sequence number
         self.operations.sort(key=lambda x: x.sequence_number)
+        self._sequence = None
+        self.version += 1
+
+    def _index_operation(self, operation: Operation) -> None:
+        """Add an operation to the lookup indexes, keeping the first one in sequence order on clashes"""
+        if self._by_id is None:
+            return
+        existing = self._by_id.get(operation.operation_id)
+        if existing is None or operation.sequence_number < existing.sequence_number:
+            self._by_id[operation.operation_id] = operation
+        self._by_sequence.setdefault(operation.sequence_number, operation)
     
     def start_order(self) -> None:
         """Start the order processing"""
         if self.status == OperationStatus.PENDING:
             self.status = OperationStatus.IN_PROGRESS
-            self.start_time = datetime.now()
+            self.start_time = clock.now()
+            self._notify('order_started')
     
     def complete_order(self) -> None:
         """Mark the order as completed"""
         if self.status == OperationStatus.IN_PROGRESS:
             self.status = OperationStatus.COMPLETED
-            self.completion_time = datetime.now()
+            self.completion_time = clock.now()
+            self._notify('order_completed')
+    
+    def mark_completed(self) -> None:
+        """
+        Mark the order completed once every operation is, whatever its status
+
+        complete_order() only completes an order that was started; this also
+        completes one whose operations were finished while it was pending.
+        """
+        if self.status != OperationStatus.COMPLETED:
+            self.status = OperationStatus.COMPLETED
+            self.completion_time = clock.now()
+            self._notify('order_completed')
     
     def start_operation(self, operation_id: str, machine_id: str) -> None:
         """
@@ -110,7 +410,8 @@ class Order:
             if machine_id in operation.capable_machines:
                 operation.status = OperationStatus.IN_PROGRESS
                 operation.assigned_machine = machine_id
-                operation.start_time = datetime.now()
+                operation.start_time = clock.now()
+                self._notify('operation_started', operation)
                 if not self.start_time:
                     self.start_order()
             else:
@@ -127,8 +428,9 @@ class Order:
         operation = self.get_operation_details(operation_id)
         if operation and operation.status == OperationStatus.IN_PROGRESS:
             operation.status = OperationStatus.COMPLETED
-            operation.completion_time = datetime.now()
+            operation.completion_time = clock.now()
             operation.completed_quantity = completed_quantity
+            self._notify('operation_completed', operation)
             
             # Check if all operations are completed
             if all(op.status == OperationStatus.COMPLETED for op in self.operations):
@@ -191,14 +493,16 @@ class Order:
         
         return remaining_hours
     
-    def get_operation_sequence(self) -> List[Operation]:
+    def get_operation_sequence(self) -> Tuple[Operation, ...]:
         """
         Get operations in their correct sequence
         
         Returns:
-            List of operations sorted by sequence number
+            Tuple of operations sorted by sequence number, cached until operations are added
         """
-        return sorted(self.operations, key=lambda x: x.sequence_number)
+        if self._sequence is None:
+            self._sequence = tuple(sorted(self.operations, key=lambda x: x.sequence_number))
+        return self._sequence
     
     def estimate_total_hours(self, machine_selection: Dict[str, str] = None) -> float:
         """
@@ -238,10 +542,9 @@ class Order:
         Returns:
             Operation object if found, None otherwise
         """
-        for operation in self.operations:
-            if operation.operation_id == operation_id:
-                return operation
-        return None
+        if self._by_id is None:
+            self._build_indexes()
+        return self._by_id.get(operation_id)
     
     def get_operation_by_sequence(self, sequence_number: int) -> Operation:
         """
@@ -253,10 +556,16 @@ class Order:
         Returns:
             Operation object if found, None otherwise
         """
+        if self._by_sequence is None:
+            self._build_indexes()
+        return self._by_sequence.get(sequence_number)
+
+    def _build_indexes(self) -> None:
+        """Build the lookup indexes; most orders are never looked up, so this waits for the first lookup"""
+        self._by_id = {}
+        self._by_sequence = {}
         for operation in self.operations:
-            if operation.sequence_number == sequence_number:
-                return operation
-        return None
+            self._index_operation(operation)
     
     def __str__(self) -> str:
         operations_str = "\n".join([
@@ -272,26 +581,21 @@ class Order:
     def force_order(self) -> None:
         """Mark order as forced and halt conflicting operations"""
         self.is_forced = True
-        self.force_time = datetime.now()
-        
-        # Halt all operations that are using our required machines
-        required_machines = set()
-        for op in self.operations:
-            required_machines.update(op.capable_machines)
-        
-        # This should be called from the scheduling logic to actually halt others
-        # (implementation shown in the schedule_orders function above)
+        self.force_time = clock.now()
+        # The scheduler halts the operations running on the machines this order takes
+        self._notify('forced')
 
     def unforce_order(self) -> None:
         """Remove force status from the order"""
         self.is_forced = False
         self.force_time = None
+        self._notify('unforced')
 
     def halt_operation(self, operation_id: str) -> None:
         """Halt an operation and store its progress"""
         operation = self.get_operation_details(operation_id)
         if operation and operation.status == OperationStatus.IN_PROGRESS:
-            current_time = datetime.now()
+            current_time = clock.now()
             elapsed_time = (current_time - operation.start_time).total_seconds()
             total_time = operation.processing_times[operation.assigned_machine]
             progress = (elapsed_time / total_time) * 100
@@ -306,6 +610,7 @@ class Order:
             operation.start_time = None
             operation.completion_time = None
             operation.assigned_machine = None
+            self._notify('operation_halted', operation)
 
     def resume_operation(self, operation_id: str) -> None:
         """Resume a halted operation from its previous progress"""
@@ -314,9 +619,10 @@ class Order:
             halted_data = self.halted_operations[operation_id]
             operation.status = OperationStatus.IN_PROGRESS
             operation.assigned_machine = halted_data['machine']
-            operation.start_time = datetime.now() - timedelta(seconds=halted_data['elapsed_time'])
+            operation.start_time = clock.now() - timedelta(seconds=halted_data['elapsed_time'])
             operation.completion_time = operation.start_time + timedelta(seconds=operation.processing_times[operation.assigned_machine])
             del self.halted_operations[operation_id]
+            self._notify('operation_resumed', operation)
 
     def get_halted_progress(self, operation_id: str) -> float:
         """Get the progress of a halted operation"""
@@ -333,6 +639,67 @@ class Order:
             return halted_data['remaining_time']
         return 0
 
+class MachineIndex:
+    """
+    Index from machine ID to the in-progress operations occupying it
+
+    Kept current by listening to the orders it tracks, so finding what runs on a
+    machine is a dictionary lookup instead of a scan over every order.
+    """
+
+    def __init__(self):
+        self._running: Dict[str, Dict[tuple, tuple]] = {}
+
+    def track(self, order: Order) -> None:
+        """Index an order's in-progress operations and follow its future changes"""
+        for operation in order.operations:
+            if operation.status == OperationStatus.IN_PROGRESS and operation.assigned_machine:
+                self._add(operation.assigned_machine, order, operation)
+        order.add_listener(self._on_order_event)
+
+    def occupants(self, machine_id: str) -> List[tuple]:
+        """
+        Get the operations currently running on a machine
+        
+        Args:
+            machine_id: ID of the machine
+            
+        Returns:
+            List of (order, operation) pairs, usually zero or one
+        """
+        running = self._running.get(machine_id)
+        if not running:
+            return []
+        # Drop operations whose status was changed without going through the Order methods
+        stale = [key for key, (order, operation) in running.items()
+                 if operation.status != OperationStatus.IN_PROGRESS or operation.assigned_machine != machine_id]
+        for key in stale:
+            del running[key]
+        return list(running.values())
+
+    def all_occupants(self) -> List[tuple]:
+        """Get the (order, operation) pairs running on any machine"""
+        return [occupant for machine_id in list(self._running) for occupant in self.occupants(machine_id)]
+
+    def get(self, machine_id: str):
+        """Get the (order, operation) pair occupying a machine, or None if it is idle"""
+        occupants = self.occupants(machine_id)
+        return occupants[0] if occupants else None
+
+    def _add(self, machine_id: str, order: Order, operation: Operation) -> None:
+        self._running.setdefault(machine_id, {})[(order.order_code, operation.operation_id)] = (order, operation)
+
+    def _discard(self, machine_id: str, order: Order, operation: Operation) -> None:
+        self._running.get(machine_id, {}).pop((order.order_code, operation.operation_id), None)
+
+    def _on_order_event(self, order: Order, event: str, operation: Operation) -> None:
+        if event in ('operation_started', 'operation_resumed'):
+            self._add(operation.assigned_machine, order, operation)
+        elif event == 'operation_completed':
+            self._discard(operation.assigned_machine, order, operation)
+        elif event == 'operation_halted':
+            self._discard(order.halted_operations[operation.operation_id]['machine'], order, operation)
+
 # Example usage:
 if __name__ == "__main__":
     # Create a sample order
@@ -1,54 +1,131 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from datetime import datetime, timedelta
+import atexit
+import os
+import tempfile
+import threading
+import time
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response, g
+from flask.json.provider import DefaultJSONProvider
+from datetime import timedelta
 from collections import defaultdict
-import csv
 import json
 
+import clock
 # Import everything we need from OrderManagment
-from OrderManagment import Order, Operation, OperationStatus
+from OrderManagment import OperationStatus
+from csv_loader import load_orders
+from scheduler import IncrementalScheduler
+from columnar import ColumnarSchedule
+import columnar
+import binary_snapshot
+from state_store import OrderStateStore, SQLiteStateStore
+from events import EventHub
+from status_delta import MachineStatusDeltas
+from order_index import OrderIndex, DEFAULT_PAGE_SIZE
+from machine_registry import MachineRegistry
+from fragment_cache import FragmentCache
+import planning
+from optimizer import ScheduleOptimizer
+import metrics
+from state_writer import StateWriter, OrderBookPublisher
+from shared_state import SharedStateFile, StateMirror, OwnerServer, RemoteWriter
+from ticker import Ticker, UpcomingEvents
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider recording serialization time as a metrics span"""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.span('json_dumps'):
+            return super().dumps(obj, **kwargs)
 
 app = Flask(__name__, static_folder='static', static_url_path='')
+app.json = TimedJSONProvider(app)
 app.secret_key = 'your-secret-key-here'  # Required for flash messages
 
 # Make OperationStatus available globally
 app.jinja_env.globals.update(OperationStatus=OperationStatus)
 
+# Multi-process mode, see shared_state.py: '' serves from this process alone, 'owner' runs the
+# writer and publishes every state to SHARED_STATE, 'worker' serves requests from that file and
+# forwards every change to the owner listening on OWNER_ADDRESS
+ROLE = os.environ.get('ORDER_ROLE', '')
+if ROLE not in ('', 'owner', 'worker'):
+    raise ValueError(f"ORDER_ROLE must be owner, worker or empty, not {ROLE!r}")
+SHARED_STATE = os.environ.get('ORDER_SHARED_STATE') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'orders-state.bin')
+OWNER_ADDRESS = os.environ.get('ORDER_OWNER_ADDRESS') or SHARED_STATE + '.sock'
+# The owner unpickles what workers send it, so their shared secret cannot be a default anyone can read here
+OWNER_KEY = os.environ.get('ORDER_OWNER_KEY', '').encode()
+if ROLE and not OWNER_KEY:
+    raise ValueError("ORDER_OWNER_KEY must be set for the owner and worker roles")
+
 # Global variable to store orders
 orders = {}
 
-def dh_format_to_seconds(dh_str):
-    """Convert a string in the format 'XD YH ZM' to seconds"""
-    # Handle different formats more robustly
-    try:
-        total_seconds = 0
-        
-        # Parse days if present
-        if 'D' in dh_str:
-            days_part = dh_str.split('D')[0]
-            total_seconds += int(days_part) * 86400  # 24*60*60 seconds in a day
-            dh_str = dh_str.split('D')[1]
-        
-        # Parse hours if present
-        if 'H' in dh_str:
-            hours_part = dh_str.split('H')[0]
-            total_seconds += int(hours_part) * 3600  # 60*60 seconds in an hour
-            dh_str = dh_str.split('H')[1] if 'H' in dh_str and len(dh_str.split('H')) > 1 else ""
-        
-        # Parse minutes if present
-        if 'M' in dh_str:
-            minutes_part = dh_str.split('M')[0]
-            total_seconds += int(minutes_part) * 60
-            dh_str = dh_str.split('M')[1] if 'M' in dh_str and len(dh_str.split('M')) > 1 else ""
-        
-        # Parse seconds if present
-        if 'S' in dh_str:
-            seconds_part = dh_str.split('S')[0]
-            total_seconds += int(seconds_part)
-        
-        return total_seconds
-    except Exception as e:
-        print(f"Error parsing time format '{dh_str}': {e}")
-        return 3600  # Default to 1 hour if parsing fails
+# Incremental scheduler for the current order book
+scheduler = None
+
+# Runtime order state survives restarts in this SQLite database; set ORDER_STATE_DB to '' to keep it in memory only
+STATE_DB = os.environ.get('ORDER_STATE_DB', 'order_state.db')
+# Workers only mirror the owner's state, so only the owner persists it
+state_store = SQLiteStateStore(STATE_DB) if STATE_DB and ROLE != 'worker' else OrderStateStore()
+atexit.register(state_store.close)
+
+# State transitions streamed to /api/stream clients
+events = EventHub()
+# Thread advancing the schedule while stream clients are connected, if there is no background scheduler
+stream_pump = None
+stream_pump_lock = threading.Lock()
+
+# Per-machine change versions behind /api/machine_status?since=
+machine_deltas = MachineStatusDeltas()
+
+# Status, forced, halted and machine indexes behind the paginated order views
+order_index = None
+
+# Machines of the current order book, with their capability and running-operation indexes
+machine_registry = None
+
+# Rendered order cards keyed on (kind, order_code, order version), for the order book in fragment_book
+fragment_cache = FragmentCache()
+fragment_book = None
+
+# Schedule optimizer searching in worker processes, started through /api/optimizer
+optimizer = None
+optimizer_lock = threading.Lock()
+
+# Builds the states the writer publishes, for the order book in publisher.orders
+publisher = None
+
+# Owner: the state file every published state is written to; worker: its copy of the owner's order book
+shared_state_file = SharedStateFile(SHARED_STATE) if ROLE == 'owner' else None
+mirror = None
+
+# Readers accept a published state this far past its next event (or its time) before waiting for a fresher one
+MAX_LAG = timedelta(seconds=float(os.environ.get('ORDER_MAX_LAG', '1')))
+
+# Longest the background scheduler goes without publishing, see ticker.py; 0 turns it off, leaving readers
+# to have the state advanced once it lags MAX_LAG behind them
+TICK = timedelta(seconds=float(os.environ.get('ORDER_TICK', '10')))
+
+# Operations showing this much progress are completed
+COMPLETED_PROGRESS = 99.9
+
+# Requests carrying an X-Profile header answer with their cProfile summary when ORDER_PROFILING is 1
+PROFILING = os.environ.get('ORDER_PROFILING') == '1'
+
+metrics.registry.describe('orders_operations_halted_total', 'counter', 'Operations halted for forced orders')
+metrics.registry.describe('orders_cache_hits_total', 'counter', 'Cache lookups answered from a cache')
+metrics.registry.describe('orders_cache_misses_total', 'counter', 'Cache lookups that had to compute the value')
+metrics.registry.describe('orders_request_seconds', 'histogram', 'Request latency by endpoint')
+
+# Order sections of the dashboard: (query key, status filter, halted filter)
+ORDER_SECTIONS = (
+    ('in_progress', OperationStatus.IN_PROGRESS, None),
+    ('pending', OperationStatus.PENDING, None),
+    ('completed', OperationStatus.COMPLETED, None),
+    ('halted', None, True),
+)
 
 def format_duration(seconds):
     """Convert seconds to days, hours, minutes, and seconds format"""
@@ -68,184 +145,236 @@ def format_duration(seconds):
     else:
         return f"{int(minutes)}M {int(seconds)}S"
 
-def load_orders_from_csv():
+@metrics.timed()
+def load_orders_from_csv(path='orders_data.csv'):
     global orders
     if not orders:  # Only load if orders is empty
-        orders = {}
-        with open('orders_data.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                order_code = row['order_code']
-                if order_code not in orders:
-                    orders[order_code] = Order(
-                        order_code=order_code,
-                        quantity=int(row['quantity'])
-                    )
-                    # Ensure order starts as PENDING
-                    orders[order_code].status = OperationStatus.PENDING
-                    orders[order_code].start_time = None
-                    orders[order_code].completion_time = None
-                
-                # Parse capable machines
-                capable_machines = row['capable_machines'].split(',')
-                
-                # Parse processing times (now in 'XD YH' format)
-                processing_times = {}
-                for pt in row['processing_times'].split(';'):
-                    machine, time_str = pt.split(':')
-                    # Convert 'XD YH' to seconds for internal processing
-                    processing_times[machine] = dh_format_to_seconds(time_str)
-                
-                # Add operation to order with PENDING status
-                operation = Operation(
-                    operation_id=row['operation_id'],
-                    name=row['operation_name'],
-                    capable_machines=capable_machines,
-                    processing_times=processing_times,
-                    sequence_number=int(row['sequence_number'])
-                )
-                operation.status = OperationStatus.PENDING
-                operation.start_time = None
-                operation.completion_time = None
-                operation.assigned_machine = None
-                operation.completed_quantity = 0
-                
-                orders[order_code].add_operation(
-                    operation_id=row['operation_id'],
-                    name=row['operation_name'],
-                    capable_machines=capable_machines,
-                    processing_times=processing_times,
-                    sequence_number=int(row['sequence_number'])
-                )
+        snapshot = binary_snapshot.snapshot_path(path)
+        if binary_snapshot.is_fresh(snapshot, path):
+            try:
+                orders, report = binary_snapshot.load_orders(snapshot)
+                app.logger.info(str(report))
+                return restore_order_state(orders)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring order snapshot {snapshot}: {e}")
+        orders, report = load_orders(path)
+        for line, message in report.errors[:20]:
+            print(f"Skipping malformed row {path}:{line}: {message}")
+        if report.error_count > 20:
+            print(f"... and {report.error_count - 20} more malformed rows")
+        app.logger.info(str(report))
+        # A clean load is cached; a file with bad rows keeps being parsed so they keep being reported
+        if report.error_count == 0:
+            try:
+                binary_snapshot.save_orders(orders, snapshot)
+            except (OSError, ValueError) as e:
+                print(f"Could not write order snapshot {snapshot}: {e}")
+        restore_order_state(orders)
     return orders
 
-def schedule_orders(orders):
-    current_time = datetime.now()
-    machine_schedule = defaultdict(list)
-    halted_orders = set()
-    
-    # Sort orders by creation time first (depth-first)
-    sorted_orders = sorted(orders.values(), key=lambda o: o.created_at)
-    
-    # Then collect all operations including halted ones
-    all_operations = []
-    for order in sorted_orders:  # Process orders in creation order
-        for operation in order.get_operation_sequence():
-            # Add halted operations with remaining time
-            if order.is_operation_halted(operation.operation_id):
-                halted_data = order.halted_operations[operation.operation_id]
-                remaining_time = operation.processing_times[halted_data['machine']] - halted_data['elapsed_time']
-                all_operations.append((order, operation, remaining_time))
-            else:
-                all_operations.append((order, operation, None))
-
-    # Modify sorting key to prioritize earlier created orders
-    all_operations.sort(key=lambda x: (
-        -x[0].is_forced,
-        -int(x[0].is_operation_halted(x[1].operation_id)),
-        x[0].created_at,  # Add creation time to sort key
-        x[1].sequence_number
-    ))
-    
-    # Schedule operations with conflict resolution
-    for order, operation, remaining_time in all_operations:
-        # Find earliest available machine that can handle this operation
-        best_machine = None
-        best_start = current_time + timedelta(days=365)  # Far future
-        
-        for machine in operation.capable_machines:
-            # Get current schedule for this machine
-            machine_ops = machine_schedule[machine]
-            last_end = current_time if not machine_ops else machine_ops[-1][3]
-            
-            # Check if this machine can accommodate the operation
-            if remaining_time:  # Halted operation resume
-                op_duration = remaining_time
-            else:
-                op_duration = operation.processing_times[machine]
-                
-            potential_start = max(last_end, current_time)
-            
-            if potential_start < best_start:
-                best_start = potential_start
-                best_machine = machine
-        
-        if best_machine:
-            end_time = best_start + timedelta(seconds=op_duration)
-            machine_schedule[best_machine].append((
-                order,
-                operation,
-                best_start,
-                end_time
-            ))
-            
-            # Halt conflicting operations
-            if order.is_forced:
-                for other_order in orders.values():
-                    if other_order != order:
-                        for op in other_order.operations:
-                            if op.assigned_machine == best_machine and op.status == OperationStatus.IN_PROGRESS:
-                                other_order.halt_operation(op.operation_id)
-                                halted_orders.add(other_order)
-    
-    # After scheduling operations, update their statuses
-    for machine_id, scheduled_ops in machine_schedule.items():
-        for order, operation, start_time, end_time in scheduled_ops:
-            if start_time <= current_time <= end_time:
-                if operation.status == OperationStatus.PENDING:
-                    try:
-                        order.start_operation(operation.operation_id, machine_id)
-                        operation.assigned_machine = machine_id
-                        operation.start_time = start_time
-                        operation.completion_time = end_time
-                    except ValueError as e:
-                        print(f"Error starting operation: {e}")
-            elif current_time > end_time and operation.status != OperationStatus.COMPLETED:
-                operation.completed_quantity = order.quantity
-                order.complete_operation(operation.operation_id, order.quantity)
-    
-    # Fix for completed orders: Update order status based on operations completion
-    for order in orders.values():
-        # Check if all operations are completed
-        all_ops_completed = True
-        for op in order.operations:
-            if op.status != OperationStatus.COMPLETED:
-                all_ops_completed = False
-                break
-                
-        if all_ops_completed:
-            # Ensure the order is marked as completed
-            if order.status != OperationStatus.COMPLETED:
-                order.status = OperationStatus.COMPLETED
-                order.completion_time = datetime.now()
-        elif any(op.status == OperationStatus.IN_PROGRESS for op in order.operations):
-            # Ensure the order is marked as in progress
-            if order.status == OperationStatus.PENDING:
-                order.start_order()
+def restore_order_state(loaded_orders):
+    """Apply the persisted runtime state to a freshly loaded order book and follow its changes"""
+    restored = state_store.restore(loaded_orders)
+    if restored:
+        app.logger.info(f"Restored the state of {restored} orders from {STATE_DB}")
+    for order in loaded_orders.values():
+        state_store.track(order)
+    events.watch(loaded_orders)
+    return loaded_orders
+
+def plan(orders, mode, current_time):
+    """Schedule of a non-greedy mode, without applying it"""
+    if mode == 'optimized' and optimizer is not None and optimizer.best is not None:
+        return optimizer.plan(orders, current_time)
+    return planning.plan_eft(orders, current_time)
 
-    return machine_schedule, halted_orders
+def get_scheduler():
+    """Return the incremental scheduler for the current order book, creating it on first use"""
+    global scheduler
+    if scheduler is None or scheduler.orders is not orders:
+        scheduler = IncrementalScheduler(orders)
+    return scheduler
 
-def get_machine_status(orders, machine_schedule):
-    """Get detailed status for each machine including current and next operations"""
-    machine_status = {}
-    current_time = datetime.now()
+def get_order_index():
+    """Return the order index for the current order book, creating it on first use"""
+    global order_index
+    if order_index is None or order_index.orders is not orders:
+        order_index = OrderIndex(orders)
+    return order_index
+
+def get_machine_registry(book=None):
+    """Return the machine registry for an order book, the current one by default, creating it on first use"""
+    global machine_registry
+    book = orders if book is None else book
+    if machine_registry is None or machine_registry.orders is not book:
+        machine_registry = MachineRegistry(book)
+    machine_registry.sync()
+    return machine_registry
+
+def get_publisher():
+    """Return the state publisher for the current order book, creating it on first use"""
+    global publisher
+    if publisher is None or publisher.orders is not orders:
+        publisher = OrderBookPublisher(orders)
+    return publisher
+
+def publish_state():
+    """
+    Bring the order book up to the current time and build the state readers get
+
+    Runs on the writer thread after every batch of changes, and is the only
+    place the schedule is advanced for requests.
+    """
+    load_orders_from_csv()
+    engine = get_scheduler()
+    halted = engine.advance()
+    force_update_order_status()
+    state_store.capture()
+    state = get_publisher().publish(clock.now(), get_order_index(), engine.snapshot(),
+                                    get_machine_registry().ids, events.last_event_id())
+    if TICK:
+        # Operations halted for forced orders are planned again from the time of the next advance, so until
+        # the forced orders stop halting others the state moves with time: advance it again within MAX_LAG
+        horizon = state.time + (min(MAX_LAG, TICK) if halted else TICK)
+        due = upcoming_events.update(state)
+        state.next_event = min(due, horizon) if due else horizon
+    machine_deltas.update(state.schedule)
+    return state
+
+def publish_shared_state():
+    """publish_state() for the owner, writing every state to the shared state file for the workers"""
+    state = publish_state()
+    shared_state_file.write(state)
+    return state
+
+def mirror_state(shared):
+    """
+    Build the state a worker serves from the owner's state file
+
+    The orders changed since the last file are copied into this process's order
+    book, which is then published like the owner's live book.
+    """
+    global mirror
+    book = load_orders_from_csv()
+    if mirror is None or mirror.orders is not book:
+        mirror = StateMirror(book)
+    if shared.layout != mirror.layout:
+        # The owner reloaded its order book, whose versions start over
+        fragment_cache.clear()
+    index, book_publisher = get_order_index(), get_publisher()
+    for order in mirror.update(shared):
+        index.mark(order)
+        book_publisher.mark(order)
+    state = book_publisher.publish(shared.time, index, mirror.snapshot(shared), shared.machine_ids, shared.event_id)
+    state.next_event = shared.next_event
+    machine_deltas.update(state.schedule)
+    return state
+
+# Every change to the order book goes through this one writer, the owner's for a worker;
+# handlers read its published state
+if ROLE == 'worker':
+    writer = RemoteWriter(SHARED_STATE, OWNER_ADDRESS, OWNER_KEY, mirror_state, max_lag=MAX_LAG)
+else:
+    writer = StateWriter(publish_shared_state if ROLE == 'owner' else publish_state, max_lag=MAX_LAG)
+
+def parse_flag(value):
+    """Parse an optional yes/no query parameter"""
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"expected true or false, got {value!r}")
+
+def order_filters(args):
+    """
+    Read the order filters of a request's query string
+
+    Raises:
+        ValueError: If a filter has an invalid value
+    """
+    filters = {
+        'forced': parse_flag(args.get('forced')),
+        'halted': parse_flag(args.get('halted')),
+        'machine': args.get('machine') or None,
+        'prefix': args.get('prefix') or None,
+    }
+    status = args.get('status')
+    if status:
+        matches = [s for s in OperationStatus if status.lower() in (s.name.lower(), s.value.lower())]
+        if not matches:
+            raise ValueError(f"unknown status {status!r}")
+        filters['status'] = matches[0]
+    return filters
+
+def order_summary(order):
+    """JSON-friendly summary of an order for /api/orders"""
+    return {
+        'order_code': order.order_code,
+        'quantity': order.quantity,
+        'status': order.status.value,
+        'is_forced': order.is_forced,
+        'halted_operations': list(order.halted_operations),
+        'progress': order.get_progress_percentage(),
+        'remaining_time': order.get_remaining_time(),
+        'operations': [{
+            'operation_id': op.operation_id,
+            'name': op.name,
+            'sequence_number': op.sequence_number,
+            'status': op.status.value,
+            'assigned_machine': op.assigned_machine
+        } for op in order.get_operation_sequence()]
+    }
+
+def not_modified(snapshot):
+    """Return a 304 response if the client already holds this state version, otherwise None"""
+    # Pending flash messages are part of the page even when the state is unchanged
+    if session.get('_flashes'):
+        return None
+    if request.if_none_match.contains_weak(snapshot.etag):
+        metrics.inc('orders_cache_hits_total', cache='etag')
+        response = app.response_class(status=304)
+        response.set_etag(snapshot.etag, weak=True)
+        return response
+    return None
+
+def tag_response(response, snapshot):
+    """Attach the snapshot's ETag so the client can poll with If-None-Match"""
+    response = make_response(response)
+    response.set_etag(snapshot.etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def new_machine_status():
+    """Status entry for a machine with nothing scheduled"""
+    return {
+        'status': 'idle',
+        'current_order': None,
+        'current_operation': None,
+        'start_time': None,
+        'end_time': None,
+        'start_time_str': None,
+        'end_time_str': None,
+        'progress_percentage': 0,
+        'remaining_time': 0,
+        'upcoming_operations': [],
+        'full_schedule': []
+    }
+
+@metrics.timed()
+def get_machine_status(orders, machine_schedule, machine_ids=None):
+    """
+    Get detailed status for each machine including current and next operations
+
+    machine_ids lists every machine of the order book, the machine registry's by default
+    """
+    current_time = clock.now()
+    if machine_ids is None:
+        machine_ids = get_machine_registry(orders).ids
     
-    # Initialize all machines (M1-M45)
-    for i in range(1, 46):
-        machine_id = f'M{i}'
-        machine_status[machine_id] = {
-            'status': 'idle',
-            'current_order': None,
-            'current_operation': None,
-            'start_time': None,
-            'end_time': None,
-            'start_time_str': None,
-            'end_time_str': None,
-            'progress_percentage': 0,
-            'remaining_time': 0,
-            'upcoming_operations': [],
-            'full_schedule': []
-        }
+    # Every machine of the order book, idle unless the schedule says otherwise
+    machine_status = {machine_id: new_machine_status() for machine_id in machine_ids}
     
     # Process machine schedules
     for machine_id, scheduled_ops in machine_schedule.items():
@@ -253,6 +382,7 @@ def get_machine_status(orders, machine_schedule):
         current_operation = None
         upcoming_operations = []
         full_schedule = []
+        machine_status.setdefault(machine_id, new_machine_status())
         
         for order, operation, start_time, end_time in scheduled_ops:
             schedule_entry = {
@@ -328,6 +458,75 @@ def get_machine_status(orders, machine_schedule):
     
     return machine_status
 
+@metrics.timed()
+def get_machine_status_columnar(columns, current_time, machine_ids=None):
+    """
+    Vectorized get_machine_status() over a ColumnarSchedule read at current_time
+    
+    Times, progress and duration labels are computed for all slots at once; only
+    the per-slot dictionaries of the output are built in Python.
+    """
+    if machine_ids is None:
+        machine_ids = get_machine_registry().ids
+    machine_status = {machine_id: new_machine_status() for machine_id in machine_ids}
+    
+    start_times, end_times = columns.datetimes(current_time)
+    start_strs, end_strs = columns.day_time_strings(current_time)
+    start_stamps, end_stamps = columns.epoch(current_time)
+    durations = columns.format_durations(format_duration)
+    rows, busy, progress, elapsed, remaining = columns.machine_state(last=True)
+    upcoming_rows = columns.upcoming_rows(limit=2).tolist()
+    upcoming_by_machine = defaultdict(list)
+    for row in upcoming_rows:
+        upcoming_by_machine[int(columns.machine[row])].append(row)
+    
+    for index, machine_id in enumerate(columns.machine_ids):
+        status = machine_status.setdefault(machine_id, new_machine_status())
+        first, stop = int(columns.first[index]), int(columns.first[index + 1])
+        status['full_schedule'] = [{
+            'order_code': columns.orders[columns.order_index[row]].order_code,
+            'operation_name': columns.operations[row].name,
+            'start_time': start_times[row],
+            'end_time': end_times[row],
+            'start_time_str': start_strs[row],
+            'end_time_str': end_strs[row],
+            'duration': durations[row],
+            'is_completed': columns.operations[row].status == OperationStatus.COMPLETED
+        } for row in range(first, stop)]
+        status['upcoming_operations'] = [{
+            'order_code': columns.orders[columns.order_index[row]].order_code,
+            'operation_name': columns.operations[row].name,
+            'start_time_str': start_strs[row],
+            'end_time_str': end_strs[row],
+            'duration': durations[row]
+        } for row in upcoming_by_machine[index]]
+        
+        if busy[index]:
+            row = int(rows[index])
+            status.update({
+                'status': 'busy',
+                'current_order': columns.orders[columns.order_index[row]].order_code,
+                'current_operation': columns.operations[row].name,
+                'start_time': start_times[row],
+                'end_time': end_times[row],
+                'start_time_str': start_strs[row],
+                'end_time_str': end_strs[row],
+                'progress_percentage': round(float(progress[index]), 1),
+                'remaining_time': float(remaining[index]),
+                'operation_duration': durations[row],
+                'elapsed_time': format_duration(float(elapsed[index])),
+                'total_duration': float(columns.duration[row]),
+                'start_timestamp': float(start_stamps[row]),
+                'end_timestamp': float(end_stamps[row])
+            })
+        elif not status['upcoming_operations']:
+            status.update({
+                'operation_duration': "0D0H0M0S",
+                'elapsed_time': "0D0H0M0S"
+            })
+    
+    return machine_status
+
 def calculate_total_order_time(order):
     """Calculate total time for an order based on its operations"""
     total_time = 0
@@ -343,145 +542,302 @@ def get_min_processing_time(operation):
         return 0
     return min(operation.processing_times.values())
 
+# Used by the order card macros, which render outside any page context
+app.jinja_env.globals.update(format_duration=format_duration,
+                             calculate_total_order_time=calculate_total_order_time,
+                             get_min_processing_time=get_min_processing_time)
+
+def order_card(kind, order):
+    """
+    Rendered HTML of an order card, re-rendered only when the order's version changes
+
+    Args:
+        kind: 'pending', 'completed' or 'halted', naming a macro in _order_cards.html
+        order: Order to render
+    """
+    global fragment_book
+    if fragment_book is not orders:
+        # Orders of a reloaded book restart at version 0
+        fragment_cache.clear()
+        fragment_book = orders
+    macro = getattr(app.jinja_env.get_template('_order_cards.html').module, f'{kind}_card')
+    return fragment_cache.get_or_render((kind, order.order_code, order.version), lambda: macro(order))
+
 @app.route('/')
 def index():
     """
     Main page showing order information and controls
     """
-    load_orders_from_csv()
-    machine_schedule, halted_orders = schedule_orders(orders)
-    
-    # Force-check for completed orders before rendering
-    force_update_order_status()
+    state = writer.read()
+    snapshot = state.schedule
+    cached = not_modified(snapshot)
+    if cached:
+        return cached
+    current_time = clock.now()
     
-    # Group orders by status
-    orders_by_status = defaultdict(list)
-    for order in orders.values():
-        orders_by_status[order.status].append(order)
+    # One page of each order section, through the maintained indexes
+    book = state.index
+    try:
+        filters = order_filters(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        filters = order_filters({})
+    filters.pop('status', None)
+    sections = {}
+    for key, status, halted in ORDER_SECTIONS:
+        section_filters = dict(filters, status=status)
+        if halted is not None:
+            section_filters['halted'] = halted
+        page = book.page(after=request.args.get(f'{key}_after'), limit=DEFAULT_PAGE_SIZE, **section_filters)
+        next_url = None
+        if page.next_cursor is not None:
+            next_url = url_for('index', **dict(request.args.to_dict(), **{f'{key}_after': page.next_cursor}))
+        sections[key] = {'orders': page.orders, 'total': page.total, 'next_url': next_url}
+    orders_by_status = {status: sections[key]['orders'] for key, status, _ in ORDER_SECTIONS if status}
     
     # Get machine status
-    machine_status = get_machine_status(orders, machine_schedule)
-    
-    # Calculate total remaining time
-    total_remaining_time = sum(order.get_remaining_time() for order in orders.values())
-    
-    halted_order_objects = [order for order in orders.values() if any(order.is_operation_halted(op.operation_id) for op in order.operations)]
+    if columnar.available():
+        machine_status = get_machine_status_columnar(ColumnarSchedule.of(snapshot), current_time, state.machine_ids)
+    else:
+        machine_status = get_machine_status(state.orders, snapshot.materialize(current_time), state.machine_ids)
     
-    return render_template('index.html',
-                          orders=orders.values(),
-                          orders_by_status=orders_by_status,
-                          machine_status=machine_status,
-                          total_remaining_time=format_duration(total_remaining_time),
-                          calculate_total_order_time=calculate_total_order_time,
-                          format_duration=format_duration,
-                          halted_orders={order.order_code: order for order in halted_order_objects},
-                          OperationStatus=OperationStatus,
-                          get_min_processing_time=get_min_processing_time)
+    with metrics.span('render_template', template='index.html'):
+        page = render_template('index.html',
+                               orders_by_status=orders_by_status,
+                               sections=sections,
+                               filters=filters,
+                               machine_status=machine_status,
+                               total_remaining_time=format_duration(book.total_remaining_time),
+                               calculate_total_order_time=calculate_total_order_time,
+                               format_duration=format_duration,
+                               halted_orders={order.order_code: order for order in sections['halted']['orders']},
+                               OperationStatus=OperationStatus,
+                               get_min_processing_time=get_min_processing_time,
+                               order_card=order_card,
+                               stream_event_id=state.event_id)
+    return tag_response(page, snapshot)
 
+@metrics.timed()
 def force_update_order_status():
-    """Force update order status based on operations status"""
-    for order in orders.values():
+    """
+    Force update order status based on operations status
+
+    Only the orders with a running operation, from the scheduler's running-operation
+    index, and those changed since the last publish can need it, so only they are looked at.
+    """
+    candidates = {order.order_code: order for order, _ in get_scheduler().running.all_occupants()}
+    for order_code in get_publisher().changed():
+        if order_code in orders:
+            candidates[order_code] = orders[order_code]
+
+    changed = False
+    for order in candidates.values():
+        previous_status = order.status
+        order_changed = False
+        
+        # Complete operations showing 100% progress through the order, before the order's own
+        # status, so listeners like the event stream hear of it and an order is never left in
+        # progress with every operation done
+        for op in order.operations:
+            if op.status == OperationStatus.IN_PROGRESS and op.get_progress_percentage() >= COMPLETED_PROGRESS:
+                completion_time = op.completion_time
+                order.complete_operation(op.operation_id, op.completed_quantity)
+                # Keep the planned completion time the scheduler gave the operation
+                if completion_time:
+                    op.completion_time = completion_time
+                order_changed = True
+        
         # Check if all operations are completed
         if all(op.status == OperationStatus.COMPLETED for op in order.operations):
-            # Set completion time if not already set
-            if not order.completion_time:
-                order.completion_time = datetime.now()
-            # Force order to completed status
-            order.status = OperationStatus.COMPLETED
+            order.mark_completed()
         elif any(op.status == OperationStatus.IN_PROGRESS for op in order.operations):
-            order.status = OperationStatus.IN_PROGRESS
-            
-        # Update operation status for operations showing 100% progress
-        for op in order.operations:
-            if op.status == OperationStatus.IN_PROGRESS and op.get_progress_percentage() >= 99.9:
-                op.status = OperationStatus.COMPLETED
-                if not op.completion_time:
-                    op.completion_time = datetime.now()
+            order.start_order()
+        order_changed = order_changed or order.status != previous_status
+        if order_changed:
+            order.touch()
+            state_store.mark(order)
+            get_order_index().mark(order)
+            get_machine_registry().mark(order)
+            get_publisher().mark(order)
+            changed = True
+    
+    # The planned completion times put back here bypass the Order methods, so record them for the snapshot cache
+    if changed:
+        get_scheduler().touch()
 
 @app.route('/start_operation', methods=['POST'])
 def start_operation():
-    order_code = request.form.get('order_code')
-    operation_id = request.form.get('operation_id')
-    machine_id = request.form.get('machine_id')
-    
-    global orders
+    message = writer.call(apply_start_operation, request.form.get('order_code'),
+                          request.form.get('operation_id'), request.form.get('machine_id'))
+    if message:
+        flash(*message)
+    return redirect(url_for('index'))
+
+def apply_start_operation(order_code, operation_id, machine_id):
+    """Start an operation; returns the (message, category) to flash, None for an unknown order"""
     if order_code in orders:
         try:
             orders[order_code].start_operation(operation_id, machine_id)
-            flash(f'Started operation {operation_id} on machine {machine_id} for order {order_code}', 'success')
+            return f'Started operation {operation_id} on machine {machine_id} for order {order_code}', 'success'
         except ValueError as e:
-            flash(str(e), 'error')
-    
-    return redirect(url_for('index'))
+            return str(e), 'error'
 
 @app.route('/complete_operation', methods=['POST'])
 def complete_operation():
-    order_code = request.form.get('order_code')
-    operation_id = request.form.get('operation_id')
-    completed_quantity = int(request.form.get('completed_quantity', 0))
-    
-    global orders
+    message = writer.call(apply_complete_operation, request.form.get('order_code'),
+                          request.form.get('operation_id'), int(request.form.get('completed_quantity', 0)))
+    if message:
+        flash(*message)
+    return redirect(url_for('index'))
+
+def apply_complete_operation(order_code, operation_id, completed_quantity):
+    """Complete an operation; returns the (message, category) to flash, None for an unknown order"""
     if order_code in orders:
         try:
             orders[order_code].complete_operation(operation_id, completed_quantity)
-            flash(f'Completed operation {operation_id} for order {order_code}', 'success')
+            return f'Completed operation {operation_id} for order {order_code}', 'success'
         except ValueError as e:
-            flash(str(e), 'error')
-    
-    return redirect(url_for('index'))
+            return str(e), 'error'
 
 @app.route('/force_order', methods=['POST'])
 def force_order():
-    order_code = request.form.get('order_code')
-    global orders
-    
-    if order_code in orders:
-        order = orders[order_code]
-        if order.status == OperationStatus.PENDING:
-            try:
-                order.force_order()
-                # Immediately reschedule all orders
-                machine_schedule, halted_orders = schedule_orders(orders)
-                if halted_orders:
-                    flash(f'Order {order_code} has been forced. Orders {", ".join(halted_orders)} were halted to accommodate it.', 'success')
-                else:
-                    flash(f'Order {order_code} has been forced to the front of the queue', 'success')
-            except Exception as e:
-                flash(str(e), 'error')
-        else:
-            flash(f'Cannot force order {order_code} - only pending orders can be forced', 'error')
-    
+    message = writer.call(apply_force_order, request.form.get('order_code'))
+    if message:
+        flash(*message)
     return redirect(url_for('index'))
 
+def apply_force_order(order_code):
+    """Force an order and reschedule; returns the (message, category) to flash, None for an unknown order"""
+    if order_code not in orders:
+        return None
+    order = orders[order_code]
+    if order.status != OperationStatus.PENDING:
+        return f'Cannot force order {order_code} - only pending orders can be forced', 'error'
+    try:
+        order.force_order()
+        # Immediately reschedule all orders
+        machine_schedule, halted_orders = get_scheduler().refresh()
+    except Exception as e:
+        return str(e), 'error'
+    if halted_orders:
+        halted = ", ".join(halted_order.order_code for halted_order in halted_orders)
+        return f'Order {order_code} has been forced. Orders {halted} were halted to accommodate it.', 'success'
+    return f'Order {order_code} has been forced to the front of the queue', 'success'
+
 @app.route('/unforce_order', methods=['POST'])
 def unforce_order():
-    order_code = request.form.get('order_code')
-    global orders
-    
-    if order_code in orders:
-        order = orders[order_code]
-        if order.is_forced:
-            try:
-                order.unforce_order()
-                # Immediately reschedule all orders
-                machine_schedule, halted_orders = schedule_orders(orders)
-                flash(f'Order {order_code} has been unforced', 'success')
-            except Exception as e:
-                flash(str(e), 'error')
-        else:
-            flash(f'Order {order_code} is not forced', 'error')
-    
+    message = writer.call(apply_unforce_order, request.form.get('order_code'))
+    if message:
+        flash(*message)
     return redirect(url_for('index'))
 
-# Add a route to reset the system if needed
-@app.route('/reset', methods=['POST'])
-def reset():
+def apply_unforce_order(order_code):
+    """Unforce an order and reschedule; returns the (message, category) to flash, None for an unknown order"""
+    if order_code not in orders:
+        return None
+    order = orders[order_code]
+    if not order.is_forced:
+        return f'Order {order_code} is not forced', 'error'
+    try:
+        order.unforce_order()
+        # Immediately reschedule all orders
+        get_scheduler().refresh()
+    except Exception as e:
+        return str(e), 'error'
+    return f'Order {order_code} has been unforced', 'success'
+
+def reset_orders():
+    """Drop the runtime state and reload the order book from the CSV; runs on the writer"""
     global orders
     orders = {}  # Clear the orders
+    state_store.clear()  # Reset means back to the CSV state, so drop the persisted one too
     load_orders_from_csv()  # Reload from CSV
+    events.publish('reset')
+
+# Add a route to reset the system if needed
+@app.route('/reset', methods=['POST'])
+def reset():
+    writer.call(reset_orders)
     flash('System has been reset', 'success')
     return redirect(url_for('index'))
 
+def pump_stream():
+    """Advance the schedule once a second for every connected stream client at once"""
+    global stream_pump
+    while True:
+        time.sleep(1)
+        with stream_pump_lock:
+            if not events.subscribers:
+                stream_pump = None
+                return
+        try:
+            writer.refresh().result()
+        except Exception as e:
+            print(f"Error advancing the schedule for stream clients: {e}")
+
+def open_stream(event_id=None):
+    """Event stream from a Last-Event-ID, keeping the pump running while it is read unless the ticker runs"""
+    global stream_pump
+    writer.read()
+    if ticker is None:
+        with stream_pump_lock:
+            if stream_pump is None:
+                stream_pump = threading.Thread(target=pump_stream, name='stream-pump', daemon=True)
+                stream_pump.start()
+    return events.stream(event_id)
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events feed of operation, machine and order state transitions"""
+    # Browsers resend the last ID they saw when reconnecting; a page passes the ID it was rendered at
+    event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # A worker relays the owner's stream, where the transitions happen
+    stream = writer.stream(event_id) if ROLE == 'worker' else open_stream(event_id)
+    response = app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.before_request
+def start_request_metrics():
+    """Time the request, and profile it if it asks for that and profiling is enabled"""
+    if metrics.registry.enabled:
+        g.request_started = time.perf_counter()
+    if PROFILING and 'X-Profile' in request.headers:
+        g.profiler = metrics.profile()
+
+@app.after_request
+def finish_request_metrics(response):
+    """
+    Record the request's latency; a profiled request answers with its cProfile
+    summary instead of its body, the top X-Profile entries (40 if not a number)
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.registry.observe('orders_request_seconds', time.perf_counter() - started,
+                                 endpoint=request.endpoint or 'unknown')
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    limit = request.headers.get('X-Profile', '')
+    summary = metrics.profile_summary(profiler, int(limit) if limit.isdigit() else 40)
+    if response.is_streamed:
+        return response
+    profiled = app.response_class(summary, mimetype='text/plain')
+    profiled.headers['X-Profiled-Status'] = str(response.status_code)
+    return profiled
+
+@app.before_request
+def pin_request_time():
+    """Give the whole request one current time, so every order and machine in it is computed at the same instant"""
+    g.clock_token = clock.pin()
+
+@app.teardown_request
+def unpin_request_time(exc=None):
+    token = g.pop('clock_token', None)
+    if token is not None:
+        clock.unpin(token)
+
 # Add CORS headers middleware
 @app.after_request
 def add_cors_headers(response):
@@ -492,11 +848,16 @@ def add_cors_headers(response):
 @app.route('/machine_status')
 def machine_status():
     try:
-        machine_schedule, _ = schedule_orders(orders)
-        current_time = datetime.now()
+        state = writer.read()
+        snapshot = state.schedule
+        cached = not_modified(snapshot)
+        if cached:
+            return cached
+        current_time = clock.now()
+        machine_schedule = snapshot.materialize(current_time)
         
         machine_status = {}
-        for machine_id, schedule in machine_schedule.items():
+        for machine_id in snapshot.timelines:
             status = {
                 'status': 'idle',
                 'progress_percentage': 0,
@@ -506,53 +867,330 @@ def machine_status():
             }
             
             current_op = next(
-                (op for op in schedule 
-                 if op[2] <= current_time <= op[3] and 
-                 op[1].status != OperationStatus.COMPLETED),
+                (slot for slot in snapshot.now_slots.get(machine_id, ())
+                 if slot[1].status != OperationStatus.COMPLETED),
                 None
             )
             
             if current_op:
                 order, operation, start, end = current_op
                 total_seconds = (end - start).total_seconds()
-                elapsed = (current_time - start).total_seconds()
+                elapsed = -start.total_seconds()
                 remaining = max(0, total_seconds - elapsed)
                 
                 status.update({
                     'status': 'busy',
                     'current_order': order.order_code,
                     'current_operation': operation.name,
-                    'start_time': start,
-                    'end_time': end,
+                    'start_time': current_time + start,
+                    'end_time': current_time + end,
                     'progress_percentage': min(100, (elapsed / total_seconds) * 100),
                     'remaining_time': remaining
                 })
             
             machine_status[machine_id] = status
         
-        return render_template('machine_status.html',
-                            machine_status=machine_status,
-                            machine_schedule=machine_schedule,
-                            current_time=current_time,
-                            format_duration=format_duration,
-                            OperationStatus=OperationStatus)
+        with metrics.span('render_template', template='machine_status.html'):
+            page = render_template('machine_status.html',
+                                   machine_status=machine_status,
+                                   machine_schedule=machine_schedule,
+                                   current_time=current_time,
+                                   format_duration=format_duration,
+                                   OperationStatus=OperationStatus,
+                                   stream_event_id=state.event_id)
+        return tag_response(page, snapshot)
     
     except Exception as e:
         app.logger.error(f"Error in machine_status: {str(e)}")
         return str(e), 500
 
+def api_status_columnar(columns, current_time):
+    """Vectorized /api/machine_status payload over a ColumnarSchedule read at current_time"""
+    rows, busy, progress, _, remaining = columns.machine_state()
+    _, end_stamps = columns.epoch(current_time)
+    status_data = {}
+    for index, machine_id in enumerate(columns.machine_ids):
+        if not busy[index]:
+            status_data[machine_id] = {'status': 'idle', 'progress': 0, 'remaining': 0}
+            continue
+        row = int(rows[index])
+        status_data[machine_id] = {
+            'status': 'busy',
+            'current_order': columns.orders[columns.order_index[row]].order_code,
+            'current_operation': columns.operations[row].name,
+            'progress': float(progress[index]),
+            'remaining': float(remaining[index]),
+            'end_time': float(end_stamps[row])
+        }
+    return status_data
+
+@app.route('/api/orders')
+def api_orders():
+    """
+    Page of orders matching the query filters
+
+    Filters: status, forced, halted, machine, prefix. Pass the returned `next`
+    as `after` for the following page; `limit` sets the page size.
+    """
+    state = writer.read()
+    try:
+        filters = order_filters(request.args)
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    page = state.index.page(after=request.args.get('after'), limit=limit, **filters)
+    return jsonify({
+        'orders': [order_summary(order) for order in page.orders],
+        'next': page.next_cursor,
+        'total': page.total
+    })
+
+@app.route('/api/what_if/force')
+def api_what_if_force():
+    """
+    Preview of forcing an order, without forcing it
+
+    Returns the operations that would be halted to make room for it and, for
+    every order whose schedule would move, its current and projected finish
+    time (null when it is not scheduled within the horizon).
+    """
+    order_code = request.args.get('order_code')
+    if not order_code:
+        return jsonify({'error': 'order_code is required'}), 400
+    payload, status = writer.call(preview_force, order_code)
+    return jsonify(payload), status
+
+def preview_force(order_code):
+    """
+    Body and status code of /api/what_if/force
+
+    Runs on the writer: the preview replays the live scheduler, which only the
+    writer may read while it is being changed.
+    """
+    load_orders_from_csv()
+    order = orders.get(order_code)
+    if order is None:
+        return {'error': f'unknown order {order_code}'}, 404
+    if order.status != OperationStatus.PENDING or order.is_forced:
+        return {'error': f'order {order_code} is not a pending, unforced order'}, 409
+
+    engine = get_scheduler()
+    engine.advance()
+    current_time = clock.now()
+    preview = engine.preview_force(order, current_time)
+
+    def timestamp(offset):
+        return (current_time + offset).timestamp() if offset is not None else None
+
+    affected = []
+    for code, (current, projected) in preview.finish.items():
+        affected.append({
+            'order_code': code,
+            'current_finish': timestamp(current),
+            'projected_finish': timestamp(projected),
+            'delay': (projected - current).total_seconds() if current is not None and projected is not None else None
+        })
+    affected.sort(key=lambda item: item['order_code'])
+    return {
+        'order_code': order_code,
+        'version': engine.snapshot().etag,
+        'halted': [{
+            'order_code': halted_order.order_code,
+            'operation_id': operation.operation_id,
+            'operation': operation.name,
+            'machine_id': machine_id
+        } for halted_order, operation, machine_id in preview.halted],
+        'affected_orders': affected,
+        'placed': preview.placed
+    }, 200
+
+@app.route('/api/schedule_metrics')
+def api_schedule_metrics():
+    """
+    Makespan, per-machine utilization and total tardiness of the current plan
+
+    ?mode=greedy (default) measures the live schedule; ?mode=eft and
+    ?mode=optimized plan the same order book with the earliest-finish-time
+    mode or the optimizer's best solution and measure that, without applying it.
+    The live schedule, and so what the machines run, is always the greedy one.
+    """
+    mode = request.args.get('mode', 'greedy')
+    if mode not in planning.MODES:
+        return jsonify({'error': f"unknown mode {mode!r}, expected one of {', '.join(planning.MODES)}"}), 400
+    state = writer.read()
+    if mode == 'optimized':
+        # The optimizer runs in the owner
+        return jsonify(on_owner(optimized_schedule_metrics))
+    return jsonify(schedule_metrics(state, mode, clock.now()))
+
+def schedule_metrics(state, mode, current_time):
+    """Body of /api/schedule_metrics for a published state"""
+    started = time.perf_counter()
+    if mode == 'greedy':
+        machine_schedule = state.schedule.materialize(current_time)
+    else:
+        machine_schedule = plan(state.orders, mode, current_time)
+    planned = time.perf_counter() - started
+    measured = planning.measure(machine_schedule, state.orders, current_time).to_dict()
+    measured.update(mode=mode, plan_seconds=planned)
+    return measured
+
+def optimized_schedule_metrics():
+    """schedule_metrics() of the optimizer's plan over the last published state"""
+    return schedule_metrics(writer.state, 'optimized', clock.now())
+
+@app.route('/api/optimizer', methods=['GET', 'POST'])
+def api_optimizer():
+    """
+    Status of the schedule optimizer; POST starts a search
+
+    POST takes `budget` (seconds, default 60) and `workers` (default: CPUs). The
+    search runs in worker processes and returns at once; its best schedule so
+    far is what mode=optimized plans with. It is only measured there: the
+    machines keep running the greedy schedule.
+    """
+    if request.method == 'POST':
+        try:
+            budget = float(request.values.get('budget', 60))
+            workers = int(request.values['workers']) if request.values.get('workers') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        writer.read()
+        payload, status = on_owner(optimizer_command, 'start', budget, workers)
+    else:
+        payload, status = on_owner(optimizer_command, 'status')
+    return jsonify(payload), status
+
+@app.route('/api/optimizer/stop', methods=['POST'])
+def api_optimizer_stop():
+    """Stop the optimizer after its current round, keeping the best schedule found"""
+    payload, status = on_owner(optimizer_command, 'stop')
+    return jsonify(payload), status
+
+def on_owner(task, *args):
+    """Run a task that only reads published states here, or on the owner when this process is a worker"""
+    return writer.call(task, *args) if ROLE == 'worker' else task(*args)
+
+def optimizer_command(action, budget=None, workers=None):
+    """
+    Body and status code of the optimizer endpoints for 'start', 'status' or 'stop'
+
+    Runs in the owner, so that in multi-process mode there is one optimizer,
+    planning over the owner's last published state. The order book of a
+    published state never changes, so the search reads it in its own thread.
+    """
+    global optimizer
+    with optimizer_lock:
+        if action == 'start':
+            if optimizer is not None and optimizer.running:
+                return {'error': 'the optimizer is already running', **optimizer.status()}, 409
+            optimizer = ScheduleOptimizer(writer.state.orders, workers=workers)
+            optimizer.start(budget)
+            return optimizer.status(), 202
+        if optimizer is None:
+            return {'error': 'the optimizer has not been started'}, 404
+        if action == 'stop':
+            optimizer.stop()
+        return optimizer.status(), 200
+
+@app.route('/api/machines')
+def api_machines():
+    """Every machine of the order book with its status and the number of pending operations it can take"""
+    writer.read()
+    # The registry's indexes are kept by the writer, so they are read on its thread
+    return jsonify(writer.call(machine_statuses))
+
+def machine_statuses():
+    """Body of /api/machines; runs on the writer"""
+    return list(get_machine_registry().statuses().values())
+
+@app.route('/api/machines/<machine_id>')
+def api_machine(machine_id):
+    """
+    One machine's status, the operation names it can perform and, with
+    ?eligible=1, the pending operations it can take
+    """
+    try:
+        eligible = parse_flag(request.args.get('eligible'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    writer.read()
+    status = writer.call(machine_details, machine_id, eligible)
+    if status is None:
+        return jsonify({'error': f'Unknown machine {machine_id}'}), 404
+    return jsonify(status)
+
+def machine_details(machine_id, eligible=False):
+    """Body of /api/machines/<machine_id>, None for an unknown machine; runs on the writer"""
+    registry = get_machine_registry()
+    if machine_id not in registry:
+        return None
+    status = registry.status(machine_id)
+    status['operations'] = sorted(name for name in registry.operation_names(machine_id))
+    if eligible:
+        status['eligible'] = [{'order_code': order.order_code, 'operation_id': operation.operation_id,
+                               'operation': operation.name}
+                              for order, operation in registry.eligible(machine_id)]
+    return status
+
+def collect_cache_metrics():
+    """Counters kept by the caches themselves, read when /metrics is scraped"""
+    stats = fragment_cache.stats()
+    return [
+        ('orders_cache_hits_total', {'cache': 'fragments'}, stats['hits']),
+        ('orders_cache_misses_total', {'cache': 'fragments'}, stats['misses']),
+        ('orders_fragment_cache_size', {}, stats['size']),
+        ('orders_stream_subscribers', {}, events.subscribers),
+        ('orders_loaded', {}, len(orders)),
+    ]
+
+metrics.registry.collect(collect_cache_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Spans, counters and cache statistics in the Prometheus text format"""
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/fragment_cache')
+def api_fragment_cache():
+    """Hit, miss and eviction counters of the order card cache"""
+    return jsonify(fragment_cache.stats())
+
 @app.route('/api/machine_status')
 def api_machine_status():
+    """
+    Status of every machine
+
+    With ?since=<version>, only the machines whose status changed after that
+    version are returned, as {'version', 'delta', 'machines'}. Each record holds
+    the busy/idle state and the absolute start_time and end_time of the current
+    slot, or its start_offset and end_offset in seconds from now if its
+    operation has not started; progress and remaining time are left to the
+    client. A version that is unknown or too old gets every machine with
+    'delta' false.
+    """
     try:
-        machine_schedule, _ = schedule_orders(orders)
-        current_time = datetime.now()
+        snapshot = writer.read().schedule
+        cached = not_modified(snapshot)
+        if cached:
+            return cached
+        current_time = clock.now()
+        
+        if 'since' in request.args:
+            # The writer brings the records up to every state it publishes
+            changed = machine_deltas.since(request.args['since'])
+            return tag_response(jsonify({
+                'version': snapshot.etag,
+                'delta': changed is not None,
+                'machines': changed if changed is not None else machine_deltas.records
+            }), snapshot)
+        
+        if columnar.available():
+            return tag_response(jsonify(api_status_columnar(ColumnarSchedule.of(snapshot), current_time)), snapshot)
         
         status_data = {}
-        for machine_id, schedule in machine_schedule.items():
-            current_op = next(
-                (op for op in schedule if op[2] <= current_time <= op[3]),
-                None
-            )
+        for machine_id in snapshot.timelines:
+            current_op = next(iter(snapshot.now_slots.get(machine_id, ())), None)
             
             status = {
                 'status': 'idle',
@@ -563,7 +1201,7 @@ def api_machine_status():
             if current_op:
                 order, operation, start, end = current_op
                 total = (end - start).total_seconds()
-                elapsed = (current_time - start).total_seconds()
+                elapsed = -start.total_seconds()
                 remaining = max(0, total - elapsed)
                 
                 status = {
@@ -572,16 +1210,59 @@ def api_machine_status():
                     'current_operation': operation.name,
                     'progress': min(100, (elapsed / total) * 100),
                     'remaining': remaining,
-                    'end_time': end.timestamp()
+                    'end_time': (current_time + end).timestamp()
                 }
             
             status_data[machine_id] = status
         
-        return jsonify(status_data)
+        return tag_response(jsonify(status_data), snapshot)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Tasks a worker may forward to the owner, by name
+WRITER_TASKS = {task.__name__: task for task in (
+    apply_start_operation, apply_complete_operation, apply_force_order, apply_unforce_order, reset_orders,
+    preview_force, machine_statuses, machine_details)}
+
+# Tasks a worker may forward to the owner that only read published states, so the owner runs them off the writer
+READ_TASKS = {task.__name__: task for task in (optimizer_command, optimized_schedule_metrics)}
+
+def completion_due(operation):
+    """When force_update_order_status() completes an operation unless something else does first, None if never"""
+    if operation.status != OperationStatus.IN_PROGRESS or not operation.start_time or not operation.assigned_machine:
+        return None
+    total_time = operation.processing_times[operation.assigned_machine]
+    # A millisecond late, so the progress computed at that time cannot fall short of COMPLETED_PROGRESS by rounding
+    return operation.start_time + timedelta(seconds=total_time * COMPLETED_PROGRESS / 100, milliseconds=1)
+
+# Completion times of the running operations, giving every published state its next event
+upcoming_events = UpcomingEvents(completion_due)
+
+# Publishes whenever the published state's next event is due, so requests only read; a worker's owner runs it
+ticker = Ticker(writer, TICK) if TICK and ROLE != 'worker' else None
+
+@app.before_request
+def start_ticker():
+    """Start the background scheduler with the first request"""
+    if ticker is not None and not ticker.running:
+        ticker.start()
+
+def serve_owner():
+    """
+    Run as the owner of a multi-process deployment: publish the first state,
+    then advance it in the background and take the tasks of the workers until
+    the process is stopped
+    """
+    writer.read()
+    if ticker is not None:
+        ticker.start()
+    print(f"Owner publishing to {SHARED_STATE}, taking worker tasks on {OWNER_ADDRESS}")
+    OwnerServer(writer, WRITER_TASKS, OWNER_ADDRESS, OWNER_KEY, stream=open_stream,
+                readers=READ_TASKS).serve_forever()
+
 if __name__ == '__main__':
-    load_orders_from_csv()
+    if ROLE == 'owner':
+        serve_owner()
+    writer.read()
     app.run(host='0.0.0.0', port=8080, debug=True)  # Add host and port parameters
\ No newline at end of file
@@ -0,0 +1 @@
+"""Benchmarks for the order management hot paths. Run each module with python -m."""
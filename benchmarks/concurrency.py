@@ -0,0 +1,210 @@
+"""
+Concurrency stress test of the single writer and its published states
+
+Runs, against the Flask app module and a seeded order book:
+
+* reader threads fetching /, /machine_status, /api/machine_status and
+  /api/orders through Flask's test client, each checking its response
+* writer threads forcing and unforcing random orders through the POST routes
+* a clock thread moving virtual time forward, so operations keep starting,
+  completing and being halted while all of the above runs
+* checker threads holding on to published states and verifying that nothing in
+  them changes while they are held, that order statuses agree with their
+  operations, that the index agrees with the orders and that the schedule
+  points at the state's own orders
+
+Prints a JSON report with request counts, latency percentiles per endpoint,
+the number of states published and every violation found, and exits with 1 if
+there was any.
+
+Usage:
+    python -m benchmarks.concurrency [--orders 2000] [--seconds 20] [--readers 8] [--writers 2]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Keep the stress test's order state out of the working directory's database
+os.environ['ORDER_STATE_DB'] = ''
+
+import app  # noqa: E402
+import clock  # noqa: E402
+from OrderManagment import OperationStatus  # noqa: E402
+from generate_order_data import write_csv  # noqa: E402
+
+START = datetime(2025, 1, 6, 8, 0)
+
+READ_URLS = ('/', '/machine_status', '/api/machine_status', '/api/orders?status=in_progress&limit=100')
+
+
+class Stress:
+    """Shared counters of one run; every thread appends to these under one lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # endpoint -> seconds
+        self.statuses = defaultdict(lambda: defaultdict(int))  # endpoint -> status code -> count
+        self.violations = []
+        self.states_checked = 0
+        self.stop = threading.Event()
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def violation(self, message: str) -> None:
+        with self.lock:
+            if len(self.violations) < 100:
+                self.violations.append(message)
+
+
+def fingerprint(state) -> tuple:
+    """Everything readers can see of a published state's orders"""
+    return tuple(
+        (code, order.version, order.status, order.is_forced, tuple(order.halted_operations),
+         tuple((op.status, op.assigned_machine, op.start_time) for op in order.operations))
+        for code, order in sorted(state.orders.items()))
+
+
+def check_state(state, stress: Stress) -> None:
+    """Invariants a published state must satisfy however it was reached"""
+    counts = defaultdict(int)
+    for code, order in state.orders.items():
+        counts[order.status] += 1
+        statuses = [op.status for op in order.operations]
+        if statuses and all(status == OperationStatus.COMPLETED for status in statuses):
+            if order.status != OperationStatus.COMPLETED:
+                stress.violation(f"{state.etag}: {code} has every operation completed but is {order.status.value}")
+        elif OperationStatus.IN_PROGRESS in statuses and order.status == OperationStatus.PENDING:
+            stress.violation(f"{state.etag}: {code} has a running operation but is pending")
+    for status in OperationStatus:
+        if state.index.count(status) != counts[status]:
+            stress.violation(f"{state.etag}: index has {state.index.count(status)} {status.value} orders, "
+                             f"the orders {counts[status]}")
+    for machine_id, slots in state.schedule.timelines.items():
+        for order, operation, _, _ in slots:
+            if state.orders.get(order.order_code) is not order:
+                stress.violation(f"{state.etag}: schedule of {machine_id} holds an order outside the state")
+                return
+
+
+def reader(stress: Stress, seed: int) -> None:
+    client = app.app.test_client()
+    rng = random.Random(seed)
+    etags = {}
+    while not stress.stop.is_set():
+        url = rng.choice(READ_URLS)
+        headers = {'If-None-Match': etags[url]} if url in etags and rng.random() < 0.5 else {}
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        body = response.get_data()
+        stress.record(url, time.perf_counter() - started, response.status_code)
+        if response.status_code not in (200, 304):
+            stress.violation(f"GET {url} answered {response.status_code}: {body[:200]!r}")
+            continue
+        if response.headers.get('ETag'):
+            etags[url] = response.headers['ETag']
+        if url.startswith('/api/orders') and response.status_code == 200:
+            for order in response.get_json()['orders']:
+                if order['status'] != OperationStatus.IN_PROGRESS.value:
+                    stress.violation(f"/api/orders?status=in_progress returned {order['order_code']} {order['status']}")
+
+
+def writer(stress: Stress, codes, seed: int) -> None:
+    client = app.app.test_client()
+    rng = random.Random(seed)
+    while not stress.stop.is_set():
+        url = rng.choice(('/force_order', '/unforce_order'))
+        started = time.perf_counter()
+        response = client.post(url, data={'order_code': rng.choice(codes)})
+        stress.record(url, time.perf_counter() - started, response.status_code)
+        if response.status_code != 302:
+            stress.violation(f"POST {url} answered {response.status_code}")
+        time.sleep(rng.uniform(0, 0.05))
+
+
+def checker(stress: Stress) -> None:
+    while not stress.stop.is_set():
+        state = app.writer.read()
+        before = fingerprint(state)
+        check_state(state, stress)
+        # Hold the state while the writer moves on; nothing in it may change
+        time.sleep(0.05)
+        if fingerprint(state) != before:
+            stress.violation(f"state {state.etag} changed while it was held")
+        with stress.lock:
+            stress.states_checked += 1
+
+
+def mover(stress: Stress, manual: clock.ManualClock, step: timedelta) -> None:
+    while not stress.stop.is_set():
+        manual.advance(step)
+        time.sleep(0.01)
+
+
+def percentiles(seconds) -> dict:
+    ordered = sorted(seconds)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'count': len(ordered), 'median': statistics.median(ordered), 'p95': pick(0.95),
+            'p99': pick(0.99), 'max': ordered[-1]}
+
+
+def main(num_orders: int = 2000, seconds: float = 20, readers: int = 8, writers: int = 2,
+         checkers: int = 2, step_minutes: float = 10) -> dict:
+    manual = clock.ManualClock(START)
+    stress = Stress()
+    with tempfile.TemporaryDirectory() as directory, clock.using(manual):
+        path = os.path.join(directory, 'orders.csv')
+        write_csv(path, num_orders, seed=num_orders)
+        codes = list(app.load_orders_from_csv(path))
+        app.writer.read()
+        published = app.writer.published
+
+        threads = [threading.Thread(target=reader, args=(stress, index)) for index in range(readers)]
+        threads += [threading.Thread(target=writer, args=(stress, codes, 1000 + index)) for index in range(writers)]
+        threads += [threading.Thread(target=checker, args=(stress,)) for _ in range(checkers)]
+        threads.append(threading.Thread(target=mover, args=(stress, manual, timedelta(minutes=step_minutes))))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stress.stop.set()
+        for thread in threads:
+            thread.join()
+        # The final state has to hold up as well
+        check_state(app.writer.read(), stress)
+
+    report = {
+        'orders': num_orders,
+        'seconds': seconds,
+        'threads': {'readers': readers, 'writers': writers, 'checkers': checkers},
+        'virtual_hours': (manual.now() - START).total_seconds() / 3600,
+        'published': app.writer.published - published,
+        'states_checked': stress.states_checked,
+        'endpoints': {endpoint: dict(percentiles(latencies), statuses=dict(stress.statuses[endpoint]))
+                      for endpoint, latencies in sorted(stress.latencies.items())},
+        'violations': stress.violations,
+    }
+    print(json.dumps(report, indent=2, default=str))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000, help='orders in the generated book')
+    parser.add_argument('--seconds', type=float, default=20, help='how long to run')
+    parser.add_argument('--readers', type=int, default=8, help='threads issuing GET requests')
+    parser.add_argument('--writers', type=int, default=2, help='threads forcing and unforcing orders')
+    parser.add_argument('--checkers', type=int, default=2, help='threads verifying published states')
+    parser.add_argument('--step', type=float, default=10, help='virtual minutes the clock moves every 10 ms')
+    args = parser.parse_args()
+    result = main(args.orders, args.seconds, args.readers, args.writers, args.checkers, args.step)
+    sys.exit(1 if result['violations'] else 0)
@@ -0,0 +1,38 @@
+"""
+Throughput benchmark for the streaming CSV loader
+
+Usage:
+    python -m benchmarks.csv_loader [num_orders]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from csv_loader import load_orders, parse_duration
+from generate_order_data import generate_orders, save_to_csv
+
+
+def main(num_orders: int = 50000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        save_to_csv(generate_orders(num_orders), path)
+        size = os.path.getsize(path)
+
+        parse_duration.cache_clear()
+        orders, report = load_orders(path)
+        print(report)
+        print(f"file {size / 1e6:.1f} MB, duration cache {parse_duration.cache_info()}")
+        del orders
+
+        # Second pass under tracemalloc: the loader's own overhead is the peak minus the order book it returns
+        tracemalloc.start()
+        orders, _ = load_orders(path)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"order book {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB, "
+              f"loader overhead {(peak - current) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
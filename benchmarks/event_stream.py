@@ -0,0 +1,124 @@
+"""
+Check of the event stream as time alone completes operations
+
+Loads a seeded book of one- and two-operation orders into the Flask app module
+under a ManualClock and, the way the background ticker does, publishes a state
+and moves the clock to that state's next event, until nothing is running. The
+next events are the times running operations reach 99.9% progress, which
+force_update_order_status() completes ahead of their planned end rather than
+the scheduler. The event log the SSE streams read from then has to hold:
+
+* one operation_completed for every completed operation and none for the others
+* one order_completed for every completed order and none for the others
+* a machine_idle after the last machine_busy of every machine the hub has idle,
+  and the hub's busy machines have to be the ones the order book has running
+
+Prints a JSON report with the events counted and every mismatch found, and
+exits with 1 if there was any.
+
+Usage:
+    python -m benchmarks.event_stream [--orders 30] [--seed 1]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime
+
+# Keep the check's order state out of the working directory's database. A long tick lets a state's next
+# event be its next completion; the ticker itself only starts with a request, so it stays off
+os.environ['ORDER_STATE_DB'] = ''
+os.environ['ORDER_TICK'] = '86400'
+
+import app  # noqa: E402
+import clock  # noqa: E402
+from OrderManagment import OperationStatus  # noqa: E402
+from generate_order_data import write_csv  # noqa: E402
+
+START = datetime(2025, 1, 6, 8, 0)
+
+
+def mismatches_in(log, book) -> list:
+    """Differences between the events logged and what the order book went through"""
+    found = []
+    completed = Counter((data['order_code'], data['operation_id'])
+                        for _, event, data in log if event == 'operation_completed')
+    running = {}  # machine_id -> (order_code, operation_id) in progress on it
+    for order in book.values():
+        for operation in order.operations:
+            count = completed[(order.order_code, operation.operation_id)]
+            if count != (operation.status == OperationStatus.COMPLETED):
+                found.append(f"{order.order_code} {operation.operation_id}: {count} operation_completed events "
+                             f"for a {operation.status.value} operation")
+            if operation.status == OperationStatus.IN_PROGRESS:
+                running.setdefault(operation.assigned_machine, set()).add((order.order_code, operation.operation_id))
+    orders_completed = Counter(data['order_code'] for _, event, data in log if event == 'order_completed')
+    for order in book.values():
+        if orders_completed[order.order_code] != (order.status == OperationStatus.COMPLETED):
+            found.append(f"{order.order_code}: {orders_completed[order.order_code]} order_completed events "
+                         f"for a {order.status.value} order")
+
+    busy = {machine_id: occupants for machine_id, occupants in app.events._busy.items() if occupants}
+    if busy != running:
+        found.append(f"hub has {sorted(busy)} busy, the order book {sorted(running)}")
+    last = {}  # machine_id -> last machine_busy or machine_idle event
+    for _, event, data in log:
+        if event in ('machine_busy', 'machine_idle'):
+            last[data['machine_id']] = event
+    found.extend(f"{machine_id}: machine_busy with no machine_idle after it"
+                 for machine_id, event in sorted(last.items()) if event != 'machine_idle' and machine_id not in busy)
+    return found
+
+
+def main(num_orders: int = 30, seed: int = 1, max_steps: int = 1000) -> dict:
+    manual = clock.ManualClock(START)
+    with tempfile.TemporaryDirectory() as directory, clock.using(manual):
+        path = os.path.join(directory, 'orders.csv')
+        write_csv(path, num_orders, seed=seed, operations=(1, 2))
+        book = app.load_orders_from_csv(path)
+        first = app.events.sequence
+
+        steps = 0
+        while steps < max_steps:
+            app.writer.refresh().result()
+            state = app.writer.state
+            if not any(operation.status == OperationStatus.IN_PROGRESS
+                       for order in state.orders.values() for operation in order.operations):
+                break
+            manual.set(state.next_event)
+            steps += 1
+
+        log = [(sequence, event, json.loads(data)) for sequence, event, data in app.events.events_after(first)]
+        mismatches = mismatches_in(log, book)
+        if steps == max_steps:
+            mismatches.append(f"operations still running after {steps} steps")
+
+        # Completions logged before the planned end came from force_update_order_status()
+        ahead = sum(1 for _, event, data in log if event == 'operation_completed'
+                    and book[data['order_code']].get_operation_details(data['operation_id']).completion_time
+                    > datetime.fromtimestamp(data['time']))
+        if not ahead:
+            mismatches.append("no operation was completed ahead of its planned end")
+
+    report = {
+        'orders': num_orders,
+        'seed': seed,
+        'steps': steps,
+        'virtual_hours': (manual.now() - START).total_seconds() / 3600,
+        'events': dict(Counter(event for _, event, _ in log)),
+        'completed_ahead_of_plan': ahead,
+        'mismatches': mismatches[:100],
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=30, help='orders in the generated book')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the book')
+    args = parser.parse_args()
+    result = main(args.orders, args.seed)
+    sys.exit(1 if result['mismatches'] else 0)
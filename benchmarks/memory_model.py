@@ -0,0 +1,108 @@
+"""
+Memory benchmark: compact Operation/Order model vs the previous dataclass model
+
+Usage:
+    python -m benchmarks.memory_model [num_orders]
+"""
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List
+
+from OrderManagment import Order, OperationStatus, OperationStore
+
+
+@dataclass
+class LegacyOperation:
+    """The Operation dataclass as it was before the compact model"""
+    operation_id: str
+    name: str
+    capable_machines: List[str]
+    processing_times: Dict[str, float]
+    sequence_number: int
+    status: OperationStatus = OperationStatus.PENDING
+    assigned_machine: str = None
+    start_time: datetime = None
+    completion_time: datetime = None
+    completed_quantity: int = 0
+
+
+class LegacyOrder:
+    """The per-instance attributes Order carried before the compact model"""
+    def __init__(self, order_code: str, quantity: int):
+        self.order_code = order_code
+        self.quantity = quantity
+        self.operations = []
+        self.created_at = datetime.now()
+        self.status = OperationStatus.PENDING
+        self.start_time = None
+        self.completion_time = None
+        self.is_forced = False
+        self.force_time = None
+        self.halted_operations = {}
+        self._listeners = []
+
+
+def generate_rows(num_orders: int, seed: int = 0):
+    """Synthetic operation rows shaped like orders_data.csv, with fresh strings per row as a CSV parse yields"""
+    rng = random.Random(seed)
+    names = ["Cutting", "Drilling", "Milling", "Turning", "Grinding", "Welding",
+             "Assembly", "Testing", "Quality Control", "Packaging", "Shipping"]
+    rows = []
+    for i in range(num_orders):
+        quantity = rng.randint(10, 100)
+        for j in range(rng.randint(4, 8)):
+            machines = [f"M{k}" for k in rng.sample(range(1, 46), rng.randint(2, 4))]
+            rows.append((f"ORD{i + 1:06d}", quantity, f"OP{j + 1:02d}", "".join(rng.choice(names)),
+                         machines, {m: float(rng.randint(4, 36) * 3600) for m in machines}, j + 1))
+    return rows
+
+
+def build_legacy(rows):
+    orders = {}
+    for order_code, quantity, operation_id, name, machines, times, sequence in rows:
+        order = orders.get(order_code)
+        if order is None:
+            order = orders[order_code] = LegacyOrder(order_code, quantity)
+        order.operations.append(LegacyOperation(operation_id, name, list(machines), dict(times), sequence))
+    return orders
+
+
+def build_compact(rows):
+    orders = {}
+    store = OperationStore()
+    for order_code, quantity, operation_id, name, machines, times, sequence in rows:
+        order = orders.get(order_code)
+        if order is None:
+            order = orders[order_code] = Order(order_code, quantity, store=store)
+        order.add_operation(operation_id, name, machines, times, sequence)
+    return orders
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    orders = build(rows)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return orders, size
+
+
+def main(num_orders: int = 20000) -> None:
+    rows = generate_rows(num_orders)
+    num_operations = len(rows)
+    results = {}
+    for label, build in (("legacy", build_legacy), ("compact", build_compact)):
+        orders, size = measure(build, rows)
+        results[label] = size
+        print(f"{label:8s} {size / 1e6:8.1f} MB  {size / num_operations:7.0f} B/operation  "
+              f"({len(orders)} orders, {num_operations} operations)")
+        del orders
+    print(f"ratio    {results['legacy'] / results['compact']:8.2f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
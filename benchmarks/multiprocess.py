@@ -0,0 +1,186 @@
+"""
+Load test of multi-process mode: read throughput against the number of workers
+
+Generates a seeded order book, starts one owner process (ORDER_ROLE=owner) and,
+for each worker count, that many worker processes (ORDER_ROLE=worker) serving
+the Flask app from one shared listening socket, one request at a time each, the
+way a pre-forking server runs sync workers. Client processes then issue GETs
+over HTTP for a fixed time while a writer forces and unforces orders through
+the workers, so every worker keeps following new state files. A single-process
+run (ORDER_ROLE unset) is measured as well, for reference.
+
+Throughput can only grow with workers while there are idle cores to run them,
+so the report carries the CPU count next to the requests per second and the
+latency percentiles of every run.
+
+Usage:
+    python -m benchmarks.multiprocess [--orders 2000] [--workers 1,2,4] [--seconds 10] [--clients 8]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_order_data import write_csv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+URLS = ('/api/machine_status', '/api/orders?status=in_progress&limit=50')
+
+# Run in each worker: build the first state, report ready, then serve the shared socket
+SERVE = """
+import logging, sys
+import app
+from werkzeug.serving import make_server
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+server = make_server('127.0.0.1', 0, app.app, fd=int(sys.argv[1]))
+app.writer.read()
+print('ready', flush=True)
+server.serve_forever()
+"""
+
+
+def client(port: int, seconds: float, seed: int, results) -> None:
+    """GET random read URLs for `seconds`; puts (latencies, errors) on results"""
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        started = time.perf_counter()
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            connection.request('GET', rng.choice(URLS))
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status != 200:
+                errors += 1
+                continue
+        except OSError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put((latencies, errors))
+
+
+def writer(port: int, seconds: float, codes, rate: float, results) -> None:
+    """Force and unforce random orders `rate` times a second; puts the number of writes on results"""
+    rng = random.Random(0)
+    writes = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        url = rng.choice(('/force_order', '/unforce_order'))
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        body = f'order_code={rng.choice(codes)}'
+        connection.request('POST', url, body, {'Content-Type': 'application/x-www-form-urlencoded'})
+        connection.getresponse().read()
+        connection.close()
+        writes += 1
+        time.sleep(1 / rate)
+    results.put(writes)
+
+
+def start_servers(role: str, count: int, environment: dict, directory: str):
+    """Start `count` processes of a role serving one listening socket; returns (port, processes, socket)"""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    processes = []
+    for _ in range(count):
+        processes.append(subprocess.Popen(
+            [sys.executable, '-c', SERVE, str(listener.fileno())], cwd=directory, pass_fds=(listener.fileno(),),
+            env=dict(environment, ORDER_ROLE=role), stdout=subprocess.PIPE, text=True))
+    for process in processes:
+        if process.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f"a {role or 'single-process'} server did not start")
+    return listener.getsockname()[1], processes, listener
+
+
+def measure(port: int, seconds: float, clients: int, codes, write_rate: float) -> dict:
+    results = multiprocessing.Queue()
+    readers = [multiprocessing.Process(target=client, args=(port, seconds, seed, results)) for seed in range(clients)]
+    processes = readers + ([multiprocessing.Process(target=writer, args=(port, seconds, codes, write_rate, results))]
+                           if write_rate else [])
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latencies = sorted(latency for item in collected if isinstance(item, tuple) for latency in item[0])
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / seconds,
+        'errors': sum(item[1] for item in collected if isinstance(item, tuple)),
+        'writes': sum(item for item in collected if isinstance(item, int)),
+        'median': statistics.median(latencies) if latencies else None,
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+    }
+
+
+def main(num_orders: int = 2000, worker_counts=(1, 2, 4), seconds: float = 10, clients: int = 8,
+         write_rate: float = 2) -> dict:
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_csv(os.path.join(directory, 'orders_data.csv'), num_orders, seed=num_orders)
+        with open(os.path.join(directory, 'orders_data.csv')) as file:
+            codes = sorted({line.split(',', 1)[0] for line in file.readlines()[1:]})
+        environment = dict(os.environ, ORDER_STATE_DB='', PYTHONPATH=ROOT, ORDER_METRICS='0',
+                           ORDER_SHARED_STATE=os.path.join(directory, 'state.bin'),
+                           ORDER_OWNER_KEY=secrets.token_hex(16))
+
+        port, servers, listener = start_servers('', 1, environment, directory)
+        try:
+            runs.append(dict(mode='single process', workers=1, **measure(port, seconds, clients, codes, write_rate)))
+        finally:
+            for server in servers:
+                server.terminate()
+            listener.close()
+
+        owner = subprocess.Popen([sys.executable, '-c', 'import app; app.serve_owner()'], cwd=directory,
+                                 env=dict(environment, ORDER_ROLE='owner'), stdout=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(environment['ORDER_SHARED_STATE'] + '.sock'):
+                if owner.poll() is not None:
+                    raise RuntimeError("the owner process exited")
+                time.sleep(0.1)
+            for count in worker_counts:
+                port, servers, listener = start_servers('worker', count, environment, directory)
+                try:
+                    runs.append(dict(mode='owner + workers', workers=count,
+                                     **measure(port, seconds, clients, codes, write_rate)))
+                finally:
+                    for server in servers:
+                        server.terminate()
+                    listener.close()
+        finally:
+            owner.terminate()
+
+    base = next((run['requests_per_second'] for run in runs if run['mode'] != 'single process'), None)
+    for run in runs:
+        run['speedup'] = run['requests_per_second'] / base if base else None
+    report = {'orders': num_orders, 'cpus': os.cpu_count(), 'seconds': seconds, 'clients': clients,
+              'writes_per_second': write_rate, 'runs': runs}
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000, help='orders in the generated book')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts to run')
+    parser.add_argument('--seconds', type=float, default=10, help='how long each run lasts')
+    parser.add_argument('--clients', type=int, default=8, help='client processes issuing GETs')
+    parser.add_argument('--writes', type=float, default=2, help='forces and unforces per second during each run')
+    args = parser.parse_args()
+    main(args.orders, [int(count) for count in args.workers.split(',')], args.seconds, args.clients, args.writes)
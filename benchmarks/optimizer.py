@@ -0,0 +1,51 @@
+"""
+Makespan of the greedy pass, the earliest-finish-time mode and the optimizer on generated order books
+
+The greedy pass lets the operations of one order overlap, so its makespan is
+not bound by precedence; the other two respect it.
+
+Usage:
+    python -m benchmarks.optimizer [num_orders] [seconds] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import clock
+import planning
+from csv_loader import load_orders
+from generate_order_data import generate_orders, save_to_csv
+from optimizer import ScheduleOptimizer
+from scheduler import IncrementalScheduler
+
+
+def main(num_orders: int = 500, seconds: float = 30, workers: int = None) -> None:
+    now = datetime(2025, 1, 6, 8, 0)
+    with clock.using(clock.ManualClock(now)):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.csv')
+            save_to_csv(generate_orders(num_orders), path)
+            orders, report = load_orders(path)
+        print(report)
+
+        optimizer = ScheduleOptimizer(orders, current_time=now, workers=workers)
+        best = optimizer.run(seconds)
+        print(f"optimizer  {optimizer.elapsed:6.1f}s  {planning.measure(optimizer.plan(orders, now), orders, now)}")
+        print(f"           {optimizer.evaluations:,} schedules on {optimizer.workers} workers, "
+              f"best after {best.found_after:.1f}s, {optimizer.status()['improvement']:.1%} shorter than its start")
+
+        started = time.perf_counter()
+        machine_schedule = planning.plan_eft(orders, now)
+        print(f"eft        {time.perf_counter() - started:6.1f}s  {planning.measure(machine_schedule, orders, now)}")
+
+        started = time.perf_counter()
+        machine_schedule, _ = IncrementalScheduler(orders).refresh(now)
+        print(f"greedy     {time.perf_counter() - started:6.1f}s  {planning.measure(machine_schedule, orders, now)}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 30,
+         int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,206 @@
+"""
+Equivalence check of the incremental scheduler against the full rebuild
+
+Loads one seeded order book twice and drives both copies through the same
+random steps under a ManualClock: starting and completing operations, forcing
+and unforcing orders, adding new orders and moving time forward, several at
+once at times. After every step one copy is scheduled from scratch by
+scheduler.schedule_orders() and the other by IncrementalScheduler.refresh(), and
+everything they produce has to agree:
+
+* every machine's slots, as offsets from the current time
+* every operation's status, machine and start time, and each order's halted operations
+* every order's status
+* the orders halted to make room for forced orders
+
+Finally the scheduler's running-operation index is compared with a scan of the
+order book. Prints a JSON report with the steps taken per kind and every
+mismatch found, and exits with 1 if there was any.
+
+Usage:
+    python -m benchmarks.scheduler_equivalence [--orders 300] [--steps 200] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+
+import clock
+from OrderManagment import Order, OperationStatus
+from csv_loader import load_orders
+from generate_order_data import write_csv
+from scheduler import IncrementalScheduler, schedule_orders
+
+START = datetime(2025, 1, 6, 8, 0)
+
+STEPS = ('start', 'complete', 'force', 'unforce', 'new_order', 'time')
+
+
+def outcome(machine_schedule, halted_orders, book, current_time) -> dict:
+    """Everything a schedule run produced, comparable across the two order books"""
+    return {
+        'slots': {machine_id: [(order.order_code, operation.operation_id, start - current_time, end - current_time)
+                               for order, operation, start, end in slots]
+                  for machine_id, slots in machine_schedule.items() if slots},
+        'operations': {(order.order_code, operation.operation_id):
+                       (operation.status, operation.assigned_machine, operation.start_time,
+                        tuple(sorted(order.halted_operations)))
+                       for order in book.values() for operation in order.operations},
+        'orders': {order.order_code: order.status for order in book.values()},
+        'halted': sorted(order.order_code for order in halted_orders),
+    }
+
+
+def differences(full: dict, incremental: dict) -> list:
+    """Names of the parts of two outcomes that disagree, with the first key that differs"""
+    found = []
+    for part in ('slots', 'operations', 'orders'):
+        keys = sorted(set(full[part]) | set(incremental[part]), key=str)
+        differing = [key for key in keys if full[part].get(key) != incremental[part].get(key)]
+        if differing:
+            found.append(f"{part}: {len(differing)} differ, first {differing[0]}")
+    if full['halted'] != incremental['halted']:
+        found.append(f"halted: {full['halted']} against {incremental['halted']}")
+    return found
+
+
+def new_order(code: str, template: Order) -> Order:
+    """An order with a template order's operations, as a fresh pending order"""
+    order = Order(code, template.quantity)
+    for operation in template.operations:
+        order.add_operation(operation.operation_id, operation.name, list(operation.capable_machines),
+                            dict(operation.processing_times), operation.sequence_number)
+    return order
+
+
+def apply_step(kind: str, books, rng: random.Random, manual: clock.ManualClock) -> bool:
+    """Apply one kind of step to both books alike; returns whether it found anything to change"""
+    full = books[0]
+    codes = sorted(full)
+    if kind == 'time':
+        manual.advance(timedelta(minutes=rng.choice([1, 30, 60, 300, 780])))
+        return True
+    if kind == 'new_order':
+        code = f"NEW{len(codes):05d}"
+        template = full[rng.choice(codes)]
+        for book in books:
+            book[code] = new_order(code, template)
+        return True
+    if kind == 'force':
+        candidates = [code for code in codes if full[code].status == OperationStatus.PENDING]
+        action = lambda order: order.force_order()
+    elif kind == 'unforce':
+        candidates = [code for code in codes if full[code].is_forced]
+        action = lambda order: order.unforce_order()
+    elif kind == 'start':
+        candidates = [code for code in codes if any(operation.status == OperationStatus.PENDING
+                                                    for operation in full[code].operations)]
+        if not candidates:
+            return False
+        code = rng.choice(candidates)
+        operation = next(operation for operation in full[code].operations
+                         if operation.status == OperationStatus.PENDING)
+        machine_id = rng.choice(sorted(operation.capable_machines))
+        for book in books:
+            book[code].start_operation(operation.operation_id, machine_id)
+        return True
+    else:
+        candidates = [code for code in codes if any(operation.status == OperationStatus.IN_PROGRESS
+                                                    for operation in full[code].operations)]
+        if not candidates:
+            return False
+        code = rng.choice(candidates)
+        operation = next(operation for operation in full[code].operations
+                         if operation.status == OperationStatus.IN_PROGRESS)
+        for book in books:
+            book[code].complete_operation(operation.operation_id, full[code].quantity)
+        return True
+    if not candidates:
+        return False
+    code = rng.choice(candidates)
+    for book in books:
+        action(book[code])
+    return True
+
+
+def running_index_mismatches(engine: IncrementalScheduler, book) -> list:
+    """Machines whose running operations in the scheduler's index differ from a scan of the book"""
+    scanned = {}
+    for order in book.values():
+        for operation in order.operations:
+            if operation.status == OperationStatus.IN_PROGRESS:
+                scanned.setdefault(operation.assigned_machine, set()).add((order.order_code, operation.operation_id))
+    machines = set(scanned) | set(engine.snapshot().timelines)
+    return sorted(machine_id for machine_id in machines
+                  if {(order.order_code, operation.operation_id) for order, operation
+                      in engine.running.occupants(machine_id)} != scanned.get(machine_id, set()))
+
+
+def twin_books(directory: str, num_orders: int, seed: int):
+    """A seeded order book loaded twice, and the IncrementalScheduler over the second copy"""
+    path = os.path.join(directory, 'orders.csv')
+    write_csv(path, num_orders, seed=seed)
+    full, _ = load_orders(path)
+    incremental, _ = load_orders(path)
+    return full, incremental, IncrementalScheduler(incremental)
+
+
+def run_step(rng: random.Random, manual: clock.ManualClock, full, incremental, engine) -> tuple:
+    """
+    Apply one random step to both books and schedule each its own way
+
+    Returns:
+        (kinds, differences): the kinds of change applied and how the two outcomes disagree
+    """
+    # Mostly one change per step, sometimes several before the next schedule
+    kinds = [kind for kind in rng.choices(STEPS, k=rng.choice([1, 1, 1, 2, 3]))
+             if apply_step(kind, (full, incremental), rng, manual)]
+    current_time = manual.now()
+    expected = outcome(*schedule_orders(full), full, current_time)
+    got = outcome(*engine.refresh(current_time), incremental, current_time)
+    return kinds, differences(expected, got)
+
+
+def main(num_orders: int = 300, steps: int = 200, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    manual = clock.ManualClock(START)
+    taken, mismatches = Counter(), []
+    with tempfile.TemporaryDirectory() as directory, clock.using(manual):
+        full, incremental, engine = twin_books(directory, num_orders, seed)
+        for step in range(steps):
+            kinds, found = run_step(rng, manual, full, incremental, engine)
+            taken.update(kinds)
+            for difference in found:
+                if len(mismatches) < 100:
+                    mismatches.append(f"step {step}: {difference}")
+
+        stale = running_index_mismatches(engine, incremental)
+        if stale:
+            mismatches.append(f"running-operation index differs from the book on {stale}")
+
+    report = {
+        'orders': num_orders,
+        'steps': steps,
+        'seed': seed,
+        'taken': {kind: taken[kind] for kind in STEPS},
+        'virtual_hours': (manual.now() - START).total_seconds() / 3600,
+        'forced_at_end': sum(1 for order in full.values() if order.is_forced),
+        'halted_at_end': sum(1 for order in full.values() if order.halted_operations),
+        'mismatches': mismatches,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=300, help='orders in the generated book')
+    parser.add_argument('--steps', type=int, default=200, help='schedules to compare')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the book and of the steps')
+    args = parser.parse_args()
+    result = main(args.orders, args.steps, args.seed)
+    sys.exit(1 if result['mismatches'] else 0)
@@ -0,0 +1,35 @@
+"""
+Discrete-event simulation speed: a week of virtual time, then the whole order book
+
+Usage:
+    python -m benchmarks.simulation [num_orders]
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from csv_loader import load_orders
+from generate_order_data import generate_orders, save_to_csv
+from simulation import Simulation
+
+
+def main(num_orders: int = 10000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        save_to_csv(generate_orders(num_orders), path)
+        orders, report = load_orders(path)
+    print(report)
+
+    simulation = Simulation(orders, start=datetime(2025, 1, 6, 8, 0))
+    print("week:    ", simulation.run(duration=timedelta(days=7)))
+    rest = simulation.run()
+    print("the rest:", rest)
+    utilization = simulation.utilization()
+    print(f"finished after {rest.end - datetime(2025, 1, 6, 8, 0)} of virtual time, "
+          f"mean machine utilization {sum(utilization.values()) / len(utilization):.1%}, "
+          f"{(rest.events) / rest.wall_seconds:,.0f} events/s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
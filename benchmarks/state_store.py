@@ -0,0 +1,67 @@
+"""
+Write throughput and recovery time of the SQLite order state store
+
+Usage:
+    python -m benchmarks.state_store [num_orders]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from OrderManagment import OperationStatus
+from csv_loader import load_orders
+from generate_order_data import generate_orders, save_to_csv
+from state_store import SQLiteStateStore
+
+# Mutations between two captures, like the changes made by one request
+REQUEST_SIZE = 20
+
+
+def main(num_orders: int = 20000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        database = os.path.join(directory, 'state.db')
+        save_to_csv(generate_orders(num_orders), path)
+        orders, _ = load_orders(path)
+
+        store = SQLiteStateStore(database)
+        for order in orders.values():
+            store.track(order)
+
+        # Start and complete the first operation of every order
+        started = time.perf_counter()
+        mutations = 0
+        for order in orders.values():
+            operation = order.operations[0]
+            order.start_operation(operation.operation_id, operation.capable_machines[0])
+            order.complete_operation(operation.operation_id, order.quantity)
+            mutations += 2
+            if mutations % REQUEST_SIZE == 0:
+                store.capture()
+        request_time = time.perf_counter() - started
+        store.flush()
+        durable_time = time.perf_counter() - started
+        print(f"{mutations} mutations: {mutations / request_time:,.0f}/s on the request path, "
+              f"{mutations / durable_time:,.0f}/s durable, "
+              f"{store.transactions} transactions for {store.rows_written} order rows")
+
+        started = time.perf_counter()
+        for _ in range(100):
+            store.order_codes_with_status(OperationStatus.IN_PROGRESS)
+            store.running_on('M1')
+        print(f"indexed lookups {(time.perf_counter() - started) * 1e3 / 100:.2f} ms per status + machine query")
+        store.close()
+
+        fresh, _ = load_orders(path)
+        store = SQLiteStateStore(database)
+        started = time.perf_counter()
+        restored = store.restore(fresh)
+        print(f"recovered {restored} orders in {(time.perf_counter() - started) * 1e3:.0f} ms, "
+              f"{os.path.getsize(database) / 1e6:.1f} MB database")
+        assert all(order.operations[0].status == OperationStatus.COMPLETED for order in fresh.values())
+        store.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,209 @@
+"""
+Hot-path benchmark suite with machine-readable results
+
+Builds a seeded order book per size with generate_order_data and times, against the
+Flask app module:
+
+* load_orders_from_csv, cold from the CSV and warm from its binary snapshot
+* schedule_orders, the full greedy pass
+* get_machine_status over that schedule
+* force_order, forcing a pending order and refreshing the incremental scheduler
+* publish_state, the state writer bringing the book up to date and publishing it
+* the /api/machine_status JSON response and the index.html render from the
+  published state, through Flask's test client
+
+Every step is timed `repeat` times and then run once more under tracemalloc for
+its peak Python allocation; the process's peak RSS is recorded after each size.
+The JSON report carries the commit it was run on, so runs can be diffed across
+commits.
+
+Usage:
+    python -m benchmarks.suite [--sizes 200,2000,20000,200000] [--repeat 3] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Keep the benchmark's order state out of the working directory's database
+os.environ['ORDER_STATE_DB'] = ''
+
+import app  # noqa: E402
+import binary_snapshot  # noqa: E402
+import clock  # noqa: E402
+from OrderManagment import OperationStatus  # noqa: E402
+from generate_order_data import write_csv  # noqa: E402
+from scheduler import schedule_orders  # noqa: E402
+
+SIZES = (200, 2000, 20000, 200000)
+
+# Virtual time every size is run at, so schedules do not drift with the wall clock
+START = datetime(2025, 1, 6, 8, 0)
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def measure(step, repeat: int, setup=None, memory: bool = True) -> dict:
+    """
+    Time a step and record its peak allocation
+
+    Args:
+        step: Callable taking the value setup returned, if any
+        repeat: Timed runs
+        setup: Untimed callable run before every run of the step
+        memory: Also run the step once under tracemalloc
+    """
+    seconds = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        step(argument)
+        seconds.append(time.perf_counter() - started)
+    result = {
+        'seconds': seconds,
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+    }
+    if memory:
+        argument = setup() if setup else None
+        tracemalloc.start()
+        try:
+            step(argument)
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def reset_app() -> None:
+    """Drop the app's order book and everything derived from it"""
+    app.orders = {}
+    app.scheduler = None
+    app.order_index = None
+    app.publisher = None
+    app.writer.state = None
+    app.fragment_book = None
+    app.fragment_cache.clear()
+
+
+def run_size(num_orders: int, repeat: int, memory: bool) -> dict:
+    steps = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        started = time.perf_counter()
+        write_csv(path, num_orders, seed=num_orders)
+        generate_seconds = time.perf_counter() - started
+        snapshot = binary_snapshot.snapshot_path(path)
+
+        def cold():
+            reset_app()
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+
+        def warm():
+            reset_app()
+            if not os.path.exists(snapshot):
+                app.load_orders_from_csv(path)
+                reset_app()
+
+        load = lambda _: app.load_orders_from_csv(path)
+        steps['load_orders_from_csv'] = measure(load, repeat, cold, memory)
+        steps['load_orders_from_csv_warm'] = measure(load, repeat, warm, memory)
+
+        def fresh_book():
+            warm()
+            return app.load_orders_from_csv(path)
+
+        steps['schedule_orders'] = measure(schedule_orders, repeat, fresh_book, memory)
+
+        # The status view reads one schedule of the loaded book, as the dashboard would
+        book = fresh_book()
+        machine_schedule, _ = schedule_orders(book)
+        steps['get_machine_status'] = measure(
+            lambda _: app.get_machine_status(book, machine_schedule), repeat, None, memory)
+
+        # Steady state of the live app: loaded book, advanced incremental scheduler
+        book = fresh_book()
+        engine = app.get_scheduler()
+        engine.advance()
+        pending = (order for order in book.values() if order.status == OperationStatus.PENDING)
+
+        def force(_):
+            order = next(pending)
+            order.force_order()
+            engine.refresh()
+
+        steps['force_order'] = measure(force, repeat, None, memory)
+        steps['publish_state'] = measure(lambda _: app.writer.refresh().result(), repeat, None, memory)
+
+        client = app.app.test_client()
+
+        def get(url):
+            def request(_):
+                response = client.get(url)
+                assert response.status_code == 200, (url, response.status_code)
+                response.get_data()
+            return request
+
+        # No If-None-Match is sent, so every body is built from the published state
+        steps['api_machine_status'] = measure(get('/api/machine_status'), repeat, None, memory)
+        steps['index_render'] = measure(get('/'), repeat, None, memory)
+
+    return {
+        'orders': num_orders,
+        'operations': sum(len(order.operations) for order in book.values()),
+        'generate_seconds': generate_seconds,
+        'steps': steps,
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main(sizes=SIZES, repeat: int = 3, memory: bool = True, output: str = None) -> dict:
+    report = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'sizes': [],
+    }
+    with clock.using(clock.ManualClock(START)):
+        for num_orders in sizes:
+            result = run_size(num_orders, repeat, memory)
+            report['sizes'].append(result)
+            print(f"{num_orders:>7} orders: " + ", ".join(
+                f"{name} {step['min'] * 1e3:.1f} ms" for name, step in result['steps'].items()), file=sys.stderr)
+            reset_app()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma-separated order counts')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per step')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    main([int(size) for size in args.sizes.split(',')], args.repeat, not args.no_memory, args.output)
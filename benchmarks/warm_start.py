@@ -0,0 +1,41 @@
+"""
+Cold (CSV) versus warm (binary snapshot) startup
+
+Usage:
+    python -m benchmarks.warm_start [num_orders]
+"""
+import os
+import sys
+import tempfile
+
+import binary_snapshot
+from csv_loader import load_orders
+from generate_order_data import generate_orders, save_to_csv
+
+
+def main(num_orders: int = 50000) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'orders.csv')
+        save_to_csv(generate_orders(num_orders), path)
+        snapshot = binary_snapshot.snapshot_path(path)
+
+        orders, cold = load_orders(path)
+        binary_snapshot.save_orders(orders, snapshot)
+        print(f"csv      {os.path.getsize(path) / 1e6:6.1f} MB  {cold.seconds * 1000:8.1f} ms")
+
+        warm_orders, warm = binary_snapshot.load_orders(snapshot)
+        print(f"snapshot {os.path.getsize(snapshot) / 1e6:6.1f} MB  {warm.seconds * 1000:8.1f} ms  "
+              f"({cold.seconds / warm.seconds:.1f}x)")
+
+        same = all(
+            [(op.operation_id, op.name, op.sequence_number, op.capable_machines, dict(op.processing_times))
+             for op in order.operations] ==
+            [(op.operation_id, op.name, op.sequence_number, op.capable_machines, dict(op.processing_times))
+             for op in warm_orders[code].operations] and order.quantity == warm_orders[code].quantity
+            for code, order in orders.items()
+        ) and len(orders) == len(warm_orders)
+        print(f"round trip {'identical' if same else 'DIFFERS'}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
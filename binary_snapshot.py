@@ -0,0 +1,256 @@
+"""
+Binary snapshot of a loaded order book, for warm startup.
+
+The CSV is text that has to be split, converted and parsed row by row on every
+start. A snapshot stores the same order book as a handful of flat little-endian
+columns that are copied straight into arrays, with no per-row parsing:
+
+    header    magic b'OMBS', format version and section sizes
+    strings   order codes, operation IDs and names, NUL separated UTF-8
+    machines  string index of every machine ID used in the file
+    orders    code string, quantity, first operation and operation count
+    ops       ID string, name string, sequence number, store offset,
+              capable machine count and segment size
+    store     machine table index and processing time of every segment entry,
+              the OperationStore columns as they were in memory
+
+Every section starts on an 8-byte boundary, so the file can be mapped and the
+columns read in place. A file written with another format version is refused
+with ValueError and the caller reparses the CSV.
+"""
+import mmap
+import operator
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Dict
+
+from OrderManagment import Order, Operation, OperationStore, MACHINE_IDS, MACHINE_INDEX, intern_machine
+from csv_loader import LoadReport
+
+MAGIC = b'OMBS'
+FORMAT_VERSION = 1
+
+# magic, format version, reserved, string table bytes, machines, orders, operations, store entries
+HEADER = struct.Struct('<4sHHIIIII')
+
+_ALIGN = 8
+_SWAP = sys.byteorder != 'little'
+
+
+def snapshot_path(csv_path: str) -> str:
+    """Where the snapshot of a CSV file lives"""
+    return csv_path + '.bin'
+
+
+def is_fresh(path: str, csv_path: str) -> bool:
+    """Whether a snapshot exists and is newer than the CSV it was made from"""
+    try:
+        return os.stat(path).st_mtime >= os.stat(csv_path).st_mtime
+    except OSError:
+        return False
+
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if _SWAP:
+        column.byteswap()
+    data = column.tobytes()
+    return data + b'\0' * (-len(data) % _ALIGN)
+
+
+def save_orders(orders: Dict[str, Order], path: str) -> None:
+    """
+    Write an order book to a snapshot file
+
+    The file is written next to its destination and renamed over it, so readers
+    never see a partial snapshot. Only the operation definitions are stored;
+    statuses and timestamps are runtime state and come back as pending.
+
+    Raises:
+        ValueError: If an order code, operation ID or name contains a NUL character
+    """
+    strings, string_index = [], {}
+
+    def string(value: str) -> int:
+        index = string_index.get(value)
+        if index is None:
+            if '\0' in value:
+                raise ValueError(f"cannot store {value!r}: contains NUL")
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    machine_table, machine_position = [], {}
+    order_code, quantity, first_op, op_count = array('I'), array('q'), array('I'), array('I')
+    op_id, op_name, sequence, offset, capable, size = (array('I'), array('I'), array('q'),
+                                                       array('I'), array('H'), array('H'))
+    store_machines, store_times = array('I'), array('d')
+
+    for order in orders.values():
+        order_code.append(string(order.order_code))
+        quantity.append(order.quantity)
+        first_op.append(len(op_id))
+        op_count.append(len(order.operations))
+        for operation in order.operations:
+            op_id.append(string(operation.operation_id))
+            op_name.append(string(operation.name))
+            sequence.append(operation.sequence_number)
+            offset.append(len(store_machines))
+            capable.append(operation._capable)
+            size.append(operation._size)
+            store = operation._store
+            start = operation._offset
+            for machine in store.machines[start:start + operation._size]:
+                position = machine_position.get(machine)
+                if position is None:
+                    position = machine_position[machine] = len(machine_table)
+                    machine_table.append(string(MACHINE_IDS[machine]))
+                store_machines.append(position)
+            store_times.extend(store.times[start:start + operation._size])
+
+    string_table = '\0'.join(strings).encode('utf-8')
+    sections = [
+        HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(string_table), len(machine_table),
+                    len(order_code), len(op_id), len(store_machines)),
+        string_table + b'\0' * (-len(string_table) % _ALIGN),
+        _column('I', machine_table),
+        _column('I', order_code), _column('q', quantity), _column('I', first_op), _column('I', op_count),
+        _column('I', op_id), _column('I', op_name), _column('q', sequence),
+        _column('I', offset), _column('H', capable), _column('H', size),
+        _column('I', store_machines), _column('d', store_times),
+    ]
+    # The header is 28 bytes; pad it so the first section is aligned too
+    sections[0] += b'\0' * (-len(sections[0]) % _ALIGN)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            file.writelines(sections)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _check_indexes(path: str, limit: int, name: str, *columns) -> None:
+    """Raise ValueError unless every value in the columns is below limit"""
+    for column in columns:
+        if column and max(column) >= limit:
+            raise ValueError(f"{path}: {name} out of range")
+
+
+def _check_spans(path: str, limit: int, name: str, starts, counts) -> None:
+    """Raise ValueError unless every span of counts[i] entries from starts[i] ends within limit"""
+    if starts and max(map(operator.add, starts, counts)) > limit:
+        raise ValueError(f"{path}: {name} out of range")
+
+
+class _Reader:
+    """Sequential reader of aligned columns over a mapped snapshot"""
+
+    def __init__(self, view: memoryview, position: int):
+        self.view = view
+        self.position = position
+
+    def column(self, typecode: str, count: int) -> array:
+        column = array(typecode)
+        end = self.position + count * column.itemsize
+        if end > len(self.view):
+            raise ValueError("truncated snapshot")
+        column.frombytes(self.view[self.position:end])
+        if _SWAP:
+            column.byteswap()
+        self.position = end + (-end % _ALIGN)
+        return column
+
+    def strings(self, size: int):
+        end = self.position + size
+        if end > len(self.view):
+            raise ValueError("truncated snapshot")
+        data = bytes(self.view[self.position:end]).decode('utf-8')
+        self.position = end + (-end % _ALIGN)
+        return [sys.intern(value) for value in data.split('\0')] if data else []
+
+
+def load_orders(path: str, store: OperationStore = None):
+    """
+    Load an order book from a snapshot file
+
+    Args:
+        path: Snapshot written by save_orders()
+        store: OperationStore for the operations, a new one if not given
+
+    Returns:
+        (orders, report) like csv_loader.load_orders(), the report counting operations as rows
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a snapshot of this format version, or is
+            truncated or corrupt
+    """
+    started = time.perf_counter()
+    store = store if store is not None else OperationStore()
+
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{path}: not an order snapshot")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                magic, version, _, string_bytes, machine_count, order_count, op_count, store_count = \
+                    HEADER.unpack_from(view)
+                if magic != MAGIC:
+                    raise ValueError(f"{path}: not an order snapshot")
+                if version != FORMAT_VERSION:
+                    raise ValueError(f"{path}: snapshot format {version}, expected {FORMAT_VERSION}")
+                reader = _Reader(view, HEADER.size + (-HEADER.size % _ALIGN))
+                strings = reader.strings(string_bytes)
+                machine_table = reader.column('I', machine_count)
+                order_code, quantity = reader.column('I', order_count), reader.column('q', order_count)
+                first_op, operation_count = reader.column('I', order_count), reader.column('I', order_count)
+                op_id, op_name = reader.column('I', op_count), reader.column('I', op_count)
+                sequence, offset = reader.column('q', op_count), reader.column('I', op_count)
+                capable, segment_size = reader.column('H', op_count), reader.column('H', op_count)
+                store_machines, store_times = reader.column('I', store_count), reader.column('d', store_count)
+            finally:
+                view.release()
+
+    # Every index has to point into its table, so a corrupt file fails here rather than while decoding
+    _check_indexes(path, len(strings), "string index", machine_table, order_code, op_id, op_name)
+    _check_indexes(path, machine_count, "machine index", store_machines)
+    _check_spans(path, op_count, "operation range", first_op, operation_count)
+    _check_spans(path, store_count, "store segment", offset, segment_size)
+    if any(map(operator.gt, capable, segment_size)):
+        raise ValueError(f"{path}: capable machine count out of range")
+
+    # Machine table positions to this process's interned machine numbers
+    machines = [MACHINE_INDEX[strings[i]] if strings[i] in MACHINE_INDEX else intern_machine(strings[i])
+                for i in machine_table]
+    if machines != list(range(len(machines))):
+        store_machines = array('I', [machines[m] for m in store_machines])
+    base = len(store.machines)
+    store.machines.extend(store_machines)
+    store.times.extend(store_times)
+
+    from_segment = Operation.from_segment
+    operations = [
+        from_segment(store, base + segment, capable_count, length, strings[id_index], strings[name_index], number)
+        for segment, capable_count, length, id_index, name_index, number
+        in zip(offset, capable, segment_size, op_id, op_name, sequence)
+    ]
+    orders = {}
+    for code, order_quantity, first, count in zip(order_code, quantity, first_op, operation_count):
+        order = Order(strings[code], order_quantity, store=store)
+        order.extend_operations(operations[first:first + count])
+        orders[order.order_code] = order
+
+    report = LoadReport(path)
+    report.rows = op_count
+    report.orders = len(orders)
+    report.seconds = time.perf_counter() - started
+    return orders, report
@@ -0,0 +1,110 @@
+"""
+Time source for the order book, the scheduler and the app.
+
+Everything that needs the current time calls clock.now() instead of
+datetime.now(), which gives two things:
+
+* One consistent time per request. The app pins the time when a request starts,
+  so every order, operation and machine in a response is computed at the same
+  instant instead of drifting across a loop.
+* Virtual time. Installing a ManualClock lets the simulation engine (and tests
+  or benchmarks) move time forward without waiting for it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """The wall clock"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class ManualClock:
+    """
+    Clock that only moves when told to
+
+    Args:
+        start: Initial time, defaults to the current wall-clock time
+    """
+
+    def __init__(self, start: datetime = None):
+        self.current = start if start is not None else datetime.now()
+
+    def now(self) -> datetime:
+        return self.current
+
+    def set(self, moment: datetime) -> None:
+        """Jump to a moment; time may not go backwards"""
+        if moment < self.current:
+            raise ValueError(f"cannot move the clock back from {self.current} to {moment}")
+        self.current = moment
+
+    def advance(self, delta: timedelta) -> datetime:
+        """Move forward by a duration and return the new time"""
+        self.set(self.current + delta)
+        return self.current
+
+
+_clock = SystemClock()
+_pinned: ContextVar = ContextVar('pinned_time', default=None)
+
+
+def now() -> datetime:
+    """Current time: the pinned time if the caller's context has one, otherwise the installed clock's"""
+    pinned = _pinned.get()
+    return pinned if pinned is not None else _clock.now()
+
+
+def get_clock():
+    """The installed clock"""
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Install a clock for the whole process
+
+    Returns:
+        The clock it replaces, to restore it later
+    """
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+@contextmanager
+def using(clock):
+    """Install a clock for the duration of a with block"""
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
+
+
+def pin(moment: datetime = None):
+    """
+    Freeze now() at a moment for the current context, such as one request
+
+    Returns:
+        Token for unpin()
+    """
+    return _pinned.set(moment if moment is not None else _clock.now())
+
+
+def unpin(token) -> None:
+    """Undo a pin()"""
+    _pinned.reset(token)
+
+
+@contextmanager
+def frozen(moment: datetime = None):
+    """Freeze now() for the duration of a with block"""
+    token = pin(moment)
+    try:
+        yield now()
+    finally:
+        unpin(token)
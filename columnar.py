@@ -0,0 +1,168 @@
+"""
+Columnar view of a schedule snapshot.
+
+Machine status is computed with vectorized NumPy expressions over every slot at
+once instead of walking (order, operation, start, end) tuples. NumPy is
+optional: when it is missing `available()` is False and callers keep their
+row-by-row code.
+"""
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MICROSECOND = timedelta(microseconds=1)
+
+# Characters of an ISO 'YYYY-MM-DDTHH:MM:SS' string that spell strftime('%d-%H:%M:%S')
+_DAY_TIME_CHARS = [8, 9, 7, 11, 12, 13, 14, 15, 16, 17, 18]
+
+
+def available() -> bool:
+    """Whether NumPy is installed"""
+    return np is not None
+
+
+class ColumnarSchedule:
+    """
+    Schedule snapshot as parallel arrays, one row per booked slot.
+
+    Rows are grouped by machine, in start order within a machine. Start and end
+    are offsets from the read time in microseconds, like the snapshot itself, so a
+    query "at" some time is a query at an offset from the anchor it is read with.
+    """
+
+    def __init__(self, snapshot):
+        self.machine_ids = list(snapshot.timelines)
+        self.orders = []
+        self.operations = []
+        machine, start, end, order_index = [], [], [], []
+        order_positions = {}
+        for machine_index, slots in enumerate(snapshot.timelines.values()):
+            for order, operation, slot_start, slot_end in slots:
+                position = order_positions.get(order.order_code)
+                if position is None:
+                    position = order_positions[order.order_code] = len(self.orders)
+                    self.orders.append(order)
+                machine.append(machine_index)
+                start.append(slot_start // _MICROSECOND)
+                end.append(slot_end // _MICROSECOND)
+                order_index.append(position)
+                self.operations.append(operation)
+
+        start = np.array(start, dtype=np.int64)
+        machine = np.array(machine, dtype=np.int32)
+        rows = np.lexsort((start, machine))
+        self.machine = machine[rows]
+        self.start_us = start[rows]
+        self.end_us = np.array(end, dtype=np.int64)[rows]
+        self.order_index = np.array(order_index, dtype=np.int32)[rows]
+        self.operations = [self.operations[row] for row in rows.tolist()]
+        self.operation_index = np.arange(len(self.operations), dtype=np.int32)
+        self.start = self.start_us / 1e6
+        self.end = self.end_us / 1e6
+        self.duration = self.end - self.start
+        # Row range of each machine: rows[first[m]:first[m + 1]]
+        self.first = np.searchsorted(self.machine, np.arange(len(self.machine_ids) + 1))
+
+    @classmethod
+    def of(cls, snapshot) -> 'ColumnarSchedule':
+        """Columnar view of a snapshot, built once and cached on it"""
+        if snapshot.columns is None:
+            snapshot.columns = cls(snapshot)
+        return snapshot.columns
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def epoch(self, anchor: datetime):
+        """Start and end of every row as epoch seconds for a schedule read at anchor"""
+        base = anchor.timestamp()
+        return base + self.start, base + self.end
+
+    def current_rows(self, at: float = 0.0, last: bool = False, skip=None):
+        """
+        Find the slot each machine is working on at an offset from the read time
+
+        Args:
+            at: Offset in seconds from the read time
+            last: Take the last matching slot of a machine instead of the first
+            skip: Optional predicate on the operation; matching rows are ignored
+
+        Returns:
+            Array with one row index per machine, -1 where the machine is idle
+        """
+        rows = np.flatnonzero((self.start <= at) & (at <= self.end))
+        if skip is not None and len(rows):
+            keep = [not skip(self.operations[row]) for row in rows]
+            rows = rows[np.array(keep, dtype=bool)]
+        current = np.full(len(self.machine_ids), -1, dtype=np.int64)
+        if last:
+            # Later assignments win, so the last row of each machine sticks
+            current[self.machine[rows]] = rows
+        else:
+            current[self.machine[rows[::-1]]] = rows[::-1]
+        return current
+
+    def machine_state(self, at: float = 0.0, last: bool = False, skip=None):
+        """
+        Busy flag, progress and remaining time of every machine at once
+
+        Returns:
+            (rows, busy, progress, elapsed, remaining) arrays indexed like machine_ids;
+            progress is a percentage, elapsed and remaining are seconds
+        """
+        rows = self.current_rows(at, last=last, skip=skip)
+        busy = rows >= 0
+        safe_rows = np.where(busy, rows, 0)
+        if len(self.operations):
+            total = self.duration[safe_rows]
+            elapsed = at - self.start[safe_rows]
+            remaining = np.maximum(0.0, self.end[safe_rows] - at)
+        else:
+            total = elapsed = remaining = np.zeros(len(rows))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            progress = np.where(total > 0, elapsed / total * 100, 0.0)
+        progress = np.where(busy, np.minimum(100.0, progress), 0.0)
+        elapsed = np.where(busy, elapsed, 0.0)
+        remaining = np.where(busy, remaining, 0.0)
+        return rows, busy, progress, elapsed, remaining
+
+    def upcoming_rows(self, at: float = 0.0, limit: int = 2):
+        """Row indices of the first `limit` slots of each machine starting after an offset"""
+        rows = np.flatnonzero(self.start > at)
+        if not len(rows):
+            return rows
+        machines = self.machine[rows]
+        rank = np.arange(len(rows)) - np.searchsorted(machines, machines)
+        return rows[rank < limit]
+
+    def day_time_strings(self, anchor: datetime):
+        """strftime('%d-%H:%M:%S') of every row's start and end for a schedule read at anchor"""
+        base = np.datetime64(anchor, 'us')
+        return (self._format_day_time(base + self.start_us.astype('timedelta64[us]')),
+                self._format_day_time(base + self.end_us.astype('timedelta64[us]')))
+
+    def datetimes(self, anchor: datetime):
+        """Start and end of every row as datetime objects for a schedule read at anchor"""
+        base = np.datetime64(anchor, 'us')
+        return ((base + self.start_us.astype('timedelta64[us]')).astype(object).tolist(),
+                (base + self.end_us.astype('timedelta64[us]')).astype(object).tolist())
+
+    def format_durations(self, formatter):
+        """Apply a seconds formatter to every row's duration, once per distinct value"""
+        if not len(self.operations):
+            return []
+        values, inverse = np.unique(self.duration, return_inverse=True)
+        labels = [formatter(value) for value in values.tolist()]
+        return [labels[i] for i in inverse.tolist()]
+
+    @staticmethod
+    def _format_day_time(values):
+        if not len(values):
+            return []
+        iso = np.datetime_as_string(values.astype('datetime64[s]')).astype('U19')
+        chars = np.ascontiguousarray(iso.view('U1').reshape(-1, 19)[:, _DAY_TIME_CHARS])
+        return chars.view('U11').ravel().tolist()
+
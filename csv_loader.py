@@ -0,0 +1,153 @@
+"""
+Streaming loader for order CSV files such as orders_data.csv.
+
+Rows are read one at a time and an order's operations are added with a single
+add_operations() call once its rows end, so apart from the order book being
+built the loader only ever holds one order's rows. Durations are parsed with a
+compiled pattern and memoized, since a file repeats the same few strings
+("0D15H", "1D2H", ...) millions of times.
+"""
+import csv
+import re
+import time
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+from OrderManagment import Order, OperationStore
+
+# Columns the loader needs, in the order it unpacks them
+FIELDS = ('order_code', 'operation_id', 'operation_name', 'quantity',
+          'capable_machines', 'processing_times', 'sequence_number')
+
+DURATION_PATTERN = re.compile(r'\s*(?:(\d+)\s*D)?\s*(?:(\d+)\s*H)?\s*(?:(\d+)\s*M)?\s*(?:(\d+)\s*S)?\s*')
+
+@lru_cache(maxsize=4096)
+def parse_duration(text: str) -> int:
+    """
+    Convert a string in the format 'XD YH ZM WS' to seconds
+
+    Every part is optional but at least one must be present.
+
+    Raises:
+        ValueError: If the string is not a duration
+    """
+    match = DURATION_PATTERN.fullmatch(text)
+    if match is None or not any(match.groups()):
+        raise ValueError(f"invalid duration {text!r}")
+    days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+def parse_processing_times(cell: str) -> Dict[str, int]:
+    """
+    Parse a 'M1:0D15H;M2:1D2H' cell into a machine_id -> seconds dictionary
+
+    Raises:
+        ValueError: If an entry is not a machine:duration pair
+    """
+    processing_times = {}
+    for entry in cell.split(';'):
+        machine_id, separator, duration = entry.partition(':')
+        if not separator or not machine_id:
+            raise ValueError(f"invalid processing time {entry!r}")
+        processing_times[machine_id] = parse_duration(duration)
+    return processing_times
+
+class LoadReport:
+    """Outcome of a load: row and order counts, malformed rows and throughput"""
+
+    def __init__(self, path: str, max_errors: int = 1000):
+        self.path = path
+        self.rows = 0
+        self.orders = 0
+        self.errors: List[Tuple[int, str]] = []  # (line number, message), the first max_errors of them
+        self.error_count = 0
+        self.seconds = 0.0
+        self.max_errors = max_errors
+
+    def add_error(self, line: int, message: str) -> None:
+        """Record a malformed row"""
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"Loaded {self.rows} rows into {self.orders} orders from {self.path} "
+                f"in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s), "
+                f"{self.error_count} malformed rows skipped")
+
+def load_orders(path: str, store: OperationStore = None, max_errors: int = 1000):
+    """
+    Stream an order CSV into Order objects
+
+    Malformed rows are skipped and recorded in the report with their line number.
+
+    Args:
+        path: CSV file with the FIELDS columns
+        store: OperationStore for the operations, a new one if not given
+        max_errors: How many malformed rows to keep details for
+
+    Returns:
+        (orders, report): dictionary of order_code to Order, and a LoadReport
+
+    Raises:
+        ValueError: If the header lacks one of the FIELDS columns
+    """
+    started = time.perf_counter()
+    store = store if store is not None else OperationStore()
+    report = LoadReport(path, max_errors)
+    orders = {}
+    current_order = None
+    specs = []
+
+    with open(path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        missing = [field for field in FIELDS if field not in header]
+        if missing:
+            raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+        columns = [header.index(field) for field in FIELDS]
+        width = max(columns) + 1
+        pick = itemgetter(*columns)
+
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                report.add_error(reader.line_num, f"expected {len(header)} columns, got {len(row)}")
+                continue
+            order_code, operation_id, name, quantity, machines, times, sequence = pick(row)
+            try:
+                quantity = int(quantity)
+                sequence_number = int(sequence)
+                processing_times = parse_processing_times(times)
+            except ValueError as e:
+                report.add_error(reader.line_num, str(e))
+                continue
+
+            if current_order is None or order_code != current_order.order_code:
+                if specs:
+                    current_order.add_operations(specs)
+                    specs = []
+                current_order = orders.get(order_code)
+                if current_order is None:
+                    current_order = orders[order_code] = Order(order_code, quantity, store=store)
+
+            specs.append(dict(
+                operation_id=operation_id,
+                name=name,
+                capable_machines=machines.split(','),
+                processing_times=processing_times,
+                sequence_number=sequence_number
+            ))
+            report.rows += 1
+
+    if specs:
+        current_order.add_operations(specs)
+    report.orders = len(orders)
+    report.seconds = time.perf_counter() - started
+    return orders, report
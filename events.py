@@ -0,0 +1,177 @@
+"""
+Sequenced feed of order and machine state transitions, for Server-Sent Events.
+
+Every transition is published once, into one bounded log, however many clients
+are connected; each client only reads the log from its own position. Event IDs
+are "<epoch>:<sequence>" so a client reconnecting with Last-Event-ID resumes
+where it stopped, and an ID from another process or one that already fell out
+of the log gets a 'reset' event asking it to reload instead of silently
+skipping events.
+"""
+import json
+import threading
+from collections import deque
+from typing import Dict
+from uuid import uuid4
+
+import clock
+from OrderManagment import Order, Operation, OperationStatus
+
+# Order events forwarded to clients, by the name they are streamed under
+ORDER_EVENTS = {
+    'operation_started': 'operation_started',
+    'operation_resumed': 'operation_started',
+    'operation_completed': 'operation_completed',
+    'operation_halted': 'operation_halted',
+    'forced': 'order_forced',
+    'unforced': 'order_unforced',
+    'order_started': 'order_started',
+    'order_completed': 'order_completed',
+}
+
+
+class EventHub:
+    """
+    Bounded, sequenced event log that any number of streams read from
+
+    Args:
+        capacity: Events kept for reconnecting clients; older ones force a reload
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.epoch = uuid4().hex[:8]
+        self.sequence = 0
+        self.subscribers = 0
+        self._log = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._busy: Dict[str, set] = {}  # machine_id -> (order_code, operation_id) running on it
+
+    def watch(self, orders: Dict[str, Order]) -> None:
+        """Publish the transitions of an order book from now on, replacing any book watched before"""
+        self._busy = {}
+        for order in orders.values():
+            for operation in order.operations:
+                if operation.assigned_machine and operation.status == OperationStatus.IN_PROGRESS:
+                    self._busy.setdefault(operation.assigned_machine, set()).add(
+                        (order.order_code, operation.operation_id))
+            order.add_listener(self._on_order_event)
+
+    def publish(self, event: str, **data) -> int:
+        """Append an event to the log and wake every waiting stream"""
+        with self._condition:
+            self.sequence += 1
+            data['seq'] = self.sequence
+            data['time'] = clock.now().timestamp()
+            self._log.append((self.sequence, event, json.dumps(data)))
+            self._condition.notify_all()
+            return self.sequence
+
+    def last_event_id(self) -> str:
+        return f"{self.epoch}:{self.sequence}"
+
+    def parse_event_id(self, event_id: str):
+        """
+        Sequence number a client last saw
+
+        Returns:
+            The sequence number, or None if the ID is missing, malformed or from another epoch
+        """
+        epoch, _, sequence = (event_id or '').partition(':')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def events_after(self, sequence: int):
+        """
+        Events published after a sequence number
+
+        Returns:
+            List of (sequence, event, data) tuples, or None if some were already dropped
+        """
+        with self._condition:
+            if sequence > self.sequence:
+                return None
+            if sequence == self.sequence:
+                return []
+            if not self._log or self._log[0][0] > sequence + 1:
+                return None
+            first = self._log[0][0]
+            return [self._log[i] for i in range(sequence + 1 - first, len(self._log))]
+
+    def wait(self, sequence: int, timeout: float):
+        """Block until an event newer than sequence exists or the timeout ends, then return events_after()"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence != sequence, timeout)
+        return self.events_after(sequence)
+
+    def stream(self, event_id: str = None, heartbeat: float = 15.0):
+        """
+        Generate the text/event-stream body for one client
+
+        Args:
+            event_id: Last-Event-ID the client sent, if it is reconnecting
+            heartbeat: Seconds between keep-alive comments while nothing happens
+        """
+        sequence = self.parse_event_id(event_id)
+        with self._condition:
+            self.subscribers += 1
+        try:
+            if sequence is None or self.events_after(sequence) is None:
+                # A new client starts from now; one that missed events has to reload the full page
+                reason = 'sync' if not event_id else 'reset'
+                sequence = self.sequence
+                yield self._format(sequence, reason, json.dumps({'seq': sequence}))
+            while True:
+                events = self.wait(sequence, heartbeat)
+                if events is None:
+                    sequence = self.sequence
+                    yield self._format(sequence, 'reset', json.dumps({'seq': sequence}))
+                elif not events:
+                    yield ': keep-alive\n\n'
+                else:
+                    for event_sequence, event, data in events:
+                        yield self._format(event_sequence, event, data)
+                    sequence = events[-1][0]
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def _format(self, sequence: int, event: str, data: str) -> str:
+        return f"id: {self.epoch}:{sequence}\nevent: {event}\ndata: {data}\n\n"
+
+    def _on_order_event(self, order: Order, event: str, operation: Operation) -> None:
+        name = ORDER_EVENTS.get(event)
+        if name is None:
+            return
+        if operation is None:
+            self.publish(name, order_code=order.order_code)
+            return
+
+        key = (order.order_code, operation.operation_id)
+        if event in ('operation_started', 'operation_resumed'):
+            machine_id = operation.assigned_machine
+            self.publish(name, order_code=order.order_code, operation_id=operation.operation_id,
+                         operation=operation.name, machine_id=machine_id)
+            self._set_busy(machine_id, key, True, order, operation)
+        else:
+            if event == 'operation_halted':
+                machine_id = order.halted_operations[operation.operation_id]['machine']
+            else:
+                machine_id = operation.assigned_machine
+            self.publish(name, order_code=order.order_code, operation_id=operation.operation_id,
+                         operation=operation.name, machine_id=machine_id)
+            self._set_busy(machine_id, key, False, order, operation)
+
+    def _set_busy(self, machine_id: str, key: tuple, busy: bool, order: Order, operation: Operation) -> None:
+        running = self._busy.setdefault(machine_id, set())
+        was_busy = bool(running)
+        if busy:
+            running.add(key)
+        else:
+            running.discard(key)
+        if bool(running) != was_busy:
+            if busy:
+                self.publish('machine_busy', machine_id=machine_id, order_code=order.order_code,
+                             operation_id=operation.operation_id, operation=operation.name)
+            else:
+                self.publish('machine_idle', machine_id=machine_id)
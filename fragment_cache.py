@@ -0,0 +1,70 @@
+"""
+LRU cache of rendered HTML fragments.
+
+Order cards are rendered once per order version and reused until the order
+changes; the cache only has to bound memory, so the least recently used
+fragments are dropped once it is full. Requests render concurrently, so the
+cache is guarded by a lock; rendering itself happens outside it.
+"""
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """
+    Rendered fragments keyed on anything hashable, typically (kind, order_code, version)
+
+    Args:
+        maxsize: Fragments kept before the least recently used ones are evicted
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        """
+        Return the fragment cached under key, rendering and caching it on a miss
+
+        Args:
+            key: Cache key; include whatever the fragment depends on
+            render: Callable producing the fragment
+        """
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        fragment = render()
+        with self._lock:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.maxsize:
+                self._fragments.popitem(last=False)
+                self.evictions += 1
+        return fragment
+
+    def clear(self) -> None:
+        """Drop every fragment, keeping the counters"""
+        with self._lock:
+            self._fragments.clear()
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def stats(self) -> dict:
+        """Counters and occupancy, for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._fragments),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
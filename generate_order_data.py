@@ -1,89 +1,475 @@
+"""
+Synthetic order books for development and stress testing.
+
+Orders are sampled in chunks and streamed to the output, so a dataset is bound
+by the disk rather than by memory. Everything is drawn from one seeded
+generator, and the same seed and parameters give the same dataset:
+
+    num_orders   orders to generate, coded ORD0001, ORD0002, ...
+    machines     number of machines, M1 to Mn
+    operations   operations per order, an inclusive (low, high) range or a
+                 {count: weight} distribution
+    skew         machine capability skew: Mk is picked with weight k ** -skew,
+                 so 0 spreads operations evenly and larger values crowd them
+                 onto the low-numbered machines
+
+Each order gets 1-3 days and 0-23 hours of work spread over its operations, and
+each capable machine takes that operation's share within +-10%, as the
+original generator did. With NumPy installed a chunk is sampled with vectorized
+draws; without it the random module draws the same distributions one order at
+a time. The two draw different streams, so a seed only reproduces a dataset on
+the same backend.
+
+Both formats the app loads can be written: CSV for csv_loader, and the binary
+snapshot of binary_snapshot, whose columns are written chunk by chunk straight
+from the samples without building Order objects.
+
+Usage:
+    python generate_order_data.py [--orders 200] [--seed N] [--machines 45] [--operations 4-8]
+                                  [--skew 0] [--format csv|bin|both] [--no-numpy] [output]
+"""
+import argparse
 import csv
+import os
 import random
-from datetime import datetime, timedelta
-
-def generate_orders(num_orders=200):
-    orders = []
-    operations = [
-        "Cutting", "Drilling", "Milling", "Turning", "Grinding", "Welding",
-        "Assembly", "Testing", "Quality Control", "Packaging", "Shipping"
-    ]
-    
-    # Change time scale: Use days and hours directly
-    MIN_DAYS = 1  # Minimum 1 day per order
-    MAX_DAYS = 3  # Maximum 3 days per order
-    
-    # Generate orders
-    for i in range(num_orders):
-        order_code = f"ORD{i+1:04d}"
-        quantity = random.randint(10, 100)
-        
-        # Generate 4-8 operations per order
-        num_operations = random.randint(4, 8)
-        
-        # Total days and hours for the order
-        total_days = random.randint(MIN_DAYS, MAX_DAYS)
-        total_hours = random.randint(0, 23)  # Additional hours
-        
-        # Convert to total hours for easier distribution
-        total_hours_to_distribute = total_days * 24 + total_hours
-        remaining_hours = total_hours_to_distribute
-        
-        for j in range(num_operations):
-            operation_id = f"OP{j+1:02d}"
-            operation_name = random.choice(operations)
-            
-            # Generate 2-4 capable machines per operation
-            num_machines = random.randint(2, 4)
-            capable_machines = [f"M{k}" for k in random.sample(range(1, 46), num_machines)]
-            
-            # Calculate operation time (distribute remaining hours among operations)
-            if j == num_operations - 1:  # Last operation gets remaining time
-                operation_hours = remaining_hours
-            else:
-                # Ensure minimum 4 hours per operation
-                min_op_hours = min(4, remaining_hours // (num_operations - j))
-                max_op_hours = min(remaining_hours - ((num_operations - j - 1) * min_op_hours), 36)  # Max 1.5 days
-                operation_hours = random.randint(min_op_hours, max_op_hours)
-                remaining_hours -= operation_hours
-            
-            # Convert hours to days and hours format
-            op_days, op_hours = divmod(operation_hours, 24)
-            
-            # Generate processing times in days/hours format for each machine
-            processing_times = {}
-            for machine in capable_machines:
-                # Add some variation (±10%) to the base operation time
-                variation = random.uniform(0.9, 1.1)
-                machine_hours = int(operation_hours * variation)
-                machine_days, machine_hours = divmod(machine_hours, 24)
-                processing_times[machine] = f"{machine_days}D{machine_hours}H"
-            
-            # Convert processing times to string format
-            processing_times_str = ";".join([f"{machine}:{time}" for machine, time in processing_times.items()])
-            
-            orders.append({
-                'order_code': order_code,
-                'operation_id': operation_id,
-                'operation_name': operation_name,
-                'quantity': quantity,
-                'capable_machines': ','.join(capable_machines),
-                'processing_times': processing_times_str,
-                'sequence_number': j + 1
-            })
-    
-    return orders
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import binary_snapshot
+
+OPERATION_NAMES = [
+    "Cutting", "Drilling", "Milling", "Turning", "Grinding", "Welding",
+    "Assembly", "Testing", "Quality Control", "Packaging", "Shipping"
+]
+
+FIELDS = ['order_code', 'operation_id', 'operation_name', 'quantity',
+          'capable_machines', 'processing_times', 'sequence_number']
+
+MACHINES = 45
+OPERATIONS = (4, 8)
+
+# Capable machines per operation, inclusive
+CAPABLE = (2, 4)
+
+# Work per order: 1-3 days plus 0-23 hours, at least 4 and at most 36 hours per operation but the last
+MIN_DAYS, MAX_DAYS = 1, 3
+MIN_OPERATION_HOURS, MAX_OPERATION_HOURS = 4, 36
+
+# Orders sampled and written at a time
+CHUNK_ORDERS = 20000
+
+# array typecodes of the snapshot columns as little-endian NumPy dtypes
+_DTYPES = {'I': '<u4', 'q': '<i8', 'H': '<u2', 'd': '<f8'}
+
+
+def order_code(number: int) -> str:
+    return f"ORD{number:04d}"
+
+
+def operation_id(position: int) -> str:
+    return f"OP{position + 1:02d}"
+
+
+def duration(hours: int) -> str:
+    days, hours = divmod(hours, 24)
+    return f"{days}D{hours}H"
+
+
+class Chunk:
+    """
+    Sampled columns of consecutive orders
+
+    Per order: quantity and operation count. Per operation, orders one after the
+    other: name index and capable machine count. Per capable machine, operations
+    one after the other: 0-based machine number and processing hours. Columns
+    are lists, or NumPy arrays when sampled with NumPy.
+    """
+    __slots__ = ('first', 'quantity', 'operations', 'names', 'capable', 'machines', 'hours')
+
+    def __init__(self, first, quantity, operations, names, capable, machines, hours):
+        self.first = first            # 0-based number of the first order
+        self.quantity = quantity
+        self.operations = operations
+        self.names = names
+        self.capable = capable
+        self.machines = machines
+        self.hours = hours
+
+
+def _distribution(operations):
+    """(counts, weights) of an operation count range or {count: weight} mapping"""
+    if isinstance(operations, dict):
+        counts, weights = zip(*sorted(operations.items()))
+    else:
+        low, high = operations
+        counts = tuple(range(low, high + 1))
+        weights = (1,) * len(counts)
+    if not counts or min(counts) < 1 or any(weight < 0 for weight in weights) or not sum(weights):
+        raise ValueError(f"invalid operation count distribution {operations!r}")
+    return counts, weights
+
+
+class _Sampler:
+    """Draws with the random module, one order at a time"""
+
+    def __init__(self, seed, machines: int, operations, skew: float):
+        if machines < 1:
+            raise ValueError("at least one machine is needed")
+        self.random = random.Random(seed)
+        self.machines = machines
+        self.counts, self.weights = _distribution(operations)
+        self.capable = (min(CAPABLE[0], machines), min(CAPABLE[1], machines))
+        self.skew = skew
+        self.cumulative = list(accumulate((k + 1) ** -skew for k in range(machines)))
+
+    def counts_of(self, num_orders: int):
+        """Operations per order and capable machines per operation of the whole dataset"""
+        operations = array('H', self.random.choices(self.counts, self.weights, k=num_orders))
+        randint = self.random.randint
+        low, high = self.capable
+        capable = array('H', (randint(low, high) for _ in range(sum(operations))))
+        return operations, capable
+
+    def pick(self, count: int):
+        if not self.skew:
+            return self.random.sample(range(self.machines), count)
+        picked = []
+        while len(picked) < count:
+            machine = self.random.choices(range(self.machines), cum_weights=self.cumulative)[0]
+            if machine not in picked:
+                picked.append(machine)
+        return picked
+
+    def chunk(self, first: int, operations, capable) -> Chunk:
+        randint, uniform = self.random.randint, self.random.uniform
+        quantity, names, machines, hours = [], [], [], []
+        position = 0
+        for count in operations:
+            quantity.append(randint(10, 100))
+            remaining = randint(MIN_DAYS, MAX_DAYS) * 24 + randint(0, 23)
+            for j in range(count):
+                names.append(randint(0, len(OPERATION_NAMES) - 1))
+                if j == count - 1:
+                    operation_hours = remaining
+                else:
+                    low = min(MIN_OPERATION_HOURS, remaining // (count - j))
+                    high = min(remaining - (count - j - 1) * low, MAX_OPERATION_HOURS)
+                    operation_hours = randint(low, high)
+                    remaining -= operation_hours
+                for machine in self.pick(capable[position]):
+                    machines.append(machine)
+                    hours.append(int(operation_hours * uniform(0.9, 1.1)))
+                position += 1
+        return Chunk(first, quantity, list(operations), names, list(capable), machines, hours)
+
+
+class _NumpySampler(_Sampler):
+    """Draws every column of a chunk at once with NumPy"""
+
+    def __init__(self, seed, machines: int, operations, skew: float):
+        super().__init__(seed, machines, operations, skew)
+        self.rng = np.random.default_rng(seed)
+        self.probabilities = np.array(self.weights, dtype=float) / sum(self.weights)
+        self.cdf = np.array(self.cumulative) / self.cumulative[-1]
+
+    def counts_of(self, num_orders: int):
+        operations = self.rng.choice(np.array(self.counts, dtype=np.int64), num_orders, p=self.probabilities)
+        low, high = self.capable
+        capable = self.rng.integers(low, high + 1, int(operations.sum()))
+        return operations, capable
+
+    def picks(self, rows: int):
+        if not self.skew:
+            return self.rng.integers(0, self.machines, (rows, self.capable[1]))
+        drawn = np.searchsorted(self.cdf, self.rng.random((rows, self.capable[1])), side='right')
+        return np.minimum(drawn, self.machines - 1)
+
+    def chunk(self, first: int, operations, capable) -> Chunk:
+        rng = self.rng
+        orders, total = len(operations), len(capable)
+        quantity = rng.integers(10, 101, orders)
+        remaining = rng.integers(MIN_DAYS, MAX_DAYS + 1, orders) * 24 + rng.integers(0, 24, orders)
+        starts = np.cumsum(operations) - operations
+
+        # Spread each order's hours over its operations a position at a time, across all orders at once
+        operation_hours = np.empty(total, dtype=np.int64)
+        for j in range(int(operations.max(initial=0))):
+            active = np.flatnonzero(operations > j)
+            left = operations[active] - j
+            hours_left = remaining[active]
+            low = np.minimum(MIN_OPERATION_HOURS, hours_left // left)
+            high = np.minimum(hours_left - (left - 1) * low, MAX_OPERATION_HOURS)
+            hours = np.where(left == 1, hours_left, rng.integers(low, high + 1))
+            remaining[active] = hours_left - hours
+            operation_hours[starts[active] + j] = hours
+        names = rng.integers(0, len(OPERATION_NAMES), total)
+
+        # Machines are drawn with replacement and rows with a repeat among their used columns redrawn
+        picks = self.picks(total)
+        width = picks.shape[1]
+        used = np.arange(width) < capable[:, None]
+        rows = np.arange(total)
+        while len(rows):
+            block, block_used = picks[rows], used[rows]
+            repeated = np.zeros(len(rows), dtype=bool)
+            for a in range(width):
+                for b in range(a + 1, width):
+                    repeated |= (block[:, a] == block[:, b]) & block_used[:, b]
+            rows = rows[repeated]
+            picks[rows] = self.picks(len(rows))
+        machines = picks[used]
+        hours = (np.repeat(operation_hours, capable) * rng.uniform(0.9, 1.1, len(machines))).astype(np.int64)
+        return Chunk(first, quantity, operations, names, capable, machines, hours)
+
+
+def sample(num_orders: int, seed=None, machines: int = MACHINES, operations=OPERATIONS, skew: float = 0.0,
+           use_numpy: bool = None, chunk_orders: int = CHUNK_ORDERS):
+    """
+    Sample a dataset
+
+    Args:
+        num_orders: Orders to generate
+        seed: Seed of the generator; None draws a different dataset every time
+        machines: Number of machines, M1 to Mn
+        operations: Inclusive (low, high) operations per order, or a {count: weight} distribution
+        skew: Capability skew, machine Mk weighing k ** -skew
+        use_numpy: Sample with NumPy; by default whenever it is installed
+        chunk_orders: Orders per chunk
+
+    Returns:
+        (operations, capable, chunks): operations per order and capable machines per
+        operation of the whole dataset, and a generator of its Chunks
+
+    Raises:
+        ValueError: If a parameter is out of range, or use_numpy is set without NumPy installed
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy and np is None:
+        raise ValueError("NumPy is not installed")
+    sampler = (_NumpySampler if use_numpy else _Sampler)(seed, machines, operations, skew)
+    operation_counts, capable = sampler.counts_of(num_orders)
+
+    def chunks():
+        position = 0
+        for first in range(0, num_orders, chunk_orders):
+            counts = operation_counts[first:first + chunk_orders]
+            size = _total(counts)
+            yield sampler.chunk(first, counts, capable[position:position + size])
+            position += size
+
+    return operation_counts, capable, chunks()
+
+
+def _total(values) -> int:
+    return int(values.sum()) if np is not None and isinstance(values, np.ndarray) else sum(values)
+
+
+def _tolist(values):
+    return values.tolist() if np is not None and isinstance(values, np.ndarray) else values
+
+
+def rows(chunk: Chunk):
+    """CSV rows of a chunk, in FIELDS order"""
+    names, capable = _tolist(chunk.names), _tolist(chunk.capable)
+    machines, hours = _tolist(chunk.machines), _tolist(chunk.hours)
+    machine_ids = [f"M{k + 1}" for k in range(max(machines, default=-1) + 1)]
+    # The cells are joined from per-machine strings built once per chunk; a chunk repeats the same few thousand
+    timings = {}
+    labels = [machine_ids[m] for m in machines]
+    entries = [timings.get(key) or timings.setdefault(key, f"{machine_ids[key[0]]}:{duration(key[1])}")
+               for key in zip(machines, hours)]
+    ids = [operation_id(j) for j in range(max(_tolist(chunk.operations), default=0))]
+    position = entry = 0
+    for number, (quantity, count) in enumerate(zip(_tolist(chunk.quantity), _tolist(chunk.operations)),
+                                               chunk.first + 1):
+        code = order_code(number)
+        for j in range(count):
+            end = entry + capable[position]
+            yield (code, ids[j], OPERATION_NAMES[names[position]], quantity, ','.join(labels[entry:end]),
+                   ';'.join(entries[entry:end]), j + 1)
+            position += 1
+            entry = end
+
+
+def generate_orders(num_orders=200, seed=None, machines=MACHINES, operations=OPERATIONS, skew=0.0,
+                    use_numpy=None):
+    """Rows of a dataset as dictionaries of the CSV columns, all in memory; see sample() for the parameters"""
+    _, _, chunks = sample(num_orders, seed, machines, operations, skew, use_numpy)
+    return [dict(zip(FIELDS, row)) for chunk in chunks for row in rows(chunk)]
+
 
 def save_to_csv(orders, filename='orders_data.csv'):
-    fieldnames = ['order_code', 'operation_id', 'operation_name', 'quantity', 
-                  'capable_machines', 'processing_times', 'sequence_number']
-    
     with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDS)
         writer.writeheader()
         writer.writerows(orders)
 
+
+def write_csv(path: str, num_orders: int, **parameters) -> int:
+    """
+    Stream a dataset to a CSV file a chunk at a time; see sample() for the parameters
+
+    Returns:
+        Number of operation rows written
+    """
+    _, capable, chunks = sample(num_orders, **parameters)
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(FIELDS)
+        for chunk in chunks:
+            writer.writerows(rows(chunk))
+    return len(capable)
+
+
+def _code_bytes(num_orders: int) -> int:
+    """UTF-8 length of the order codes ORD0001 to num_orders, together"""
+    total, digits = 0, 1
+    while 10 ** (digits - 1) <= num_orders:
+        first, last = 10 ** (digits - 1), min(10 ** digits - 1, num_orders)
+        total += (last - first + 1) * (3 + max(4, digits))
+        digits += 1
+    return total
+
+
+def _column_bytes(typecode: str, values) -> bytes:
+    if np is not None and isinstance(values, np.ndarray):
+        return values.astype(_DTYPES[typecode]).tobytes()
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_snapshot(path: str, num_orders: int, **parameters) -> int:
+    """
+    Stream a dataset to a binary snapshot that binary_snapshot.load_orders() reads
+
+    The counts are sampled first, so every section's size and position is known
+    before any chunk is and each chunk is written into place in every column.
+    The file is written next to its destination and renamed over it. See
+    sample() for the parameters.
+
+    Returns:
+        Number of operations written
+    """
+    operation_counts, capable, chunks = sample(num_orders, **parameters)
+    machines = parameters.get('machines', MACHINES)
+    total, entries = len(capable), _total(capable)
+    longest = int(max(operation_counts, default=0))
+
+    # String table: machine IDs, operation names, operation IDs, then order codes
+    prefix = ([f"M{k + 1}" for k in range(machines)] + OPERATION_NAMES
+              + [operation_id(j) for j in range(longest)])
+    name_base, id_base, code_base = machines, machines + len(OPERATION_NAMES), len(prefix)
+    head = '\0'.join(prefix).encode('utf-8')
+    # Every order code is preceded by its separator
+    string_bytes = len(head) + num_orders + _code_bytes(num_orders)
+
+    def aligned(size: int) -> int:
+        return size + (-size % binary_snapshot._ALIGN)
+
+    layout = [('strings', 1, string_bytes), ('machine_table', 4, machines)]
+    layout += [(name, size, num_orders) for name, size in
+               (('order_code', 4), ('quantity', 8), ('first_op', 4), ('op_count', 4))]
+    layout += [(name, size, total) for name, size in
+               (('op_id', 4), ('op_name', 4), ('sequence', 8), ('offset', 4), ('capable', 2), ('size', 2))]
+    layout += [('store_machines', 4, entries), ('store_times', 8, entries)]
+    sections, position = {}, aligned(binary_snapshot.HEADER.size)
+    for name, size, count in layout:
+        sections[name] = position
+        position += aligned(size * count)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            def put(section: str, index: int, typecode: str, values) -> None:
+                file.seek(sections[section] + index * array(typecode).itemsize)
+                file.write(_column_bytes(typecode, values))
+
+            file.write(binary_snapshot.HEADER.pack(binary_snapshot.MAGIC, binary_snapshot.FORMAT_VERSION, 0,
+                                                   string_bytes, machines, num_orders, total, entries))
+            put('machine_table', 0, 'I', range(machines))
+            file.seek(sections['strings'])
+            file.write(head)
+
+            operation_index = entry_index = 0
+            for chunk in chunks:
+                counts, capable_counts = _tolist(chunk.operations), _tolist(chunk.capable)
+                orders, size = len(counts), len(capable_counts)
+                file.seek(sections['strings'] + len(head) + chunk.first + _code_bytes(chunk.first))
+                file.write(('\0' + '\0'.join(order_code(number) for number in
+                                             range(chunk.first + 1, chunk.first + orders + 1))).encode('utf-8'))
+
+                first_ops = list(accumulate(counts, initial=operation_index))[:-1]
+                positions = [j for count in counts for j in range(count)]
+                offsets = list(accumulate(capable_counts, initial=entry_index))[:-1]
+                put('order_code', chunk.first, 'I', range(code_base + chunk.first, code_base + chunk.first + orders))
+                put('quantity', chunk.first, 'q', chunk.quantity)
+                put('first_op', chunk.first, 'I', first_ops)
+                put('op_count', chunk.first, 'I', counts)
+                put('op_id', operation_index, 'I', [id_base + j for j in positions])
+                put('op_name', operation_index, 'I', [name_base + name for name in _tolist(chunk.names)])
+                put('sequence', operation_index, 'q', [j + 1 for j in positions])
+                put('offset', operation_index, 'I', offsets)
+                put('capable', operation_index, 'H', capable_counts)
+                put('size', operation_index, 'H', capable_counts)
+                put('store_machines', entry_index, 'I', chunk.machines)
+                if np is not None and isinstance(chunk.hours, np.ndarray):
+                    put('store_times', entry_index, 'd', chunk.hours * 3600.0)
+                else:
+                    put('store_times', entry_index, 'd', [hours * 3600.0 for hours in chunk.hours])
+                operation_index += size
+                entry_index += len(chunk.machines)
+            file.truncate(position)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return total
+
+
+def parse_operations(text: str):
+    """'4-8' as a range, '4:1,6:3' as a {count: weight} distribution, '5' as exactly five"""
+    if ':' in text:
+        return {int(count): float(weight) for count, weight in
+                (part.split(':') for part in text.split(','))}
+    low, _, high = text.partition('-')
+    return int(low), int(high or low)
+
+
 if __name__ == '__main__':
-    orders = generate_orders(200)  # Generate 200 orders
-    save_to_csv(orders)
-    print(f"Generated {len(orders)} order operations")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate a synthetic order book")
+    parser.add_argument('output', nargs='?', default='orders_data.csv',
+                        help='CSV path; the snapshot goes to <output>.bin, or to output itself with --format bin')
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--machines', type=int, default=MACHINES)
+    parser.add_argument('--operations', type=parse_operations, default=OPERATIONS,
+                        help="operations per order: '4-8' or a distribution '4:1,6:3'")
+    parser.add_argument('--skew', type=float, default=0.0, help='machine capability skew, 0 for uniform')
+    parser.add_argument('--format', choices=('csv', 'bin', 'both'), default='csv')
+    parser.add_argument('--no-numpy', action='store_true', help='sample with the random module')
+    parser.add_argument('--chunk-orders', type=int, default=CHUNK_ORDERS)
+    args = parser.parse_args()
+    parameters = dict(seed=args.seed, machines=args.machines, operations=args.operations, skew=args.skew,
+                      use_numpy=False if args.no_numpy else None, chunk_orders=args.chunk_orders)
+
+    if args.format in ('csv', 'both'):
+        started = time.perf_counter()
+        count = write_csv(args.output, args.orders, **parameters)
+        print(f"Generated {count} order operations in {args.output} in {time.perf_counter() - started:.2f}s")
+    if args.format in ('bin', 'both'):
+        # The snapshot is written after the CSV so the app sees it as fresh
+        path = args.output if args.format == 'bin' else binary_snapshot.snapshot_path(args.output)
+        started = time.perf_counter()
+        count = write_snapshot(path, args.orders, **parameters)
+        print(f"Generated {count} order operations in {path} in {time.perf_counter() - started:.2f}s")
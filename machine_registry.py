@@ -0,0 +1,225 @@
+"""
+Registry of the machines an order book uses.
+
+Machines used to exist only as strings in capable_machines, and the status
+views assumed M1-M45. The registry is built with the order book instead: every
+machine an operation can run on gets a dense number, in natural ID order (M2
+before M10) for the machines of the initial book and appended after them for
+machines that appear later, and per-machine state is kept in lists indexed by
+that number. From the orders' change notifications it maintains:
+
+* operation name -> machines able to perform it
+* machine -> pending operations it can take, a halted operation only on the
+  machine it was halted on
+* machine -> operations running on it
+
+so the status of one machine is a lookup and the status of all of them a walk
+over the machines, however many operations are scheduled.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import clock
+from OrderManagment import MACHINE_IDS, Order, Operation, OperationStatus
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(machine_id: str) -> tuple:
+    """Sort key putting M2 before M10"""
+    return tuple(int(part) if part.isdigit() else part for part in _DIGITS.split(machine_id))
+
+
+class MachineRegistry:
+    """
+    Machines of an order book with their capability and running-operation indexes
+
+    The machine -> eligible operations index holds an entry per pending
+    operation and capable machine, millions on a large book, so it is built the
+    first time it is read and maintained from then on.
+
+    Args:
+        orders: Dictionary of order_code to Order, followed through its listeners
+    """
+
+    def __init__(self, orders: Dict[str, Order]):
+        self.orders = orders
+        self.ids: List[str] = []             # machine number -> machine_id
+        self.index: Dict[str, int] = {}      # machine_id -> machine number
+        self._numbers: Dict[int, int] = {}   # Interned machine int of OrderManagment -> machine number
+        self._by_name: Dict[str, set] = {}   # operation name -> machine numbers
+        self._running: List[Dict[Operation, Order]] = []   # machine number -> operations running on it
+        self._running_on: Dict[Operation, int] = {}        # running operation -> machine number
+        self._eligible: List[Dict[Operation, Order]] = None  # machine number -> pending operations it can take
+        self._tracked = set()                # Codes of the orders indexed so far
+        self.sync()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, machine_id: str) -> bool:
+        return machine_id in self.index
+
+    def register(self, machine_id: str) -> int:
+        """Get a machine's number, registering the machine if it is new"""
+        number = self.index.get(machine_id)
+        if number is None:
+            number = self.index[machine_id] = len(self.ids)
+            self.ids.append(machine_id)
+            self._running.append({})
+            if self._eligible is not None:
+                self._eligible.append({})
+        return number
+
+    def sync(self) -> None:
+        """Index orders added to the order book since the last call, registering their new machines"""
+        if len(self._tracked) == len(self.orders):
+            return
+        names = defaultdict(set)  # operation name -> interned machine ints
+        added, busy = [], []
+        for code, order in self.orders.items():
+            if code in self._tracked:
+                continue
+            self._tracked.add(code)
+            added.append(order)
+            halted = order.halted_operations
+            for operation in order.operations:
+                names[operation.name].update(self._capable(operation))
+                if operation.status == OperationStatus.IN_PROGRESS or (halted and operation.operation_id in halted):
+                    busy.append((order, operation))
+            order.add_listener(self._on_order_event)
+
+        new = {machine for machines in names.values() for machine in machines if machine not in self._numbers}
+        for machine in sorted(new, key=lambda machine: natural_key(MACHINE_IDS[machine])):
+            self._numbers[machine] = self.register(MACHINE_IDS[machine])
+        for name, machines in names.items():
+            self._by_name.setdefault(name, set()).update(self._numbers[machine] for machine in machines)
+        if self._eligible is not None:
+            self._add_pending(added)
+        for order, operation in busy:
+            self._index(order, operation)
+
+    def mark(self, order: Order) -> None:
+        """Re-index an order changed without going through the Order methods"""
+        for operation in order.operations:
+            self._index(order, operation)
+
+    def machines_for(self, operation_name: str) -> List[str]:
+        """IDs of the machines able to perform an operation, in machine number order"""
+        return [self.ids[number] for number in sorted(self._by_name.get(operation_name, ()))]
+
+    def operation_names(self, machine_id: str) -> List[str]:
+        """Names of the operations a machine can perform"""
+        number = self.index[machine_id]
+        return [name for name, machines in self._by_name.items() if number in machines]
+
+    def eligible(self, machine_id: str) -> List[tuple]:
+        """(order, operation) pairs of the pending operations a machine can take"""
+        return [(order, operation) for operation, order in self._eligible_index()[self.index[machine_id]].items()]
+
+    def running(self, machine_id: str):
+        """(order, operation) running on a machine, or None if it is idle"""
+        running = self._running[self.index[machine_id]]
+        for operation, order in running.items():
+            return order, operation
+        return None
+
+    def status(self, machine_id: str, current_time: datetime = None) -> dict:
+        """
+        Status of one machine, from its running operation's own start and completion times
+
+        Raises:
+            KeyError: If the machine is not registered
+        """
+        if current_time is None:
+            current_time = clock.now()
+        number = self.index[machine_id]
+        status = {
+            'machine_id': machine_id,
+            'status': 'idle',
+            'eligible_operations': len(self._eligible_index()[number]),
+        }
+        for operation, order in self._running[number].items():
+            start = operation.start_time or current_time
+            end = operation.completion_time
+            if end is None:
+                end = start + timedelta(seconds=operation.processing_times.get(machine_id, 0.0))
+            total = (end - start).total_seconds()
+            elapsed = (current_time - start).total_seconds()
+            status.update({
+                'status': 'busy',
+                'current_order': order.order_code,
+                'current_operation': operation.name,
+                'operation_id': operation.operation_id,
+                'start_time': start.timestamp(),
+                'end_time': end.timestamp(),
+                'progress_percentage': round(min(100.0, max(0.0, elapsed / total * 100)), 1) if total > 0 else 100.0,
+                'remaining_time': max(0.0, (end - current_time).total_seconds()),
+            })
+            break
+        return status
+
+    def statuses(self, current_time: datetime = None) -> Dict[str, dict]:
+        """status() of every machine, in machine number order"""
+        if current_time is None:
+            current_time = clock.now()
+        return {machine_id: self.status(machine_id, current_time) for machine_id in self.ids}
+
+    @staticmethod
+    def _capable(operation: Operation):
+        """Interned machine ints of an operation's capable machines, read straight from its store segment"""
+        return operation._store.machines[operation._offset:operation._offset + operation._capable]
+
+    def _eligible_index(self) -> List[Dict[Operation, Order]]:
+        if self._eligible is None:
+            self._eligible = [{} for _ in self.ids]
+            self._add_pending(self.orders.values())
+        return self._eligible
+
+    def _add_pending(self, orders) -> None:
+        """Add the pending operations of orders nothing of which is in the eligibility index yet"""
+        pending = defaultdict(list)  # interned machine int -> (operation, order) pairs, added in bulk
+        for order in orders:
+            halted = order.halted_operations
+            for operation in order.operations:
+                if operation.status != OperationStatus.PENDING:
+                    continue
+                entry = (operation, order)
+                if halted and operation.operation_id in halted:
+                    self._eligible[self.register(halted[operation.operation_id]['machine'])][operation] = order
+                    continue
+                for machine in self._capable(operation):
+                    pending[machine].append(entry)
+        for machine, entries in pending.items():
+            self._eligible[self._numbers[machine]].update(entries)
+
+    def _index(self, order: Order, operation: Operation) -> None:
+        """Move an operation to the indexes its current state belongs in"""
+        number = self._running_on.pop(operation, None)
+        if number is not None:
+            del self._running[number][operation]
+        if operation.status == OperationStatus.IN_PROGRESS and operation.assigned_machine:
+            number = self.register(operation.assigned_machine)
+            self._running[number][operation] = order
+            self._running_on[operation] = number
+
+        eligible = self._eligible
+        if eligible is None:
+            return
+        capable = [self._numbers[machine] for machine in self._capable(operation)]
+        halted = order.halted_operations.get(operation.operation_id)
+        halted_number = self.register(halted['machine']) if halted else None
+        for number in capable:
+            eligible[number].pop(operation, None)
+        for number in (halted_number, self.index.get(operation.assigned_machine)):
+            if number is not None:
+                eligible[number].pop(operation, None)
+        if operation.status == OperationStatus.PENDING:
+            for number in ([halted_number] if halted else capable):
+                eligible[number][operation] = order
+
+    def _on_order_event(self, order: Order, event: str, operation: Operation) -> None:
+        if operation is not None:
+            self._index(order, operation)
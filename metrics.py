@@ -0,0 +1,217 @@
+"""
+Timing spans, counters and per-request profiles, exposed as Prometheus text.
+
+A span times a block or a function call into a latency histogram, and a
+counter counts events; both live in one process-wide Registry that renders the
+Prometheus text exposition format for /metrics without any client library.
+Setting ORDER_METRICS=0 turns recording off: spans then hand out one shared
+no-op context manager and timed functions call straight through, so what is
+left on the hot paths is an attribute check.
+
+Profiling is separate and heavier: profile() runs cProfile for one request and
+profile_summary() turns the result into the usual pstats table.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Histogram every span is recorded in, labelled with the span name
+SPAN_METRIC = 'orders_span_seconds'
+
+_NULL_SPAN = nullcontext()
+
+
+def _labels(labels) -> Tuple[tuple, ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, le: str = None) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Bucketed observations; counts are per bucket here and made cumulative on rendering"""
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ('registry', 'key', 'started')
+
+    def __init__(self, registry: 'Registry', key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+
+class Registry:
+    """
+    Counters and histograms keyed on metric name and labels
+
+    Args:
+        enabled: Record anything at all; when False every call returns at once
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}       # (name, labels) -> value
+        self._histograms: Dict[tuple, Histogram] = {}  # (name, labels) -> Histogram
+        self._help: Dict[str, Tuple[str, str]] = {}    # name -> (type, help text)
+        self._collectors: List[Callable] = []
+        self._span_keys: Dict[tuple, tuple] = {}       # (span name, *label items) -> histogram key
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        """Set the TYPE and HELP lines of a metric"""
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value in a histogram"""
+        if self.enabled:
+            self._observe((name, _labels(labels)), value)
+
+    def span(self, name: str, **labels):
+        """Context manager timing its block into the SPAN_METRIC histogram"""
+        if not self.enabled:
+            return _NULL_SPAN
+        cache_key = (name, *labels.items())
+        key = self._span_keys.get(cache_key)
+        if key is None:
+            key = self._span_keys[cache_key] = (SPAN_METRIC, _labels(dict(labels, span=name)))
+        return _Span(self, key)
+
+    def timed(self, name: str = None, **labels):
+        """Decorator timing every call of a function as a span, named after the function by default"""
+        def decorate(function):
+            key = (SPAN_METRIC, _labels(dict(labels, span=name or function.__name__)))
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self._observe(key, time.perf_counter() - started)
+            return wrapper
+        return decorate
+
+    def collect(self, collector: Callable) -> None:
+        """
+        Add values read at scrape time
+
+        Args:
+            collector: Callable returning (name, labels dict, value) tuples; the
+                metric's type comes from describe(), gauge if it was not described
+        """
+        self._collectors.append(collector)
+
+    def clear(self) -> None:
+        """Drop every recorded value, keeping descriptions and collectors"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Everything recorded and collected, in the Prometheus text exposition format"""
+        families: Dict[str, List[str]] = {}
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, list(histogram.counts), histogram.sum, histogram.count)
+                          for key, histogram in self._histograms.items()]
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                counters.append(((name, _labels(labels)), value))
+
+        for (name, labels), value in sorted(counters):
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), counts, total, count in sorted(histograms, key=lambda item: item[0]):
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        histogram_names = {name for (name, _), *_ in histograms}
+        output = []
+        for name in sorted(families):
+            kind, text = self._help.get(name, ('histogram' if name in histogram_names else 'gauge', ''))
+            if text:
+                output.append(f"# HELP {name} {text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(families[name])
+        return '\n'.join(output) + '\n'
+
+    def _observe(self, key, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+
+registry = Registry(enabled=os.environ.get('ORDER_METRICS', '1') != '0')
+registry.describe(SPAN_METRIC, 'histogram', 'Time spent in instrumented code paths')
+inc = registry.inc
+span = registry.span
+timed = registry.timed
+
+
+def profile() -> cProfile.Profile:
+    """Start profiling the current thread"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def profile_summary(profiler: cProfile.Profile, limit: int = 40, sort: str = 'cumulative') -> str:
+    """Stop a profiler and return its pstats table, limited to the top entries"""
+    profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
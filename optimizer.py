@@ -0,0 +1,531 @@
+"""
+Anytime schedule optimizer for the flexible job-shop behind the order book.
+
+Each order is a job whose pending operations run in sequence; each operation
+picks one of its capable machines, with that machine's processing time. A
+solution is the usual pair of vectors:
+
+* The operation sequence lists job numbers, one entry per operation. The n-th
+  time a job appears stands for its n-th pending operation, so every
+  permutation is a valid order of work.
+* The machine assignment holds, per operation, the index of the capable
+  machine it runs on.
+
+A solution decodes into a schedule by appending operations to their machines
+in sequence order, each starting once both its machine and the previous
+operation of its order are done.
+
+Simulated annealing improves the solution by moving single entries of the
+sequence and reassigning single operations. It starts from an
+earliest-finish-time dispatch, the same rule as planning.plan_eft(), and
+minimises makespan with mean order completion time as the tie-break. The
+search runs in rounds across a ProcessPoolExecutor: every worker anneals from
+the best solution found so far with its own seed. After each round the best
+result is swapped in whole, so readers never wait for the search and never
+see a half-updated solution. The workers come from a fork server, or are
+spawned where there is none, rather than forked from a process whose other
+threads may hold locks at the time.
+
+Forced orders keep their place at the front of the sequence; only their
+machines are optimized. Running operations keep their slots and halted ones
+resume on the machine they were halted on, as everywhere else.
+
+Usage:
+    python optimizer.py [orders.csv] [seconds] [workers]
+"""
+import math
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from heapq import heapify, heappop, heappush
+from typing import Dict, List, Tuple
+
+import clock
+from OrderManagment import Order, OperationStatus
+
+# Weight of the mean order completion time next to the makespan in the cost
+COMPLETION_WEIGHT = 0.01
+
+# Furthest a sequence move shifts an entry, in positions
+MOVE_WINDOW = 64
+
+# Starting temperature as a share of the starting cost
+START_TEMPERATURE = 0.002
+
+# Share of moves aimed at the order and machine that finish last
+CRITICAL_SHARE = 0.7
+
+# Start method of the worker processes; a forked child of the threaded web app could inherit a held lock
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class Problem:
+    """
+    Pending work of an order book in plain lists, cheap to send to worker processes
+
+    Times are seconds from the time the problem was built at.
+    """
+    __slots__ = ('machine_ids', 'order_codes', 'operation_ids', 'jobs', 'job_of', 'alternatives',
+                 'release', 'machine_free', 'forced_jobs')
+
+    def __init__(self):
+        self.machine_ids: List[str] = []
+        self.order_codes: List[str] = []         # Per job
+        self.operation_ids: List[str] = []       # Per operation
+        self.jobs: List[List[int]] = []          # Per job, its operations in sequence
+        self.job_of: List[int] = []              # Per operation, its job
+        self.alternatives: List[tuple] = []      # Per operation, ((machine index, seconds), ...)
+        self.release: List[float] = []           # Per job, when its next operation may start
+        self.machine_free: List[float] = []      # Per machine, when its running operations end
+        self.forced_jobs = 0                     # Jobs of forced orders, numbered first
+
+    @classmethod
+    def from_orders(cls, orders: Dict[str, Order], current_time: datetime) -> 'Problem':
+        problem = cls()
+        machine_index: Dict[str, int] = {}
+
+        def machine(machine_id: str) -> int:
+            index = machine_index.get(machine_id)
+            if index is None:
+                index = machine_index[machine_id] = len(problem.machine_ids)
+                problem.machine_ids.append(machine_id)
+                problem.machine_free.append(0.0)
+            return index
+
+        ranked = sorted(enumerate(orders.values()), key=lambda item: (-item[1].is_forced, item[0]))
+        for _, order in ranked:
+            release = 0.0
+            for operation in order.operations:
+                if operation.status == OperationStatus.IN_PROGRESS and operation.assigned_machine:
+                    end = operation.completion_time or (operation.start_time or current_time) + timedelta(
+                        seconds=operation.processing_times.get(operation.assigned_machine, 0.0))
+                    end = max(0.0, (end - current_time).total_seconds())
+                    index = machine(operation.assigned_machine)
+                    problem.machine_free[index] = max(problem.machine_free[index], end)
+                    release = max(release, end)
+
+            job = []
+            for operation in order.get_operation_sequence():
+                if operation.status != OperationStatus.PENDING:
+                    continue
+                if order.is_operation_halted(operation.operation_id):
+                    halted = order.halted_operations[operation.operation_id]
+                    remaining = operation.processing_times[halted['machine']] - halted['elapsed_time']
+                    alternatives = ((machine(halted['machine']), max(0.0, remaining)),)
+                else:
+                    alternatives = tuple((machine(machine_id), seconds)
+                                         for machine_id, seconds in operation.processing_times.items())
+                if not alternatives:
+                    continue
+                job.append(len(problem.alternatives))
+                problem.operation_ids.append(operation.operation_id)
+                problem.job_of.append(len(problem.jobs))
+                problem.alternatives.append(alternatives)
+            if not job:
+                continue
+            if order.is_forced:
+                problem.forced_jobs += 1
+            problem.order_codes.append(order.order_code)
+            problem.jobs.append(job)
+            problem.release.append(release)
+        return problem
+
+    @property
+    def size(self) -> int:
+        """Number of operations"""
+        return len(self.alternatives)
+
+    def forced_positions(self) -> int:
+        """Length of the sequence prefix that belongs to forced orders"""
+        return sum(len(job) for job in self.jobs[:self.forced_jobs])
+
+
+class OptimizerResult:
+    """A solution and its figures; never changed once built"""
+    __slots__ = ('cost', 'makespan', 'sequence', 'assignment', 'found_after', 'evaluations')
+
+    def __init__(self, cost: float, makespan: float, sequence: List[int], assignment: List[int],
+                 found_after: float = 0.0, evaluations: int = 0):
+        self.cost = cost
+        self.makespan = makespan            # Seconds from the problem's time
+        self.sequence = sequence
+        self.assignment = assignment
+        self.found_after = found_after      # Seconds into the search
+        self.evaluations = evaluations      # Schedules decoded to find it, summed over workers
+
+
+def decode(problem: Problem, sequence: List[int], assignment: List[int]):
+    """
+    Build the schedule a solution stands for
+
+    Returns:
+        (cost, makespan, starts) with starts[operation] in seconds
+    """
+    jobs = problem.jobs
+    alternatives = problem.alternatives
+    ready = list(problem.release)
+    free = list(problem.machine_free)
+    position = [0] * len(jobs)
+    starts = [0.0] * len(alternatives)
+    for job in sequence:
+        operation = jobs[job][position[job]]
+        position[job] += 1
+        machine, seconds = alternatives[operation][assignment[operation]]
+        start = ready[job] if ready[job] > free[machine] else free[machine]
+        starts[operation] = start
+        ready[job] = free[machine] = start + seconds
+    makespan = max(ready, default=0.0)
+    return makespan + COMPLETION_WEIGHT * sum(ready) / max(len(ready), 1), makespan, starts
+
+
+def _cost(problem: Problem, sequence: List[int], assignment: List[int]):
+    """
+    decode() without the start times, for the annealing loop
+
+    Returns:
+        (cost, makespan, (job, machine)) of the last operation to finish
+    """
+    jobs = problem.jobs
+    alternatives = problem.alternatives
+    ready = list(problem.release)
+    free = list(problem.machine_free)
+    position = [0] * len(jobs)
+    latest = 0.0
+    critical = None
+    for job in sequence:
+        operation = jobs[job][position[job]]
+        position[job] += 1
+        machine, seconds = alternatives[operation][assignment[operation]]
+        start = ready[job] if ready[job] > free[machine] else free[machine]
+        end = ready[job] = free[machine] = start + seconds
+        if end > latest:
+            latest = end
+            critical = (job, machine)
+    makespan = max(ready, default=0.0)
+    return makespan + COMPLETION_WEIGHT * sum(ready) / max(len(ready), 1), makespan, critical
+
+
+def dispatch(problem: Problem) -> OptimizerResult:
+    """Earliest-finish-time dispatch: the starting solution, and the baseline the search has to beat"""
+    jobs = problem.jobs
+    alternatives = problem.alternatives
+    free = list(problem.machine_free)
+    assignment = [0] * problem.size
+    sequence = []
+    heap = [(job >= problem.forced_jobs, problem.release[job], job, 0) for job in range(len(jobs))]
+    heapify(heap)
+    while heap:
+        unforced, ready, job, position = heappop(heap)
+        operation = jobs[job][position]
+        best = None
+        for index, (machine, seconds) in enumerate(alternatives[operation]):
+            end = max(ready, free[machine]) + seconds
+            if best is None or end < best[0]:
+                best = (end, index, machine)
+        end, assignment[operation], machine = best
+        free[machine] = end
+        sequence.append(job)
+        if position + 1 < len(jobs[job]):
+            heappush(heap, (unforced, end, job, position + 1))
+    cost, makespan, _ = _cost(problem, sequence, assignment)
+    return OptimizerResult(cost, makespan, sequence, assignment)
+
+
+def anneal(problem: Problem, sequence: List[int], assignment: List[int], seconds: float, seed: int):
+    """
+    Simulated annealing from a solution for a wall-clock budget
+
+    Returns:
+        OptimizerResult with the best solution seen, found_after relative to the start of this call
+    """
+    rng = random.Random(seed)
+    sequence = list(sequence)
+    assignment = list(assignment)
+    alternatives = problem.alternatives
+    flexible = [operation for operation, options in enumerate(alternatives) if len(options) > 1]
+    # Flexible operations per machine they are assigned to, to draw reassignments off the critical machine
+    assigned = defaultdict(set)
+    for operation in flexible:
+        assigned[alternatives[operation][assignment[operation]][0]].add(operation)
+    first = problem.forced_positions()
+    movable = len(sequence) - first
+    started = time.perf_counter()
+    deadline = started + seconds
+
+    cost, makespan, critical = _cost(problem, sequence, assignment)
+    critical = critical or (None, None)
+    best = OptimizerResult(cost, makespan, list(sequence), list(assignment))
+    start_temperature = temperature = START_TEMPERATURE * cost
+    evaluations = 0
+    if not flexible and movable < 2:
+        return best
+
+    while True:
+        if evaluations % 16 == 0:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            temperature = start_temperature * (deadline - now) / seconds
+
+        if flexible and (movable < 2 or rng.random() < 0.5):
+            # Mostly move work off the machine that decides the makespan
+            candidates = assigned.get(critical[1])
+            if candidates and rng.random() < CRITICAL_SHARE:
+                operation = rng.choice(tuple(candidates))
+            else:
+                operation = rng.choice(flexible)
+            old = assignment[operation]
+            new = rng.randrange(len(alternatives[operation]) - 1)
+            new = new if new < old else new + 1
+            assignment[operation] = new
+            undo = (0, operation, old, new)
+        else:
+            # Mostly start the work of the order that finishes last earlier
+            i = first + rng.randrange(movable)
+            j = min(max(first, i + rng.randint(-MOVE_WINDOW, MOVE_WINDOW)), len(sequence) - 1)
+            if rng.random() < CRITICAL_SHARE:
+                positions = [k for k in range(first, len(sequence)) if sequence[k] == critical[0]]
+                if positions:
+                    i = rng.choice(positions)
+                    j = max(first, i - rng.randint(1, MOVE_WINDOW))
+            if i == j:
+                continue
+            sequence.insert(j, sequence.pop(i))
+            undo = (1, j, i)
+
+        new_cost, new_makespan, new_critical = _cost(problem, sequence, assignment)
+        evaluations += 1
+        if new_cost <= cost or (temperature > 0 and rng.random() < math.exp((cost - new_cost) / temperature)):
+            cost = new_cost
+            critical = new_critical or (None, None)
+            if undo[0] == 0:
+                _, operation, old, new = undo
+                assigned[alternatives[operation][old][0]].discard(operation)
+                assigned[alternatives[operation][new][0]].add(operation)
+            if cost < best.cost:
+                best = OptimizerResult(cost, new_makespan, list(sequence), list(assignment),
+                                       time.perf_counter() - started)
+        elif undo[0] == 0:
+            assignment[undo[1]] = undo[2]
+        else:
+            sequence.insert(undo[2], sequence.pop(undo[1]))
+
+    best.evaluations = evaluations
+    return best
+
+
+# Problem each worker process anneals on, set once when the pool starts
+_worker_problem = None
+
+
+def _init_worker(problem: Problem) -> None:
+    global _worker_problem
+    _worker_problem = problem
+
+
+def _anneal_in_worker(sequence, assignment, seconds, seed):
+    return anneal(_worker_problem, sequence, assignment, seconds, seed)
+
+
+class ScheduleOptimizer:
+    """
+    Anytime optimizer for one order book, searching in worker processes
+
+    The order book is read once, by prepare(), which the search calls first,
+    so a search started with start() does all its work in its own thread; the
+    book must not change until then. `best` holds the best result so far, None
+    until prepared, and is replaced in one assignment, so request handlers read
+    it without locking or waiting.
+
+    Args:
+        orders: Dictionary of order_code to Order
+        current_time: Time the search plans from, defaults to now
+        workers: Worker processes, defaults to the number of CPUs
+        round_seconds: Search time between exchanges of the best solution
+        seed: Seed of the first round; later rounds and workers count up from it
+    """
+
+    def __init__(self, orders: Dict[str, Order], current_time: datetime = None, workers: int = None,
+                 round_seconds: float = 2.0, seed: int = 0):
+        self.orders = orders
+        self.current_time = current_time if current_time is not None else clock.now()
+        self.workers = workers or os.cpu_count() or 1
+        self.round_seconds = round_seconds
+        self.seed = seed
+        self.problem = None
+        self.baseline = None
+        self.best = None
+        self.rounds = 0
+        self.evaluations = 0
+        self.elapsed = 0.0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def prepare(self) -> None:
+        """Read the order book and dispatch the starting solution, unless done already"""
+        if self.problem is None:
+            problem = Problem.from_orders(self.orders, self.current_time)
+            self.baseline = dispatch(problem)
+            self.best = self.baseline
+            self.problem = problem
+            self.orders = None
+
+    def start(self, budget: float) -> None:
+        """Search in a background thread for budget seconds, unless already searching"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(budget,), name='schedule-optimizer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop after the current round"""
+        self._stop.set()
+
+    def wait(self, timeout: float = None) -> OptimizerResult:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.best
+
+    def run(self, budget: float) -> OptimizerResult:
+        """Search for budget seconds in the calling thread and return the best result"""
+        started = time.perf_counter()
+        try:
+            self.prepare()
+            with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(START_METHOD),
+                                     initializer=_init_worker, initargs=(self.problem,)) as pool:
+                while not self._stop.is_set():
+                    left = budget - (time.perf_counter() - started)
+                    if left <= 0.05:
+                        break
+                    seconds = min(self.round_seconds, left)
+                    best = self.best
+                    futures = [pool.submit(_anneal_in_worker, best.sequence, best.assignment, seconds,
+                                           self.seed + self.rounds * self.workers + worker)
+                               for worker in range(self.workers)]
+                    round_started = time.perf_counter() - started
+                    for future in as_completed(futures):
+                        result = future.result()
+                        self.evaluations += result.evaluations
+                        if result.cost < self.best.cost:
+                            result.found_after = round_started + result.found_after
+                            result.evaluations = self.evaluations
+                            self.best = result
+                    self.rounds += 1
+                    self.elapsed = time.perf_counter() - started
+        except Exception as e:
+            self.error = str(e)
+            print(f"Schedule optimizer stopped: {e}")
+        self.elapsed = time.perf_counter() - started
+        return self.best
+
+    def status(self) -> dict:
+        """Progress of the search; the figures of the solutions are None until prepared"""
+        best, baseline = self.best, self.baseline
+        return {
+            'running': self.running,
+            'workers': self.workers,
+            'operations': self.problem.size if self.problem is not None else None,
+            'rounds': self.rounds,
+            'evaluations': self.evaluations,
+            'elapsed': self.elapsed,
+            'baseline_makespan': baseline.makespan if baseline else None,
+            'best_makespan': best.makespan if best else None,
+            'improvement': (1 - best.makespan / baseline.makespan if baseline.makespan else 0.0) if best else None,
+            'found_after': best.found_after if best else None,
+            'error': self.error,
+        }
+
+    def plan(self, orders: Dict[str, Order], current_time: datetime = None):
+        """
+        Schedule an order book with the best solution found; call once prepared
+
+        The book may have moved on since the search started: operations keep the
+        machine and relative order the solution gives them, operations the search
+        did not know go last on their fastest machine, and everything is timed
+        from current_time.
+
+        Returns:
+            machine_schedule mapping machine_id to (order, operation, start, end) tuples,
+            like schedule_orders()
+        """
+        if current_time is None:
+            current_time = clock.now()
+        best = self.best
+        known = self.problem
+        # Rank and machine of every operation in the best solution, by (order_code, operation_id)
+        rank: Dict[Tuple[str, str], int] = {}
+        chosen: Dict[Tuple[str, str], str] = {}
+        position = [0] * len(known.jobs)
+        for index, job in enumerate(best.sequence):
+            operation = known.jobs[job][position[job]]
+            position[job] += 1
+            key = (known.order_codes[job], known.operation_ids[operation])
+            rank[key] = index
+            chosen[key] = known.machine_ids[known.alternatives[operation][best.assignment[operation]][0]]
+
+        problem = Problem.from_orders(orders, current_time)
+        assignment = [0] * problem.size
+        order_of = []
+        for operation, options in enumerate(problem.alternatives):
+            key = (problem.order_codes[problem.job_of[operation]], problem.operation_ids[operation])
+            machine_id = chosen.get(key)
+            fastest = min(range(len(options)), key=lambda i: options[i][1])
+            assignment[operation] = next((i for i, (machine, _) in enumerate(options)
+                                          if problem.machine_ids[machine] == machine_id), fastest)
+            order_of.append((rank.get(key, len(rank) + operation), operation))
+        # Forced orders stay in front; within a job, operations keep their sequence
+        sequence = [problem.job_of[operation] for _, operation in sorted(order_of)]
+        sequence = ([job for job in sequence if job < problem.forced_jobs] +
+                    [job for job in sequence if job >= problem.forced_jobs])
+        _, _, starts = decode(problem, sequence, assignment)
+
+        operations = {}
+        for order in orders.values():
+            for operation in order.operations:
+                operations[(order.order_code, operation.operation_id)] = (order, operation)
+        machine_schedule = defaultdict(list)
+        for order in orders.values():
+            for operation in order.operations:
+                if operation.status == OperationStatus.IN_PROGRESS and operation.assigned_machine:
+                    end = operation.completion_time or (operation.start_time or current_time) + timedelta(
+                        seconds=operation.processing_times.get(operation.assigned_machine, 0.0))
+                    machine_schedule[operation.assigned_machine].append(
+                        (order, operation, operation.start_time or current_time, end))
+        for operation, start in enumerate(starts):
+            order, op = operations[(problem.order_codes[problem.job_of[operation]], problem.operation_ids[operation])]
+            machine, seconds = problem.alternatives[operation][assignment[operation]]
+            begin = current_time + timedelta(seconds=start)
+            machine_schedule[problem.machine_ids[machine]].append(
+                (order, op, begin, begin + timedelta(seconds=seconds)))
+        for slots in machine_schedule.values():
+            slots.sort(key=lambda slot: slot[2])
+        return machine_schedule
+
+
+if __name__ == '__main__':
+    from csv_loader import load_orders
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'orders_data.csv'
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    orders, report = load_orders(path)
+    print(report)
+    optimizer = ScheduleOptimizer(orders, workers=workers)
+    optimizer.prepare()
+    print(f"{optimizer.problem.size} operations, dispatch makespan {timedelta(seconds=optimizer.baseline.makespan)}")
+    best = optimizer.run(seconds)
+    print(f"after {optimizer.elapsed:.1f}s on {optimizer.workers} workers ({optimizer.evaluations:,} schedules): "
+          f"makespan {timedelta(seconds=best.makespan)} ({optimizer.status()['improvement']:.1%} better), "
+          f"found after {best.found_after:.1f}s")
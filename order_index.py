@@ -0,0 +1,243 @@
+"""
+Filterable, cursor-paginated view over the order book.
+
+The dashboard used to group, sum and render every order on every request.
+OrderIndex keeps the groupings instead: sorted lists of order codes per status,
+for forced and halted orders and per capable machine, updated from the orders'
+change notifications. A page walks the shortest list matching the filters from
+the cursor on, so it costs O(page size) for filters the lists cover, plus a
+bisect. Its total is exact: the length of a list when one list covers the
+filters, otherwise a count over the shortest one. The total remaining time is
+kept as a running sum for the same reason.
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List
+
+from OrderManagment import Order, OperationStatus
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _contains(codes: List[str], code: str) -> bool:
+    position = bisect_left(codes, code)
+    return position < len(codes) and codes[position] == code
+
+
+def _remove(codes: List[str], code: str) -> None:
+    position = bisect_left(codes, code)
+    if position < len(codes) and codes[position] == code:
+        del codes[position]
+
+
+class OrderPage:
+    """One page of a query: the orders, the cursor of the next page and the number of orders matching"""
+    __slots__ = ('orders', 'next_cursor', 'total')
+
+    def __init__(self, orders: List[Order], next_cursor: str, total: int):
+        self.orders = orders
+        self.next_cursor = next_cursor  # Order code to pass as `after`, None on the last page
+        self.total = total              # Orders matching every filter, on all pages
+
+
+class OrderIndex:
+    """
+    Per-status, forced, halted and machine indexes over an order book
+
+    Orders are kept sorted by order code, which is also the cursor: a page holds
+    the matching orders with codes after the cursor.
+    """
+
+    def __init__(self, orders: Dict[str, Order]):
+        self.orders = orders
+        self._all: List[str] = sorted(orders)
+        self._by_status: Dict[OperationStatus, List[str]] = {status: [] for status in OperationStatus}
+        self._forced: List[str] = []
+        self._halted: List[str] = []
+        self._by_machine: Dict[str, List[str]] = {}
+        self._state: Dict[str, tuple] = {}      # order_code -> (status, forced, halted) it is indexed under
+        self._remaining: Dict[str, float] = {}  # order_code -> get_remaining_time() when last indexed
+        self.total_remaining_time = 0.0
+
+        for code in self._all:
+            order = orders[code]
+            machines = set()
+            for operation in order.operations:
+                machines.update(operation.capable_machines)
+            for machine_id in machines:
+                # Codes arrive sorted, so appending keeps every list sorted
+                self._by_machine.setdefault(machine_id, []).append(code)
+            state = self._state_of(order)
+            self._add(code, state)
+            self._state[code] = state
+            self._remaining[code] = order.get_remaining_time()
+            self.total_remaining_time += self._remaining[code]
+            order.add_listener(self._on_order_event)
+
+    def mark(self, order: Order) -> None:
+        """Re-index an order changed without going through the Order methods"""
+        code = order.order_code
+        state = self._state_of(order)
+        previous = self._state[code]
+        if state != previous:
+            self._discard(code, previous)
+            self._add(code, state)
+            self._state[code] = state
+        remaining = order.get_remaining_time()
+        self.total_remaining_time += remaining - self._remaining[code]
+        self._remaining[code] = remaining
+
+    def copy(self, orders: Dict[str, Order]) -> 'OrderIndex':
+        """
+        Read-only copy of the index over another mapping of the same order codes
+
+        Used to publish the index with copies of the orders. The order code and
+        machine lists never change after construction and are shared; the copy
+        follows no order, so it must not be marked.
+        """
+        index = OrderIndex.__new__(OrderIndex)
+        index.orders = orders
+        index._all = self._all
+        index._by_status = {status: list(codes) for status, codes in self._by_status.items()}
+        index._forced = list(self._forced)
+        index._halted = list(self._halted)
+        index._by_machine = self._by_machine
+        index._state = dict(self._state)
+        index._remaining = {}
+        index.total_remaining_time = self.total_remaining_time
+        return index
+
+    def count(self, status: OperationStatus = None) -> int:
+        """Number of orders with a status, or of all orders"""
+        return len(self._all if status is None else self._by_status[status])
+
+    def page(self, status: OperationStatus = None, forced: bool = None, halted: bool = None,
+             machine: str = None, prefix: str = None, after: str = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> OrderPage:
+        """
+        Get a page of orders matching every given filter
+
+        Args:
+            status: Only orders with this status
+            forced: Only forced (True) or unforced (False) orders
+            halted: Only orders with (True) or without (False) halted operations
+            machine: Only orders with an operation this machine can perform
+            prefix: Only orders whose code starts with this
+            after: Cursor from the previous page
+            limit: Page size, capped at MAX_PAGE_SIZE
+
+        Returns:
+            OrderPage in order code order
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        candidates = [self._all]
+        if status is not None:
+            candidates.append(self._by_status[status])
+        if forced:
+            candidates.append(self._forced)
+        if halted:
+            candidates.append(self._halted)
+        machine_codes = self._by_machine.get(machine, [])
+        if machine is not None:
+            candidates.append(machine_codes)
+        codes = min(candidates, key=len)
+
+        start = 0
+        if prefix:
+            start = bisect_left(codes, prefix)
+        if after is not None:
+            start = max(start, bisect_right(codes, after))
+
+        page = []
+        next_cursor = None
+        for position in range(start, len(codes)):
+            code = codes[position]
+            if prefix and not code.startswith(prefix):
+                break
+            order = self.orders[code]
+            order_status, is_forced, is_halted = self._state[code]
+            if status is not None and order_status != status:
+                continue
+            if forced is not None and is_forced != forced:
+                continue
+            if halted is not None and is_halted != halted:
+                continue
+            if machine is not None and codes is not machine_codes and not _contains(machine_codes, code):
+                continue
+            if len(page) == limit:
+                next_cursor = page[-1].order_code
+                break
+            page.append(order)
+        return OrderPage(page, next_cursor, self.count_matching(status, forced, halted, machine, prefix))
+
+    def count_matching(self, status: OperationStatus = None, forced: bool = None, halted: bool = None,
+                       machine: str = None, prefix: str = None) -> int:
+        """
+        Exact number of orders matching every given filter, as page() takes them
+
+        A list covering the filters answers with its length, or a bisect for a
+        prefix. Excluding forced or halted orders subtracts the count over their
+        short lists; any other combination counts over the shortest list.
+        """
+        if forced is False:
+            return (self.count_matching(status, None, halted, machine, prefix)
+                    - self.count_matching(status, True, halted, machine, prefix))
+        if halted is False:
+            return (self.count_matching(status, forced, None, machine, prefix)
+                    - self.count_matching(status, forced, True, machine, prefix))
+        candidates = [self._all]
+        if status is not None:
+            candidates.append(self._by_status[status])
+        if forced:
+            candidates.append(self._forced)
+        if halted:
+            candidates.append(self._halted)
+        machine_codes = self._by_machine.get(machine, [])
+        if machine is not None:
+            candidates.append(machine_codes)
+        codes = min(candidates, key=len)
+
+        start, end = 0, len(codes)
+        if prefix:
+            start = bisect_left(codes, prefix)
+            end = bisect_left(codes, prefix + '\U0010ffff', start)
+        if len(candidates) <= 2 and (len(candidates) == 1 or codes is not self._all):
+            # Only the list walked filters, so every code in range matches
+            return end - start
+        count = 0
+        for position in range(start, end):
+            code = codes[position]
+            order_status, is_forced, is_halted = self._state[code]
+            if status is not None and order_status != status:
+                continue
+            if forced and not is_forced:
+                continue
+            if halted and not is_halted:
+                continue
+            if machine is not None and codes is not machine_codes and not _contains(machine_codes, code):
+                continue
+            count += 1
+        return count
+
+    @staticmethod
+    def _state_of(order: Order) -> tuple:
+        return order.status, bool(order.is_forced), bool(order.halted_operations)
+
+    def _add(self, code: str, state: tuple) -> None:
+        status, forced, halted = state
+        insort(self._by_status[status], code)
+        if forced:
+            insort(self._forced, code)
+        if halted:
+            insort(self._halted, code)
+
+    def _discard(self, code: str, state: tuple) -> None:
+        status, forced, halted = state
+        _remove(self._by_status[status], code)
+        if forced:
+            _remove(self._forced, code)
+        if halted:
+            _remove(self._halted, code)
+
+    def _on_order_event(self, order: Order, event: str, operation) -> None:
+        self.mark(order)
@@ -0,0 +1,238 @@
+"""
+Alternative scheduling mode and schedule quality metrics.
+
+The default greedy pass (schedule_orders() and IncrementalScheduler) starts
+each operation on the machine that frees up first, whatever it takes there,
+and lets the operations of one order overlap in time. The earliest-finish-time
+mode plans differently:
+
+* An operation becomes ready only when the previous one of its order ends.
+* Among the capable machines it takes the one where it would finish first,
+  taking both the machine's idle gaps and its processing time there into
+  account.
+
+Operations are dispatched in the order they become ready, forced orders first
+and ties going to the older order. A heap of every order's next operation
+keeps that at O(log n) per operation on top of its capability list, and the
+gap search per machine is bounded by GAP_SCAN_LIMIT, so the cost grows
+near-linearly with the number of operations. As every order moves on as soon
+as it can, the mode favours makespan and utilization over finishing orders in
+creation order, which shows in the tardiness. Operations in progress keep their
+machine and slot, and halted operations resume on the machine they were halted
+on. Forced orders go first but never pre-empt running operations in this mode.
+
+Usage:
+    python planning.py [orders.csv]
+"""
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from heapq import heapify, heappop, heappush
+from typing import Dict
+
+import clock
+from OrderManagment import Order, OperationStatus
+from scheduler import HORIZON, ZERO, MachineTimeline, ScheduledOperation
+
+# Scheduling modes the schedule metrics can be computed for
+MODES = ('greedy', 'eft', 'optimized')
+
+# Idle gaps tried per machine before an operation is appended at the end of its timeline
+GAP_SCAN_LIMIT = 4
+
+# Default due date: creation time plus this multiple of the order's fastest total processing time
+DUE_DATE_ALLOWANCE = 3.0
+
+
+class ScheduleMetrics:
+    """Quality figures of a schedule, measured from the time it was planned at"""
+    __slots__ = ('makespan', 'utilization', 'total_tardiness', 'late_orders', 'operations')
+
+    def __init__(self, makespan: timedelta, utilization: Dict[str, float], total_tardiness: float,
+                 late_orders: int, operations: int):
+        self.makespan = makespan                  # From the planning time to the end of the last slot
+        self.utilization = utilization            # machine_id -> busy share of the makespan
+        self.total_tardiness = total_tardiness    # Seconds orders finish after their due dates, summed
+        self.late_orders = late_orders
+        self.operations = operations              # Slots in the schedule
+
+    @property
+    def mean_utilization(self) -> float:
+        return sum(self.utilization.values()) / len(self.utilization) if self.utilization else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'makespan': self.makespan.total_seconds(),
+            'mean_utilization': self.mean_utilization,
+            'utilization': self.utilization,
+            'total_tardiness': self.total_tardiness,
+            'late_orders': self.late_orders,
+            'operations': self.operations,
+        }
+
+    def __str__(self) -> str:
+        return (f"makespan {self.makespan}, mean utilization {self.mean_utilization:.1%}, "
+                f"total tardiness {timedelta(seconds=round(self.total_tardiness))} over {self.late_orders} late orders, "
+                f"{self.operations} operations")
+
+
+def due_date(order: Order) -> datetime:
+    """Default due date of an order, from its creation time and fastest total processing time"""
+    work = sum(min(operation.processing_times.values(), default=0.0) for operation in order.operations)
+    return order.created_at + timedelta(seconds=DUE_DATE_ALLOWANCE * work)
+
+
+def plan_eft(orders: Dict[str, Order], current_time: datetime = None):
+    """
+    Precedence-aware earliest-finish-time schedule of an order book
+
+    Nothing is changed on the orders; apply the result the way schedule_orders()
+    applies its own.
+
+    Args:
+        orders: Dictionary of order_code to Order
+        current_time: Time the schedule starts at, defaults to now
+
+    Returns:
+        machine_schedule mapping machine_id to (order, operation, start, end) tuples in
+        start order, like schedule_orders()
+    """
+    if current_time is None:
+        current_time = clock.now()
+    timelines: Dict[str, MachineTimeline] = {}
+
+    def timeline(machine_id: str) -> MachineTimeline:
+        line = timelines.get(machine_id)
+        if line is None:
+            line = timelines[machine_id] = MachineTimeline(machine_id)
+        return line
+
+    def book(key, order, operation, machine_id, start, end):
+        entry = ScheduledOperation(key, order, operation, None, ())
+        entry.machine, entry.start, entry.end = machine_id, start, end
+        timeline(machine_id).insert(entry)
+        return entry
+
+    # Running operations hold their machines before anything is planned around them;
+    # the heap holds (forced, ready offset, created_at, rank, position, order, pending operations)
+    heap = []
+    for rank, order in enumerate(orders.values()):
+        order_ready = ZERO
+        for operation in order.operations:
+            if operation.status != OperationStatus.IN_PROGRESS or not operation.assigned_machine:
+                continue
+            start = (operation.start_time or current_time) - current_time
+            end = (operation.completion_time - current_time if operation.completion_time
+                   else start + timedelta(seconds=operation.processing_times.get(operation.assigned_machine, 0.0)))
+            # An overdue operation keeps its past end, so applying the plan completes it
+            book((rank,), order, operation, operation.assigned_machine, start, end)
+            order_ready = max(order_ready, end)
+        sequence = [op for op in order.get_operation_sequence() if op.status == OperationStatus.PENDING]
+        if sequence:
+            heap.append((-order.is_forced, order_ready, order.created_at, rank, 0, order, sequence))
+    heapify(heap)
+
+    while heap:
+        forced, order_ready, created_at, rank, position, order, sequence = heappop(heap)
+        operation = sequence[position]
+        if order.is_operation_halted(operation.operation_id):
+            halted = order.halted_operations[operation.operation_id]
+            machine_id = halted['machine']
+            duration = timedelta(seconds=max(0.0, operation.processing_times[machine_id] - halted['elapsed_time']))
+            start = timeline(machine_id).earliest_gap(order_ready, duration, GAP_SCAN_LIMIT)
+            best = (start + duration, start, machine_id)
+        else:
+            best = None
+            for machine_id, seconds in operation.processing_times.items():
+                duration = timedelta(seconds=seconds)
+                start = timeline(machine_id).earliest_gap(order_ready, duration, GAP_SCAN_LIMIT)
+                if best is None or start + duration < best[0]:
+                    best = (start + duration, start, machine_id)
+        if best is None:
+            end = order_ready
+        else:
+            end, start, machine_id = best
+            if start >= HORIZON:
+                continue  # Like schedule_orders(), give up on what cannot start within the horizon
+            book((forced, created_at, rank, position), order, operation, machine_id, start, end)
+        if position + 1 < len(sequence):
+            heappush(heap, (forced, end, created_at, rank, position + 1, order, sequence))
+
+    machine_schedule = defaultdict(list)
+    for machine_id, line in timelines.items():
+        machine_schedule[machine_id] = [
+            (entry.order, entry.operation, current_time + entry.start, current_time + entry.end)
+            for entry in line
+        ]
+    return machine_schedule
+
+
+def measure(machine_schedule, orders: Dict[str, Order], current_time: datetime,
+            due_dates: Dict[str, datetime] = None) -> ScheduleMetrics:
+    """
+    Makespan, per-machine utilization and total tardiness of a schedule
+
+    Only the part of each slot after current_time counts, so schedules planned
+    at the same time compare fairly whatever they keep from the past. Orders
+    finish when their last slot ends, or at their completion time if nothing of
+    them is scheduled after current_time.
+
+    Args:
+        machine_schedule: machine_id -> (order, operation, start, end) tuples
+        orders: The order book the schedule was planned for
+        current_time: Time the schedule was planned at
+        due_dates: order_code -> due date, defaulting to due_date() per order
+    """
+    busy: Dict[str, float] = {}
+    finish: Dict[str, datetime] = {}
+    horizon = current_time
+    operations = 0
+    for machine_id, slots in machine_schedule.items():
+        seconds = 0.0
+        for order, operation, start, end in slots:
+            operations += 1
+            if end > current_time:
+                seconds += (end - max(start, current_time)).total_seconds()
+            if end > horizon:
+                horizon = end
+            code = order.order_code
+            if code not in finish or end > finish[code]:
+                finish[code] = end
+        busy[machine_id] = seconds
+
+    makespan = horizon - current_time
+    span = makespan.total_seconds()
+    utilization = {machine_id: seconds / span if span else 0.0 for machine_id, seconds in busy.items()}
+
+    total_tardiness = 0.0
+    late_orders = 0
+    for code, order in orders.items():
+        end = finish.get(code)
+        if end is None or end <= current_time:
+            end = order.completion_time or end
+        if end is None:
+            continue
+        due = due_dates[code] if due_dates and code in due_dates else due_date(order)
+        if end > due:
+            total_tardiness += (end - due).total_seconds()
+            late_orders += 1
+    return ScheduleMetrics(makespan, utilization, total_tardiness, late_orders, operations)
+
+
+if __name__ == '__main__':
+    from csv_loader import load_orders
+    from scheduler import IncrementalScheduler
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'orders_data.csv'
+    orders, report = load_orders(path)
+    print(report)
+    now = clock.now()
+
+    started = time.perf_counter()
+    machine_schedule = plan_eft(orders, now)
+    print(f"eft     {time.perf_counter() - started:7.3f}s  {measure(machine_schedule, orders, now)}")
+
+    started = time.perf_counter()
+    machine_schedule, _ = IncrementalScheduler(orders).refresh(now)
+    print(f"greedy  {time.perf_counter() - started:7.3f}s  {measure(machine_schedule, orders, now)}")
@@ -0,0 +1,671 @@
+"""
+Published order book state shared between processes through a mapped file.
+
+Under a multi-worker server every process used to load its own order book and
+run its own schedule, so workers disagreed about what was running and none saw
+the others' changes. In multi-process mode one owner process runs the state
+writer and, after every publish, writes the published state to a state file as
+flat little-endian columns, laid out like binary_snapshot:
+
+    header    magic b'OMSS', format version, layout, version, base version,
+              time, next event and section sizes
+    strings   etag, stream event id, order codes and machine IDs, NUL separated UTF-8
+    orders    status, forced flag, version, start, completion and force time,
+              first operation row
+    ops       status, assigned machine, start and completion time, completed quantity
+    halted    operation row, machine, elapsed seconds and progress of every halted operation
+    schedule  machine and first slot of every timeline, then order, operation
+              row and start and end offset of every slot
+    changed   positions of the orders changed since the base version
+
+Times are microseconds since 1970, offsets microseconds, NULL_TIME for None.
+The file is written next to its destination and renamed over it, so a worker
+that mapped the previous file keeps reading a complete state until it maps the
+next one. After each rename the owner bumps a counter in a small sequence file
+that every worker keeps mapped, so checking for a new state is one memory
+read rather than a stat, whose inode and mtime can repeat. Each worker follows
+the file into its own copy of the order book, applying only the orders that
+changed since the version it holds, and publishes from that copy as the owner
+does from the live book.
+
+Workers never change the order book themselves: OwnerServer runs the tasks
+they forward over a multiprocessing connection on the owner's writer, and
+streams the owner's events to them. The state file, the sequence file and the
+owner's socket are readable and writable by the owner's user only.
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+import uuid
+from array import array
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from multiprocessing.connection import Client, Listener
+from queue import Empty, SimpleQueue
+from typing import Callable, Dict, List
+
+import clock
+import metrics
+from OrderManagment import Order, OperationStatus
+from scheduler import ScheduleSnapshot
+from state_writer import PublishedState
+
+MAGIC = b'OMSS'
+FORMAT_VERSION = 2
+
+# magic, format version, reserved, layout, version, base version, time, next event, string table bytes,
+# registry machines, machines, orders, operations, halted operations, timelines, slots, changed orders
+HEADER = struct.Struct('<4sHHqqqqqIIIIIIIII')
+
+NULL_TIME = -2 ** 63
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+STATUSES = tuple(OperationStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+_ALIGN = 8
+_SWAP = sys.byteorder != 'little'
+
+metrics.registry.describe('orders_shared_state_bytes_total', 'counter', 'Bytes of state files written')
+metrics.registry.describe('orders_shared_orders_applied_total', 'counter',
+                          'Orders a worker copied from the state file into its order book')
+
+
+def _micros(moment: datetime) -> int:
+    return NULL_TIME if moment is None else (moment - EPOCH) // MICROSECOND
+
+
+def _moment(micros: int) -> datetime:
+    return None if micros == NULL_TIME else EPOCH + timedelta(microseconds=micros)
+
+
+def _padded(data: bytes) -> bytes:
+    return data + b'\0' * (-len(data) % _ALIGN)
+
+
+def _column(column: array) -> bytes:
+    if _SWAP:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return _padded(column.tobytes())
+
+
+class SequenceFile:
+    """
+    Counter of the state files written, in a mapped 8-byte file next to the state file
+
+    The file is kept across owner restarts, so workers that mapped it go on
+    seeing the count move.
+
+    Args:
+        path: Path of the sequence file
+        writable: Map it for bumping, creating it if needed; readers map it once it exists
+    """
+    COUNTER = struct.Struct('<Q')
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self._mapped = None
+
+    def read(self) -> int:
+        """The current count, None while there is no sequence file yet"""
+        if self._mapped is None and not self._map():
+            return None
+        return self.COUNTER.unpack_from(self._mapped)[0]
+
+    def bump(self) -> None:
+        if self._mapped is None:
+            self._map()
+        self.COUNTER.pack_into(self._mapped, 0, (self.COUNTER.unpack_from(self._mapped)[0] + 1) % 2 ** 64)
+
+    def _map(self) -> bool:
+        flags = os.O_RDWR | os.O_CREAT if self.writable else os.O_RDONLY
+        try:
+            descriptor = os.open(self.path, flags, 0o600)
+        except FileNotFoundError:
+            return False
+        try:
+            if self.writable:
+                os.fchmod(descriptor, 0o600)  # One an older owner created may be readable by others
+            if os.fstat(descriptor).st_size < self.COUNTER.size:
+                if not self.writable:
+                    return False
+                os.ftruncate(descriptor, self.COUNTER.size)
+            access = mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+            self._mapped = mmap.mmap(descriptor, self.COUNTER.size, access=access)
+        finally:
+            os.close(descriptor)
+        return True
+
+
+class SharedStateFile:
+    """
+    Owner side: writes every published state to the state file
+
+    Keeps the columns between writes and only refills the rows of orders that
+    are not the same copy as in the previous state, so a write costs
+    O(changed orders + slots) plus copying the columns out.
+
+    Args:
+        path: State file to write; workers map the same path
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._state: PublishedState = None
+        self._layout = 0
+        self._epoch = None
+        self._schedule_bytes = None
+        self._sequence = SequenceFile(path + '.seq', writable=True)
+
+    def write(self, state: PublishedState) -> None:
+        """Write a published state and rename it over the previous one"""
+        with metrics.span('shared_state_write'):
+            previous = self._state
+            # An ETag epoch belongs to one order book, so a reloaded book starts a new layout
+            epoch = state.etag.partition('-')[0]
+            if (previous is None or epoch != self._epoch or len(state.orders) != len(self._codes)
+                    or state.orders.keys() != self._position.keys()
+                    or tuple(state.machine_ids) != tuple(self._machines[:self._registry])):
+                self._lay_out(state)
+                self._epoch = epoch
+                changed, base = range(len(self._codes)), -1
+            else:
+                orders, before = state.orders, previous.orders
+                changed = [position for position, code in enumerate(self._codes) if orders[code] is not before[code]]
+                base = previous.version
+            for position in changed:
+                self._store(position, state.orders[self._codes[position]])
+            if previous is None or state.schedule is not previous.schedule or self._schedule_bytes is None:
+                self._schedule_bytes = self._timelines(state)
+            self._state = state
+            self._save(state, base, changed)
+
+    def _lay_out(self, state: PublishedState) -> None:
+        """Start a new layout: positions of the orders, their operation rows and the machine table"""
+        self._layout = uuid.uuid4().int >> 65
+        self._codes = list(state.orders)
+        self._position = {code: position for position, code in enumerate(self._codes)}
+        self._machines = list(state.machine_ids)
+        self._registry = len(self._machines)
+        self._machine_position = {machine_id: position for position, machine_id in enumerate(self._machines)}
+        self._first = array('I', [0])
+        for code in self._codes:
+            self._first.append(self._first[-1] + len(state.orders[code].operations))
+        orders, operations = len(self._codes), self._first[-1]
+        self._order_status, self._order_forced = array('B', bytes(orders)), array('B', bytes(orders))
+        self._order_version = array('q', [0]) * orders
+        self._order_start, self._order_completion, self._order_force = (
+            array('q', [NULL_TIME]) * orders for _ in range(3))
+        self._op_status = array('B', bytes(operations))
+        self._op_machine = array('i', [-1]) * operations
+        self._op_start, self._op_completion = array('q', [NULL_TIME]) * operations, array('q', [NULL_TIME]) * operations
+        self._op_quantity = array('q', [0]) * operations
+        self._halted: Dict[int, tuple] = {}  # operation row -> (machine position, elapsed seconds, progress)
+
+    def _machine(self, machine_id: str) -> int:
+        if machine_id is None:
+            return -1
+        position = self._machine_position.get(machine_id)
+        if position is None:
+            position = self._machine_position[machine_id] = len(self._machines)
+            self._machines.append(machine_id)
+        return position
+
+    def _store(self, position: int, order: Order) -> None:
+        self._order_status[position] = STATUS_CODES[order.status]
+        self._order_forced[position] = order.is_forced
+        self._order_version[position] = order.version
+        self._order_start[position] = _micros(order.start_time)
+        self._order_completion[position] = _micros(order.completion_time)
+        self._order_force[position] = _micros(order.force_time)
+        first = self._first[position]
+        for row, operation in enumerate(order.operations, first):
+            self._op_status[row] = STATUS_CODES[operation.status]
+            self._op_machine[row] = self._machine(operation.assigned_machine)
+            self._op_start[row] = _micros(operation.start_time)
+            self._op_completion[row] = _micros(operation.completion_time)
+            self._op_quantity[row] = operation.completed_quantity
+            halted = order.halted_operations.get(operation.operation_id)
+            if halted is not None:
+                self._halted[row] = (self._machine(halted['machine']), halted['elapsed_time'], halted['progress'])
+            else:
+                self._halted.pop(row, None)
+
+    def _timelines(self, state: PublishedState) -> List[bytes]:
+        machines, first = array('I'), array('I', [0])
+        slot_order, slot_row, slot_start, slot_end = array('I'), array('I'), array('q'), array('q')
+        for machine_id, slots in state.schedule.timelines.items():
+            machines.append(self._machine(machine_id))
+            for order, operation, start, end in slots:
+                position = self._position[order.order_code]
+                slot_order.append(position)
+                slot_row.append(self._first[position] + order.operations.index(operation))
+                slot_start.append(start // MICROSECOND)
+                slot_end.append(end // MICROSECOND)
+            first.append(len(slot_order))
+        return [len(machines), len(slot_order), _column(machines), _column(first), _column(slot_order),
+                _column(slot_row), _column(slot_start), _column(slot_end)]
+
+    def _save(self, state: PublishedState, base: int, changed) -> None:
+        strings = [state.etag, state.event_id] + self._codes + self._machines
+        if any('\0' in value for value in (state.etag, state.event_id)):
+            raise ValueError("cannot store a state version or event id containing NUL")
+        string_table = '\0'.join(strings).encode('utf-8')
+        halted_rows = sorted(self._halted)
+        timelines, slots, *schedule = self._schedule_bytes
+        sections = [
+            _padded(HEADER.pack(MAGIC, FORMAT_VERSION, 0, self._layout, state.version, base, _micros(state.time),
+                                _micros(state.next_event), len(string_table), self._registry, len(self._machines),
+                                len(self._codes), self._first[-1], len(halted_rows), timelines, slots, len(changed))),
+            _padded(string_table),
+            _column(self._order_status), _column(self._order_forced), _column(self._order_version),
+            _column(self._order_start), _column(self._order_completion), _column(self._order_force),
+            _column(self._first),
+            _column(self._op_status), _column(self._op_machine), _column(self._op_start),
+            _column(self._op_completion), _column(self._op_quantity),
+            _column(array('I', halted_rows)),
+            _column(array('i', [self._halted[row][0] for row in halted_rows])),
+            _column(array('d', [self._halted[row][1] for row in halted_rows])),
+            _column(array('d', [self._halted[row][2] for row in halted_rows])),
+            *schedule,
+            _column(array('I', changed)),
+        ]
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as file:
+                file.writelines(sections)
+            os.replace(temporary, self.path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self._sequence.bump()
+        metrics.inc('orders_shared_state_bytes_total', sum(len(section) for section in sections))
+
+
+class SharedState:
+    """
+    Worker side: one state file, mapped, with its columns read in place
+
+    Use as a context manager; the mapping is released on exit, so nothing read
+    from the columns may be kept as a view.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a state file of this format version
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path}: not a shared state file")
+            self._mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            self._read(path, memoryview(self._mapped))
+        except BaseException:
+            self.close()
+            raise
+
+    def _read(self, path: str, view: memoryview) -> None:
+        self._views.append(view)
+        (magic, version, _, self.layout, self.version, self.base, time, next_event, string_bytes, registry,
+         machines, orders, operations, halted, timelines, slots, changed) = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a shared state file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: state file format {version}, expected {FORMAT_VERSION}")
+        self.time = _moment(time)
+        self.next_event = _moment(next_event)
+        self._position = HEADER.size + (-HEADER.size % _ALIGN)
+        end = self._position + string_bytes
+        strings = bytes(view[self._position:end]).decode('utf-8').split('\0')
+        self._position = end + (-end % _ALIGN)
+        self.etag, self.event_id = strings[0], strings[1]
+        self.codes = strings[2:2 + orders]
+        self.machines = strings[2 + orders:]
+        self.machine_ids = tuple(self.machines[:registry])
+        column = lambda typecode, count: self._column(view, typecode, count)
+        self.order_status, self.order_forced = column('B', orders), column('B', orders)
+        self.order_version = column('q', orders)
+        self.order_start, self.order_completion, self.order_force = (column('q', orders) for _ in range(3))
+        self.first = column('I', orders + 1)
+        self.op_status, self.op_machine = column('B', operations), column('i', operations)
+        self.op_start, self.op_completion, self.op_quantity = (column('q', operations) for _ in range(3))
+        self.halted_row, self.halted_machine = column('I', halted), column('i', halted)
+        self.halted_elapsed, self.halted_progress = column('d', halted), column('d', halted)
+        self.timeline_machine, self.timeline_first = column('I', timelines), column('I', timelines + 1)
+        self.slot_order, self.slot_row = column('I', slots), column('I', slots)
+        self.slot_start, self.slot_end = column('q', slots), column('q', slots)
+        self.changed = column('I', changed)
+
+    def _column(self, view: memoryview, typecode: str, count: int):
+        size = array(typecode).itemsize
+        end = self._position + count * size
+        if end > len(view):
+            raise ValueError("truncated shared state file")
+        if _SWAP:
+            column = array(typecode, view[self._position:end])
+            column.byteswap()
+        else:
+            column = view[self._position:end].cast(typecode)
+            self._views.append(column)
+        self._position = end + (-end % _ALIGN)
+        return column
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class StateMirror:
+    """
+    A worker's copy of the owner's order book, brought up to each state file
+
+    Args:
+        orders: This process's order book, loaded from the same source as the owner's
+    """
+
+    def __init__(self, orders: Dict[str, Order]):
+        self.orders = orders
+        self._book: List[Order] = None  # Orders by position in the file layout
+        self.layout = None
+        self.version = None             # State version last applied
+        self._timelines = {}            # machine_id -> (slot column bytes, slots) of the last snapshot
+
+    def update(self, shared: SharedState) -> List[Order]:
+        """Copy the runtime state of the orders changed since the last update; returns them"""
+        if shared.layout != self.layout:
+            missing = [code for code in shared.codes if code not in self.orders]
+            if missing or len(shared.codes) != len(self.orders):
+                raise ValueError(f"the owner's order book does not match this one "
+                                 f"({len(shared.codes)} orders there, {len(self.orders)} here)")
+            self._book = [self.orders[code] for code in shared.codes]
+            self.layout = shared.layout
+            self._timelines = {}
+            positions = range(len(self._book))
+        elif shared.base == self.version:
+            positions = shared.changed
+        else:
+            versions = shared.order_version
+            positions = [position for position, order in enumerate(self._book) if order.version != versions[position]]
+        halted = {}
+        for index, row in enumerate(shared.halted_row):
+            halted[row] = (shared.machines[shared.halted_machine[index]], shared.halted_elapsed[index],
+                           shared.halted_progress[index])
+        changed = [self._apply(shared, position, halted) for position in positions]
+        self.version = shared.version
+        metrics.inc('orders_shared_orders_applied_total', len(changed))
+        return changed
+
+    def _apply(self, shared: SharedState, position: int, halted: dict) -> Order:
+        order = self._book[position]
+        first, stop = shared.first[position], shared.first[position + 1]
+        if stop - first != len(order.operations):
+            raise ValueError(f"order {order.order_code} has {len(order.operations)} operations here, "
+                             f"{stop - first} in the owner's order book")
+        machines = shared.machines
+        order.status = STATUSES[shared.order_status[position]]
+        order.is_forced = bool(shared.order_forced[position])
+        order.start_time = _moment(shared.order_start[position])
+        order.completion_time = _moment(shared.order_completion[position])
+        order.force_time = _moment(shared.order_force[position])
+        order.halted_operations = {}
+        for row, operation in enumerate(order.operations, first):
+            machine = shared.op_machine[row]
+            operation.status = STATUSES[shared.op_status[row]]
+            operation.assigned_machine = machines[machine] if machine >= 0 else None
+            operation.start_time = _moment(shared.op_start[row])
+            operation.completion_time = _moment(shared.op_completion[row])
+            operation.completed_quantity = shared.op_quantity[row]
+            if row in halted:
+                machine_id, elapsed, progress = halted[row]
+                order.halted_operations[operation.operation_id] = {
+                    'progress': progress, 'elapsed_time': elapsed, 'machine': machine_id}
+        order.version = shared.order_version[position]
+        return order
+
+    def snapshot(self, shared: SharedState) -> ScheduleSnapshot:
+        """
+        The state file's schedule over this order book
+
+        A timeline whose slot columns are the same as in the previous snapshot
+        is the same tuple, so only the machines whose schedule moved are rebuilt.
+        """
+        book, first = self._book, None
+        timelines, previous, self._timelines = {}, self._timelines, {}
+        for index, machine in enumerate(shared.timeline_machine):
+            machine_id = shared.machines[machine]
+            begin, end = shared.timeline_first[index], shared.timeline_first[index + 1]
+            columns = (shared.slot_order[begin:end], shared.slot_row[begin:end],
+                       shared.slot_start[begin:end], shared.slot_end[begin:end])
+            key = b''.join(bytes(column) for column in columns)
+            cached = previous.get(machine_id)
+            if cached is not None and cached[0] == key:
+                slots = cached[1]
+            else:
+                if first is None:
+                    first = shared.first.tolist()
+                slots = []
+                for position, row, start, stop in zip(*(column.tolist() for column in columns)):
+                    order = book[position]
+                    slots.append((order, order.operations[row - first[position]],
+                                  timedelta(microseconds=start), timedelta(microseconds=stop)))
+                slots = tuple(slots)
+            timelines[machine_id] = slots
+            self._timelines[machine_id] = (key, slots)
+        return ScheduleSnapshot(shared.version, shared.etag, timelines)
+
+
+class OwnerServer:
+    """
+    Runs the tasks workers forward on the owner's state writer
+
+    A worker sends (task name, args) and gets back ('ok', result) or
+    ('error', exception); 'refresh' has the writer publish a fresh state and
+    'stream' turns the connection into a feed of the owner's event stream.
+    Only the named tasks can be run; readers only read published states, so
+    they run on the connection's thread and never queue behind the writer.
+
+    Args:
+        writer: The owner's StateWriter
+        tasks: Task name -> callable run on the writer
+        address: Unix socket path or (host, port) to listen on
+        authkey: Shared secret workers authenticate with
+        stream: Callable returning the event stream generator for a Last-Event-ID
+        readers: Task name -> callable run on the connection's thread
+    """
+
+    def __init__(self, writer, tasks: Dict[str, Callable], address, authkey: bytes, stream: Callable = None,
+                 readers: Dict[str, Callable] = None):
+        self.writer = writer
+        self.tasks = tasks
+        self.readers = readers or {}
+        self.address = address
+        self.authkey = authkey
+        self.stream = stream
+
+    def serve_forever(self) -> None:
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # Left behind by an owner that did not exit cleanly
+        with Listener(self.address, authkey=self.authkey) as listener:
+            if isinstance(self.address, str):
+                os.chmod(self.address, 0o600)
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError) as e:
+                    print(f"Refused a worker connection: {e}")
+                    continue
+                threading.Thread(target=self._serve, args=(connection,), name='owner-connection', daemon=True).start()
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread"""
+        thread = threading.Thread(target=self.serve_forever, name='owner-server', daemon=True)
+        thread.start()
+        return thread
+
+    def _serve(self, connection) -> None:
+        with connection:
+            while True:
+                try:
+                    name, args = connection.recv()
+                except (OSError, EOFError):
+                    return
+                if name == 'stream' and self.stream is not None:
+                    self._stream(connection, *args)
+                    return
+                try:
+                    if name == 'refresh':
+                        reply = ('ok', self.writer.refresh().result())
+                    elif name in self.tasks:
+                        reply = ('ok', self.writer.call(self.tasks[name], *args))
+                    elif name in self.readers:
+                        reply = ('ok', self.readers[name](*args))
+                    else:
+                        reply = ('error', LookupError(f"the owner runs no task named {name!r}"))
+                except Exception as e:
+                    reply = ('error', e)
+                try:
+                    connection.send(reply)
+                except (OSError, EOFError):
+                    return
+                except Exception as e:
+                    # The result or the exception did not pickle
+                    connection.send(('error', RuntimeError(f"{name} failed on the owner: {e!r}")))
+
+    def _stream(self, connection, event_id: str) -> None:
+        chunks = self.stream(event_id)
+        try:
+            for chunk in chunks:
+                connection.send(chunk)
+        except (OSError, EOFError):
+            pass
+        finally:
+            chunks.close()
+
+
+class RemoteWriter:
+    """
+    Worker-side stand-in for StateWriter over the owner's state file
+
+    Reads follow the state file, mapping it again whenever the owner has
+    renamed a new one over it; tasks are forwarded to the owner, which answers
+    once the state including them is in the file, so a request still sees its
+    own change on the next read.
+
+    Args:
+        path: State file the owner writes
+        address: Where the owner's OwnerServer listens
+        authkey: Secret shared with the owner
+        mirror: Callable building the PublishedState to serve from a SharedState
+        max_lag: How far a reader's time may be past the state's next event
+            before read() has the owner publish a fresher one
+    """
+
+    def __init__(self, path: str, address, authkey: bytes, mirror: Callable,
+                 max_lag: timedelta = timedelta(seconds=1)):
+        self.path = path
+        self.address = address
+        self.authkey = authkey
+        self._mirror = mirror
+        self.max_lag = max_lag
+        self.state: PublishedState = None
+        self.published = 0   # States built from the file so far
+        self._sequence = SequenceFile(path + '.seq')
+        self._seen = None    # Sequence count the state was built at
+        self._lock = threading.Lock()
+        self._connections = SimpleQueue()
+
+    def submit(self, task: Callable, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(self.call(task, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def call(self, task: Callable, *args):
+        """Run a task on the owner and return its result, raising what it raised"""
+        outcome, value = self._request(task.__name__, args)
+        if outcome == 'error':
+            raise value
+        return value
+
+    def refresh(self) -> Future:
+        """Have the owner bring the order book up to date and publish it"""
+        future = Future()
+        try:
+            self._request('refresh', ())
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def read(self, current_time: datetime = None) -> PublishedState:
+        """State of the owner's last publish, refreshed first if it is stale at current_time"""
+        if current_time is None:
+            current_time = clock.now()
+        state = self._follow()
+        if state is None or state.stale(current_time, self.max_lag):
+            self.refresh().result()
+            state = self._follow()
+        return state
+
+    def stream(self, event_id: str = None):
+        """The owner's event stream for a Last-Event-ID, relayed over a connection of its own"""
+        connection = Client(self.address, authkey=self.authkey)
+        try:
+            connection.send(('stream', (event_id,)))
+            while True:
+                yield connection.recv()
+        except EOFError:
+            return
+        finally:
+            connection.close()
+
+    def _follow(self) -> PublishedState:
+        sequence = self._sequence.read()
+        if sequence is None or sequence == self._seen:
+            return self.state
+        with self._lock:
+            if sequence != self._seen:
+                with metrics.span('shared_state_follow'), SharedState(self.path) as shared:
+                    state = self.state
+                    if state is None or shared.etag != state.etag:
+                        self.state = self._mirror(shared)
+                        self.published += 1
+                    else:
+                        # Republished at a later time with the same schedule version, so the same orders
+                        self.state = PublishedState(shared.time, state.orders, state.index, state.schedule,
+                                                    state.machine_ids, shared.event_id)
+                        self.state.next_event = shared.next_event
+                self._seen = sequence
+        return self.state
+
+    def _request(self, name: str, args: tuple):
+        try:
+            connection = self._connections.get_nowait()
+        except Empty:
+            connection = Client(self.address, authkey=self.authkey)
+        try:
+            connection.send((name, args))
+            reply = connection.recv()
+        except (OSError, EOFError) as e:
+            connection.close()
+            raise ConnectionError(f"lost the connection to the state owner at {self.address}: {e}") from e
+        self._connections.put(connection)
+        return reply
@@ -0,0 +1,216 @@
+"""
+Discrete-event simulation of the shop floor in virtual time.
+
+The order book is driven forward by events instead of by the wall clock: an
+operation completing frees its machine and releases the next operation of its
+order, and every start schedules the matching completion in a heap. Time jumps
+straight from one event to the next on a ManualClock installed for the run, so
+the Order methods stamp virtual times and days of production take as long as
+the events they contain.
+
+Dispatching is greedy. An operation that becomes ready starts on the idle
+capable machine with the shortest processing time; otherwise it waits in the
+queue of each capable machine, and a machine that frees up takes its
+highest-priority waiting operation. Priority follows the scheduler: forced
+orders first, then halted operations, then creation time and sequence number.
+Forcing does not pre-empt running operations here; halted operations resume on
+the machine they were halted on.
+
+Usage:
+    python simulation.py [orders.csv] [days]
+"""
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
+from typing import Dict
+
+import clock
+from OrderManagment import Order, Operation, OperationStatus
+
+
+class SimulationResult:
+    """What a run did, in virtual and in wall-clock time"""
+
+    def __init__(self, start: datetime, end: datetime):
+        self.start = start
+        self.end = end
+        self.events = 0
+        self.operations_started = 0
+        self.operations_completed = 0
+        self.orders_completed = 0
+        self.wall_seconds = 0.0
+
+    @property
+    def virtual_time(self) -> timedelta:
+        return self.end - self.start
+
+    def __str__(self) -> str:
+        return (f"Simulated {self.virtual_time} in {self.wall_seconds:.2f}s: {self.events} events, "
+                f"{self.operations_started} operations started, {self.operations_completed} completed, "
+                f"{self.orders_completed} orders completed")
+
+
+class Simulation:
+    """
+    Event-driven simulation over an order book
+
+    The orders are changed in place through their own methods, so listeners such
+    as the scheduler or the state store follow along; simulate a copy to leave
+    the live book alone.
+
+    Args:
+        orders: Dictionary of order_code to Order
+        start: Virtual time the simulation starts at, defaults to now
+    """
+
+    def __init__(self, orders: Dict[str, Order], start: datetime = None):
+        self.orders = orders
+        self.clock = clock.ManualClock(start if start is not None else clock.now())
+        self.busy_seconds: Dict[str, float] = defaultdict(float)  # machine_id -> seconds spent working
+        self._events = []                        # (end time, tiebreak, machine_id, order, operation, start time)
+        self._tiebreak = count()
+        self._running: Dict[str, int] = defaultdict(int)   # machine_id -> operations running on it
+        self._waiting: Dict[str, list] = defaultdict(list)  # machine_id -> heap of (priority, tiebreak, order, operation)
+        self._queued = set()                    # id() of operations waiting for a machine
+        self._next: Dict[str, int] = {}         # order_code -> position of its next operation to release
+        self._rank = {code: rank for rank, code in enumerate(orders)}
+        self._origin = self.clock.now()
+        self._seeded = False
+
+    def run(self, until: datetime = None, duration: timedelta = None) -> SimulationResult:
+        """
+        Process events up to a virtual time, or until nothing is left to do
+
+        Args:
+            until: Virtual time to stop at
+            duration: Alternatively, how far past the current virtual time to run
+        """
+        if until is None and duration is not None:
+            until = self.clock.now() + duration
+        result = SimulationResult(self.clock.now(), self.clock.now())
+        started = time.perf_counter()
+        with clock.using(self.clock):
+            if not self._seeded:
+                self._seed(result)
+            while self._events and (until is None or self._events[0][0] <= until):
+                end, _, machine_id, order, operation, start = heappop(self._events)
+                self.clock.set(end)
+                result.events += 1
+                self._running[machine_id] -= 1
+                self.busy_seconds[machine_id] += (end - start).total_seconds()
+                if operation.status == OperationStatus.IN_PROGRESS:
+                    order.complete_operation(operation.operation_id, order.quantity)
+                    result.operations_completed += 1
+                    if order.status == OperationStatus.COMPLETED:
+                        result.orders_completed += 1
+                self._release(order, result)
+                if not self._running[machine_id]:
+                    self._dispatch(machine_id, result)
+            if until is not None and until > self.clock.now():
+                self.clock.set(until)
+        result.end = self.clock.now()
+        result.wall_seconds = time.perf_counter() - started
+        return result
+
+    def utilization(self) -> Dict[str, float]:
+        """Share of the simulated time each machine spent on completed operations"""
+        span = (self.clock.now() - self._origin).total_seconds()
+        return {machine_id: busy / span if span else 0.0 for machine_id, busy in self.busy_seconds.items()}
+
+    def _seed(self, result: SimulationResult) -> None:
+        """Pick up operations already running, then release the first waiting operation of every order"""
+        self._seeded = True
+        now = self._origin = self.clock.now()
+        for order in self.orders.values():
+            sequence = order.get_operation_sequence()
+            running = False
+            for operation in sequence:
+                if operation.status == OperationStatus.IN_PROGRESS and operation.assigned_machine:
+                    end = operation.completion_time or (
+                        operation.start_time + timedelta(seconds=operation.processing_times.get(operation.assigned_machine, 0.0)))
+                    self._running[operation.assigned_machine] += 1
+                    heappush(self._events, (max(end, now), next(self._tiebreak), operation.assigned_machine,
+                                            order, operation, max(operation.start_time or now, now)))
+                    running = True
+            self._next[order.order_code] = 0
+            if not running:
+                self._release(order, result)
+
+    def _release(self, order: Order, result: SimulationResult) -> None:
+        """Make the next operation of an order ready once nothing of it is running"""
+        sequence = order.get_operation_sequence()
+        position = self._next[order.order_code]
+        while position < len(sequence) and sequence[position].status == OperationStatus.COMPLETED:
+            position += 1
+        self._next[order.order_code] = position
+        if position == len(sequence):
+            return
+        operation = sequence[position]
+        if operation.status != OperationStatus.PENDING or id(operation) in self._queued:
+            return
+
+        machines = self._machines_for(order, operation)
+        idle = [machine_id for machine_id in machines if not self._running[machine_id]]
+        if idle:
+            self._start(min(idle, key=lambda m: self._duration(order, operation, m)), order, operation, result)
+            return
+        self._queued.add(id(operation))
+        priority = (-order.is_forced, -int(order.is_operation_halted(operation.operation_id)),
+                    order.created_at, operation.sequence_number, self._rank.get(order.order_code, 0))
+        entry = (priority, next(self._tiebreak), order, operation)
+        for machine_id in machines:
+            heappush(self._waiting[machine_id], entry)
+
+    def _dispatch(self, machine_id: str, result: SimulationResult) -> None:
+        """Start the highest-priority operation waiting for an idle machine"""
+        waiting = self._waiting[machine_id]
+        while waiting:
+            _, _, order, operation = heappop(waiting)
+            if id(operation) not in self._queued:
+                continue  # Already started on another machine
+            self._queued.discard(id(operation))
+            self._start(machine_id, order, operation, result)
+            return
+
+    def _start(self, machine_id: str, order: Order, operation: Operation, result: SimulationResult) -> None:
+        now = self.clock.now()
+        if order.is_operation_halted(operation.operation_id):
+            order.resume_operation(operation.operation_id)
+            end = operation.completion_time
+        else:
+            order.start_operation(operation.operation_id, machine_id)
+            end = now + timedelta(seconds=self._duration(order, operation, machine_id))
+            operation.completion_time = end
+        self._running[machine_id] += 1
+        result.operations_started += 1
+        heappush(self._events, (end, next(self._tiebreak), machine_id, order, operation, now))
+
+    @staticmethod
+    def _machines_for(order: Order, operation: Operation):
+        if order.is_operation_halted(operation.operation_id):
+            return [order.halted_operations[operation.operation_id]['machine']]
+        return operation.capable_machines
+
+    @staticmethod
+    def _duration(order: Order, operation: Operation, machine_id: str) -> float:
+        if order.is_operation_halted(operation.operation_id):
+            halted = order.halted_operations[operation.operation_id]
+            return max(0.0, operation.processing_times.get(halted['machine'], 0.0) - halted['elapsed_time'])
+        return operation.processing_times.get(machine_id, 0.0)
+
+
+if __name__ == '__main__':
+    from csv_loader import load_orders
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'orders_data.csv'
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 7
+    orders, report = load_orders(path)
+    print(report)
+    simulation = Simulation(orders)
+    print(simulation.run(duration=timedelta(days=days)))
+    utilization = simulation.utilization()
+    if utilization:
+        print(f"Mean machine utilization {sum(utilization.values()) / len(utilization):.1%}")
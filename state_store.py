@@ -0,0 +1,302 @@
+"""
+Durable order state.
+
+The order book itself comes from the CSV (or its binary snapshot); what a
+restart loses is the runtime state layered on top of it: started, completed,
+forced and halted operations. A state store follows the orders' change
+notifications and keeps that state somewhere that survives the process.
+
+OrderStateStore keeps nothing and is what the app runs with when persistence is
+off. SQLiteStateStore writes behind: changed orders are only marked while a
+request runs, their rows are captured in one go when it ends, and a writer
+thread commits everything captured since its last pass in a single WAL
+transaction.
+"""
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from OrderManagment import Order, OperationStatus
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_code TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    start_time TEXT,
+    completion_time TEXT,
+    is_forced INTEGER NOT NULL,
+    force_time TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS operations (
+    order_code TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    operation_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    assigned_machine TEXT,
+    start_time TEXT,
+    completion_time TEXT,
+    completed_quantity INTEGER NOT NULL,
+    halted_machine TEXT,
+    halted_elapsed REAL,
+    halted_progress REAL,
+    PRIMARY KEY (order_code, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS orders_by_status ON orders (status);
+CREATE INDEX IF NOT EXISTS operations_by_status ON operations (status);
+CREATE INDEX IF NOT EXISTS operations_by_machine ON operations (assigned_machine, status)
+    WHERE assigned_machine IS NOT NULL;
+"""
+
+_STATUS = {status.value: status for status in OperationStatus}
+
+
+def _timestamp(value: datetime):
+    return value.isoformat() if value is not None else None
+
+
+def _datetime(value: str):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def order_rows(order: Order):
+    """
+    Capture the runtime state of an order as table rows
+
+    Operations that are still untouched (pending, nothing completed, not halted)
+    have no row; their state is what loading the order book gives anyway. The
+    creation time is not stored either: it only ranks orders in load order, and
+    reloading the book reproduces that order.
+
+    Returns:
+        (order row, list of operation rows)
+    """
+    order_row = (order.order_code, order.status.value, _timestamp(order.start_time), _timestamp(order.completion_time),
+                 int(order.is_forced), _timestamp(order.force_time))
+    operation_rows = []
+    for position, operation in enumerate(order.operations):
+        halted = order.halted_operations.get(operation.operation_id)
+        if operation.status == OperationStatus.PENDING and halted is None and not operation.completed_quantity:
+            continue
+        operation_rows.append((
+            order.order_code, position, operation.operation_id, operation.status.value,
+            operation.assigned_machine, _timestamp(operation.start_time),
+            _timestamp(operation.completion_time), operation.completed_quantity,
+            halted['machine'] if halted else None,
+            halted['elapsed_time'] if halted else None,
+            halted['progress'] if halted else None,
+        ))
+    return order_row, operation_rows
+
+
+class OrderStateStore:
+    """
+    State store that keeps nothing
+
+    Subclasses persist the state of tracked orders. The app calls track() for
+    every loaded order, mark() for changes made without the Order methods,
+    capture() at the end of each request and restore() after loading.
+    """
+
+    def track(self, order: Order) -> None:
+        """Follow an order's changes"""
+
+    def mark(self, order: Order) -> None:
+        """Record that an order changed without going through the Order methods"""
+
+    def capture(self) -> None:
+        """Hand the state of every order changed since the last capture to the writer"""
+
+    def flush(self) -> None:
+        """Capture and wait until everything captured is durable"""
+
+    def restore(self, orders: Dict[str, Order]) -> int:
+        """
+        Apply the stored state to a freshly loaded order book
+
+        Returns:
+            Number of orders that had stored state
+        """
+        return 0
+
+    def clear(self) -> None:
+        """Forget all stored state"""
+
+    def close(self) -> None:
+        """Flush and release the store"""
+
+
+class SQLiteStateStore(OrderStateStore):
+    """
+    State store backed by an SQLite database in WAL mode
+
+    Args:
+        path: Database file, created if it does not exist
+        flush_interval: Seconds the writer waits to gather more changes into one transaction
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.2):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.transactions = 0       # Committed write transactions
+        self.rows_written = 0       # Order rows written by them
+        self._dirty: Dict[str, Order] = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+
+        # Schema and pragmas first, so the reader never sees a missing table
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._reader = self._connect(check_same_thread=False)
+        self._reader_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name='order-state-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, **kwargs)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def track(self, order: Order) -> None:
+        order.add_listener(self._on_order_event)
+
+    def mark(self, order: Order) -> None:
+        with self._lock:
+            self._dirty[order.order_code] = order
+
+    def capture(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+        self._queue.put([order_rows(order) for order in dirty.values()])
+
+    def flush(self) -> None:
+        self.capture()
+        self._queue.join()
+
+    def restore(self, orders: Dict[str, Order]) -> int:
+        self.flush()
+        with self._reader_lock:
+            order_state = self._reader.execute('SELECT * FROM orders').fetchall()
+            operation_state = self._reader.execute('SELECT * FROM operations').fetchall()
+
+        restored = 0
+        for code, status, start_time, completion_time, is_forced, force_time in order_state:
+            order = orders.get(code)
+            if order is None:
+                continue
+            order.status = _STATUS[status]
+            order.start_time = _datetime(start_time)
+            order.completion_time = _datetime(completion_time)
+            order.is_forced = bool(is_forced)
+            order.force_time = _datetime(force_time)
+            restored += 1
+
+        for (code, position, operation_id, status, machine, start_time, completion_time, completed_quantity,
+             halted_machine, halted_elapsed, halted_progress) in operation_state:
+            order = orders.get(code)
+            if order is None or position >= len(order.operations):
+                continue
+            operation = order.operations[position]
+            if operation.operation_id != operation_id:
+                # The order book changed under the stored state; leave this operation as loaded
+                continue
+            operation.status = _STATUS[status]
+            operation.assigned_machine = machine
+            operation.start_time = _datetime(start_time)
+            operation.completion_time = _datetime(completion_time)
+            operation.completed_quantity = completed_quantity
+            if halted_machine is not None:
+                order.halted_operations[operation_id] = {
+                    'progress': halted_progress,
+                    'elapsed_time': halted_elapsed,
+                    'machine': halted_machine
+                }
+        return restored
+
+    def clear(self) -> None:
+        with self._lock:
+            self._dirty = {}
+        self._queue.join()
+        with self._reader_lock:
+            with self._reader:
+                self._reader.execute('DELETE FROM operations')
+                self._reader.execute('DELETE FROM orders')
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+    def order_codes_with_status(self, status: OperationStatus) -> List[str]:
+        """Codes of the stored orders with a status, through the status index"""
+        with self._reader_lock:
+            rows = self._reader.execute('SELECT order_code FROM orders WHERE status = ?', (status.value,))
+            return [code for code, in rows]
+
+    def running_on(self, machine_id: str) -> List[Tuple[str, str]]:
+        """(order_code, operation_id) of the stored in-progress operations on a machine, through the machine index"""
+        with self._reader_lock:
+            rows = self._reader.execute(
+                'SELECT order_code, operation_id FROM operations WHERE assigned_machine = ? AND status = ?',
+                (machine_id, OperationStatus.IN_PROGRESS.value))
+            return rows.fetchall()
+
+    def _on_order_event(self, order: Order, event: str, operation) -> None:
+        self.mark(order)
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    self._queue.task_done()
+                    return
+                batches = [batch]
+                # Give closely spaced captures the chance to share the transaction
+                try:
+                    while True:
+                        batch = self._queue.get(timeout=self.flush_interval) if len(batches) == 1 \
+                            else self._queue.get_nowait()
+                        if batch is None:
+                            self._queue.put(None)
+                            self._queue.task_done()
+                            break
+                        batches.append(batch)
+                except queue.Empty:
+                    pass
+                try:
+                    self._write(connection, batches)
+                except sqlite3.Error as e:
+                    print(f"Error writing order state: {e}")
+                finally:
+                    for _ in batches:
+                        self._queue.task_done()
+        finally:
+            connection.close()
+
+    def _write(self, connection: sqlite3.Connection, batches) -> None:
+        # Later captures of an order supersede earlier ones
+        latest = {}
+        for batch in batches:
+            for order_row, operation_rows in batch:
+                latest[order_row[0]] = (order_row, operation_rows)
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?)',
+                                   [order_row for order_row, _ in latest.values()])
+            connection.executemany('DELETE FROM operations WHERE order_code = ?', [(code,) for code in latest])
+            connection.executemany('INSERT INTO operations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   [row for _, operation_rows in latest.values() for row in operation_rows])
+        self.transactions += 1
+        self.rows_written += len(latest)
@@ -0,0 +1,266 @@
+"""
+Single writer for the order book, with readers on published snapshots.
+
+GET handlers used to advance the scheduler themselves, so any page view could
+start, complete or halt operations while another request was rendering the
+very same Order objects. Now one writer thread makes every state transition:
+changes are queued to it as tasks, it runs a batch of them, brings the order
+book up to date and publishes an immutable PublishedState with a single
+reference assignment. Readers take whatever state is published, RCU-style: they
+never lock, never see a half-applied transition, and a state stays valid for as
+long as a reader holds on to it.
+
+A published state holds copies of the orders, not the live objects. Only the
+orders changed since the previous state are copied again; the others are shared
+with it, so publishing costs a dictionary copy plus O(changed orders).
+"""
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from queue import Empty, SimpleQueue
+from typing import Callable, Dict, Tuple
+
+import clock
+import metrics
+from OrderManagment import Order
+from order_index import OrderIndex
+from scheduler import ScheduleSnapshot
+
+metrics.registry.describe('orders_writer_batches_total', 'counter', 'Task batches run by the state writer')
+metrics.registry.describe('orders_writer_tasks_total', 'counter', 'Tasks run by the state writer')
+metrics.registry.describe('orders_orders_copied_total', 'counter', 'Orders copied into published states')
+
+
+class PublishedState:
+    """
+    The order book at one state version, as readers see it
+
+    Nothing in it changes after it is published: the orders are copies, the
+    index and the schedule snapshot are built over those copies.
+    """
+    __slots__ = ('version', 'etag', 'time', 'orders', 'index', 'schedule', 'machine_ids', 'event_id',
+                 'changed', 'next_event')
+
+    def __init__(self, time: datetime, orders: Dict[str, Order], index: OrderIndex,
+                 schedule: ScheduleSnapshot, machine_ids: Tuple[str, ...], event_id: str,
+                 changed: frozenset = frozenset()):
+        self.version = schedule.version
+        self.etag = schedule.etag
+        self.time = time                # Time the order book was brought up to
+        self.orders = orders            # order_code -> copy of the Order
+        self.index = index              # OrderIndex over the copies
+        self.schedule = schedule        # ScheduleSnapshot over the copies
+        self.machine_ids = machine_ids  # Machines of the order book, in registry order
+        self.event_id = event_id        # Last stream event applied, for clients to resume from
+        self.changed = changed          # Codes of the orders copied anew for this state, None for all of them
+        self.next_event = None          # When time alone changes the state next, if known; set before publishing
+
+    def stale(self, current_time: datetime, max_lag: timedelta) -> bool:
+        """
+        Whether a reader at current_time should wait for a fresher state: once
+        its next event, or its own time if that is unknown, is more than
+        max_lag behind
+        """
+        return current_time - (self.next_event or self.time) > max_lag
+
+
+class OrderBookPublisher:
+    """
+    Builds the PublishedStates of one order book
+
+    Follows the orders through their listeners to know which ones to copy
+    again; changes made without the Order methods have to be marked.
+
+    Args:
+        orders: Dictionary of order_code to Order
+    """
+
+    def __init__(self, orders: Dict[str, Order]):
+        self.orders = orders
+        self._changed = set(orders)   # Codes of the orders to copy on the next publish
+        self._copies: Dict[str, Order] = {}
+        self._index = None            # OrderIndex copy over _copies
+        self._schedule = None         # ScheduleSnapshot over _copies
+        self._timelines = {}          # machine_id -> (live slots, copied slots, order codes in them)
+        for order in orders.values():
+            order.add_listener(self._on_order_event)
+
+    def mark(self, order: Order) -> None:
+        """Copy an order changed without going through the Order methods on the next publish"""
+        self._changed.add(order.order_code)
+
+    def changed(self) -> frozenset:
+        """Codes of the orders changed since the last publish"""
+        return frozenset(self._changed)
+
+    def publish(self, current_time: datetime, index: OrderIndex, schedule: ScheduleSnapshot,
+                machine_ids, event_id: str) -> PublishedState:
+        """
+        Build the state to publish from the live index and schedule snapshot
+
+        Args:
+            current_time: Time the order book has been brought up to
+            index: Live OrderIndex of the order book
+            schedule: Live scheduler's snapshot of the current version
+            machine_ids: Machines of the order book
+            event_id: Last stream event id
+        """
+        changed, self._changed = self._changed, set()
+        fresh = self._index is None
+        if changed or fresh:
+            copies = dict(self._copies)
+            for code in changed:
+                order = self.orders.get(code)
+                if order is not None:
+                    copies[code] = order.copy()
+            metrics.inc('orders_orders_copied_total', len(changed))
+            self._copies = copies
+            self._index = index.copy(copies)
+        if changed or self._schedule is None or self._schedule.version != schedule.version:
+            self._schedule = self._copy_schedule(schedule, changed)
+        return PublishedState(current_time, self._copies, self._index, self._schedule,
+                              tuple(machine_ids), event_id, None if fresh else frozenset(changed))
+
+    def _copy_schedule(self, schedule: ScheduleSnapshot, changed) -> ScheduleSnapshot:
+        """
+        The same snapshot with the slots pointing at the order and operation copies
+
+        A timeline that is the same tuple as last time, with none of its orders
+        among the changed ones, keeps its copied slots.
+        """
+        copies = self._copies
+        timelines, previous, self._timelines = {}, self._timelines, {}
+        for machine_id, slots in schedule.timelines.items():
+            cached = previous.get(machine_id)
+            if cached is not None and cached[0] is slots and changed.isdisjoint(cached[2]):
+                copied, codes = cached[1], cached[2]
+            else:
+                copied = []
+                for order, operation, start, end in slots:
+                    copy = copies[order.order_code]
+                    copied.append((copy, copy.get_operation_details(operation.operation_id), start, end))
+                copied, codes = tuple(copied), frozenset(order.order_code for order, _, _, _ in slots)
+            timelines[machine_id] = copied
+            self._timelines[machine_id] = (slots, copied, codes)
+        return ScheduleSnapshot(schedule.version, schedule.etag, timelines)
+
+    def _on_order_event(self, order: Order, event: str, operation) -> None:
+        self._changed.add(order.order_code)
+
+
+class StateWriter:
+    """
+    Thread making every change to the order book, one batch of tasks at a time
+
+    The thread starts with the first task. After each batch it calls publish,
+    which brings the order book up to date and returns the state readers get
+    next; the batch's tasks complete only once that state is published, so a
+    request sees its own change on the next read. A batch runs with the time
+    pinned to when it started, like a request.
+
+    Args:
+        publish: Callable returning the PublishedState to publish
+        max_lag: How far a reader's time may be past the published state's next
+            event before read() waits for a fresher one
+    """
+
+    def __init__(self, publish: Callable, max_lag: timedelta = timedelta(seconds=1)):
+        self._publish = publish
+        self.max_lag = max_lag
+        self.state: PublishedState = None
+        self.published = 0    # States published so far
+        self._tasks = SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._refresh = None  # Future of the queued refresh, shared by every reader waiting for one
+        self._listeners = []
+
+    def add_listener(self, callback: Callable) -> None:
+        """Call callback(state) on the writer thread after every publish; it must return quickly"""
+        self._listeners.append(callback)
+
+    def submit(self, task: Callable, *args) -> Future:
+        """Queue a task for the writer; the future resolves once the state including it is published"""
+        future = Future()
+        self._put(task, args, future)
+        return future
+
+    def call(self, task: Callable, *args):
+        """Run a task on the writer and return its result, raising what it raised"""
+        if threading.current_thread() is self._thread:
+            return task(*args)
+        return self.submit(task, *args).result()
+
+    def refresh(self) -> Future:
+        """Have the writer bring the order book up to date and publish it; concurrent callers share one run"""
+        with self._lock:
+            future = self._refresh
+            queued = future is not None
+            if not queued:
+                future = self._refresh = Future()
+        if not queued:
+            self._put(None, (), future)
+        return future
+
+    def read(self, current_time: datetime = None) -> PublishedState:
+        """Published state, refreshed first if it is stale at current_time (default now), see PublishedState.stale()"""
+        if current_time is None:
+            current_time = clock.now()
+        state = self.state
+        if state is None or state.stale(current_time, self.max_lag):
+            if threading.current_thread() is self._thread:
+                raise RuntimeError("the state writer cannot wait for its own publish")
+            self.refresh().result()
+            state = self.state
+        return state
+
+    def _put(self, task, args, future: Future) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='state-writer', daemon=True)
+                self._thread.start()
+        self._tasks.put((task, args, future))
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._tasks.get()]
+            while True:
+                try:
+                    batch.append(self._tasks.get_nowait())
+                except Empty:
+                    break
+            with self._lock:
+                # Readers arriving from now on need a state newer than this batch may publish
+                if any(future is self._refresh for _, _, future in batch):
+                    self._refresh = None
+            self._run_batch(batch)
+
+    def _run_batch(self, batch) -> None:
+        results, state = [], None
+        with metrics.span('writer_batch'), clock.frozen():
+            for task, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if task is None:
+                    results.append((future, None, None))
+                    continue
+                try:
+                    results.append((future, task(*args), None))
+                except BaseException as e:
+                    results.append((future, None, e))
+            try:
+                state = self.state = self._publish()
+                self.published += 1
+            except BaseException as e:
+                # Nothing was published, so no task may report success
+                results = [(future, None, error or e) for future, _, error in results]
+        metrics.inc('orders_writer_batches_total')
+        metrics.inc('orders_writer_tasks_total', len(results))
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        if state is not None:
+            for listener in self._listeners:
+                listener(state)
@@ -0,0 +1,62 @@
+// Live machine and order state transitions from /api/stream.
+// Machine cards flip between busy and idle in place; any other change shows a
+// banner offering a refresh, since the page itself is rendered on the server.
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+
+    const script = document.currentScript;
+    const lastEventId = script ? script.dataset.lastEventId : '';
+    const url = '/api/stream' + (lastEventId ? '?last_event_id=' + encodeURIComponent(lastEventId) : '');
+    const source = new EventSource(url);
+    let pendingChanges = 0;
+
+    function showBanner(text) {
+        let banner = document.getElementById('stream-banner');
+        if (!banner) {
+            banner = document.createElement('a');
+            banner.id = 'stream-banner';
+            banner.href = window.location.pathname;
+            banner.style.cssText = 'position:fixed;bottom:20px;right:20px;z-index:1050;padding:10px 15px;' +
+                'border-radius:8px;background:#007bff;color:#fff;text-decoration:none;' +
+                'box-shadow:0 2px 6px rgba(0,0,0,0.2);';
+            document.body.appendChild(banner);
+        }
+        banner.textContent = text;
+    }
+
+    function setMachineState(machineId, busy) {
+        document.querySelectorAll('.machine-card[data-machine-id="' + machineId + '"]').forEach(card => {
+            card.classList.toggle('busy', busy);
+            card.classList.toggle('idle', !busy);
+            const badge = card.querySelector('.badge');
+            if (badge) {
+                badge.textContent = busy ? 'BUSY' : 'IDLE';
+                badge.classList.toggle('bg-warning', busy);
+                badge.classList.toggle('bg-success', !busy);
+            }
+        });
+    }
+
+    function countChange() {
+        pendingChanges += 1;
+        showBanner(pendingChanges + (pendingChanges === 1 ? ' change' : ' changes') + ' since this page loaded - refresh');
+    }
+
+    source.addEventListener('machine_busy', event => {
+        setMachineState(JSON.parse(event.data).machine_id, true);
+        countChange();
+    });
+    source.addEventListener('machine_idle', event => {
+        setMachineState(JSON.parse(event.data).machine_id, false);
+        countChange();
+    });
+    ['operation_started', 'operation_completed', 'operation_halted',
+     'order_forced', 'order_unforced', 'order_started', 'order_completed'].forEach(name => {
+        source.addEventListener(name, countChange);
+    });
+    source.addEventListener('reset', () => {
+        showBanner('Missed some updates - refresh');
+    });
+})();
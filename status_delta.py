@@ -0,0 +1,102 @@
+"""
+Per-machine change tracking behind /api/machine_status?since=<version>.
+
+Each schedule snapshot is reduced to one record per machine holding only what
+changes on a state transition: busy or idle, the order and operation, and the
+start and end of the current slot. A started operation's slot is given in
+absolute times, which stay put; a slot whose operation has not started is given
+by its schedule offsets from the read time, which only change when the
+schedule moves it. Progress and remaining time follow from those and the wall
+clock, so clients derive them instead of having them re-sent. A machine's
+record is compared with the previous one whenever a new snapshot version is
+read, and the version it last changed at is kept, so a delta is a filter over
+machines rather than a diff over history.
+
+The records are updated by the state writer when it publishes a snapshot and
+read by any number of requests, so updates replace the dictionaries instead of
+changing them in place.
+"""
+import threading
+from typing import Dict
+
+
+def machine_record(slot) -> dict:
+    """Transition-only status of a machine whose current slot is slot (None when idle)"""
+    if slot is None:
+        return {'status': 'idle'}
+    order, operation, start, end = slot
+    record = {
+        'status': 'busy',
+        'current_order': order.order_code,
+        'current_operation': operation.name,
+        'operation_id': operation.operation_id,
+    }
+    if operation.start_time:
+        # The operation's own start time stays put between reads
+        record['start_time'] = round(operation.start_time.timestamp(), 3)
+        record['end_time'] = round((operation.start_time + (end - start)).timestamp(), 3)
+    else:
+        # Absolute times would move with every read; the offsets only move with the schedule
+        record['start_offset'] = round(start.total_seconds(), 3)
+        record['end_offset'] = round(end.total_seconds(), 3)
+    return record
+
+
+class MachineStatusDeltas:
+    """
+    Version each machine's status last changed at, for one scheduler epoch
+
+    Versions are the snapshot ETags, "<epoch>-<version>", so a version from a
+    replaced scheduler is recognised as unusable.
+    """
+
+    def __init__(self):
+        self.epoch = None
+        self.baseline = None    # First version of this epoch that was tracked
+        self.version = None     # Latest version tracked
+        self.records: Dict[str, dict] = {}
+        self.changed: Dict[str, int] = {}  # machine_id -> version its record last changed at
+        self._lock = threading.Lock()
+
+    def update(self, snapshot) -> None:
+        """Bring the records up to a snapshot, noting which machines changed"""
+        epoch = snapshot.etag.rsplit('-', 1)[0]
+        with self._lock:
+            if epoch != self.epoch:
+                self.epoch = epoch
+                self.baseline = snapshot.version
+                self.version = None
+                self.records = {}
+                self.changed = {}
+            if self.version == snapshot.version:
+                return
+            records, changed = dict(self.records), dict(self.changed)
+            for machine_id in snapshot.timelines:
+                slots = snapshot.now_slots.get(machine_id)
+                record = machine_record(slots[0] if slots else None)
+                if records.get(machine_id) != record:
+                    records[machine_id] = record
+                    changed[machine_id] = snapshot.version
+            self.records, self.changed = records, changed
+            self.version = snapshot.version
+
+    def since(self, token: str):
+        """
+        Records of the machines that changed after a version
+
+        Args:
+            token: Version a client got from an earlier response
+
+        Returns:
+            Dictionary of machine_id to record, or None if the token is unknown or older
+            than the tracking, in which case the client needs the full payload
+        """
+        epoch, _, version = (token or '').rpartition('-')
+        with self._lock:
+            if epoch != self.epoch or not version.isdigit():
+                return None
+            version = int(version)
+            if version < self.baseline or version > self.version:
+                return None
+            return {machine_id: self.records[machine_id]
+                    for machine_id, changed in self.changed.items() if changed > version}
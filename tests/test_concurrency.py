@@ -0,0 +1,17 @@
+"""
+Single writer and its published states under concurrent readers and writers
+
+A short run of benchmarks/concurrency.py: reader threads fetching pages, writer
+threads forcing and unforcing orders, a clock thread moving virtual time and
+checker threads holding published states. None of them may see an
+inconsistent or changing state; the benchmark itself reports the latencies.
+"""
+from benchmarks import concurrency
+
+
+def test_concurrent_readers_and_writers_see_consistent_states():
+    report = concurrency.main(num_orders=300, seconds=3, readers=4, writers=2, checkers=2)
+    assert report['violations'] == []
+    assert report['states_checked'] > 0
+    assert report['published'] > 1
+    assert report['endpoints']['/force_order']['count'] > 0
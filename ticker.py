@@ -0,0 +1,171 @@
+"""
+Background scheduling loop advancing the order book without requests.
+
+Operations used to complete only as a side effect of a page load, when the
+writer brought the order book up to date for a reader: with no traffic the
+state went stale, under heavy traffic readers kept asking for the same work.
+Time alone changes the order book at known moments only. A running operation
+completes once it shows 99.9% progress, and the operations waiting for its
+machine start in the same advance, so the completion times of the running
+operations are the events to wait for. The one exception is a forced order
+halting others, which has the schedule planned again from the time of the next
+advance; the app gives such a state a near next event of its own.
+
+UpcomingEvents keeps those times in a heap as states are published and
+gives each state its next event. Ticker sleeps until that event, or at most
+one interval, and has the writer publish then, so request handlers only read:
+a state is not stale until its next event has passed, see
+PublishedState.stale().
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import clock
+import metrics
+from state_writer import PublishedState
+
+metrics.registry.describe('orders_ticks_total', 'counter', 'Background scheduler ticks run')
+metrics.registry.describe('orders_tick_lag_seconds', 'histogram',
+                          'How long after its state\'s next event a background tick published')
+metrics.registry.describe('orders_tick_next_event_seconds', 'gauge', 'Seconds until the next background tick')
+
+
+class UpcomingEvents:
+    """
+    Heap of the times the operations of published states change by themselves
+
+    Entries are (time, order code, operation ID). They are only added, for the
+    orders each new state copied, and checked against the state when they
+    reach the top of the heap, so an operation that changed in the meantime
+    costs one stale entry rather than a search.
+
+    Args:
+        due: Callable(operation) returning when time alone changes the
+            operation, or None if it does not
+    """
+
+    def __init__(self, due: Callable):
+        self.due = due
+        self._heap = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def update(self, state: PublishedState) -> Optional[datetime]:
+        """Take in a newly built state, which has to follow the last one updated with; returns its next event"""
+        heap = self._heap
+        rebuild = state.changed is None or len(heap) > 2 * len(state.orders) + 1024
+        entries = []
+        for code in state.orders if rebuild else state.changed:
+            order = state.orders.get(code)
+            if order is None:
+                continue
+            for operation in order.operations:
+                due = self.due(operation)
+                if due is not None:
+                    entries.append((due, code, operation.operation_id))
+        if rebuild:
+            # A new order book, or one stale entry too many: start over from every order
+            heap[:] = entries
+            heapq.heapify(heap)
+        else:
+            for entry in entries:
+                heapq.heappush(heap, entry)
+        while heap:
+            due, code, operation_id = heap[0]
+            order = state.orders.get(code)
+            operation = order.get_operation_details(operation_id) if order is not None else None
+            # An event the state's own time has reached was applied when it was built
+            if due > state.time and operation is not None and self.due(operation) == due:
+                return due
+            heapq.heappop(heap)
+        return None
+
+
+class Ticker:
+    """
+    Thread having a writer publish whenever its state's next event is due
+
+    It sleeps until the next event of the published state, or one interval if
+    the state has none, waking early whenever the writer publishes, since a
+    change may bring an earlier event. The state is republished even if no
+    event is known, so changes from outside the writer, like an edited CSV
+    file, are picked up within an interval.
+
+    Args:
+        writer: StateWriter to refresh
+        interval: Longest time between two publishes
+    """
+
+    def __init__(self, writer, interval: timedelta):
+        self.writer = writer
+        self.interval = interval
+        self.ticks = 0  # Publishes asked for so far
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        writer.add_listener(self._published)
+        metrics.registry.collect(self._collect)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the thread; does nothing if it is running already"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='scheduler-ticker', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread and wait for it to finish its tick"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+
+    def next_tick(self) -> Optional[datetime]:
+        """When the published state is due for a tick, None before the first state"""
+        state = self.writer.state
+        if state is None:
+            return None
+        return state.next_event or state.time + self.interval
+
+    def _published(self, state: PublishedState) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            due = self.next_tick()
+            if due is not None:
+                remaining = (due - clock.now()).total_seconds()
+                if remaining > 0:
+                    # Real seconds, so a virtual clock is looked at again at least once an interval
+                    self._wake.wait(min(remaining, self.interval.total_seconds()))
+                    continue
+            try:
+                with metrics.span('scheduler_tick'):
+                    self.writer.refresh().result()
+            except Exception as e:
+                print(f"Error advancing the order book in the background: {e}")
+                self._stop.wait(self.interval.total_seconds())
+                continue
+            self.ticks += 1
+            metrics.inc('orders_ticks_total')
+            if due is not None:
+                metrics.registry.observe('orders_tick_lag_seconds', (clock.now() - due).total_seconds())
+
+    def _collect(self):
+        due = self.next_tick()
+        if not self.running or due is None:
+            return []
+        return [('orders_tick_next_event_seconds', {}, (due - clock.now()).total_seconds())]